@@ -0,0 +1,74 @@
+"""
+Compara o parser incremental de hOCR com o caminho original em BeautifulSoup.
+
+Uso: python -m benchmarks.bench_hocr_parser [paginas] [repeticoes]
+"""
+import sys
+import timeit
+from src.ocr.hocr_parser import format_paragraphs, parse_hocr
+from src.ocr.tesseract_ocr import TesseractOCR
+
+HOCR_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"
+    "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">
+ <head>
+  <title></title>
+  <meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>
+  <meta name='ocr-system' content='tesseract 5.3.0' />
+ </head>
+ <body>
+  <div class='ocr_page' id='page_1' title='image "page.png"; bbox 0 0 2480 3508; ppageno 0'>
+"""
+HOCR_FOOTER = """  </div>
+ </body>
+</html>
+"""
+
+
+def synthetic_hocr(paragraphs: int = 40, lines: int = 6, words: int = 12) -> bytes:
+    """Gera uma página de hOCR com a estrutura produzida pelo Tesseract"""
+    parts = [HOCR_HEADER]
+    word_id = 0
+    for p in range(paragraphs):
+        parts.append(f"   <div class='ocr_carea' id='block_1_{p}' title=\"bbox 0 0 10 10\">\n")
+        parts.append(f"    <p class='ocr_par' id='par_1_{p}' lang='por' title=\"bbox 0 0 10 10\">\n")
+        for l in range(lines):
+            parts.append(f"     <span class='ocr_line' id='line_1_{p}_{l}' "
+                         f"title=\"bbox 0 0 10 10; baseline 0 -5; x_size 40; x_descenders 9; x_ascenders 10\">\n")
+            for w in range(words):
+                word_id += 1
+                bold = ' bold' if word_id % 17 == 0 else ''
+                parts.append(f"      <span class='ocrx_word{bold}' id='word_1_{word_id}' "
+                             f"title='bbox 0 0 10 10; x_wconf {60 + word_id % 40}'>"
+                             f"palavra{w}&amp;</span>\n")
+            parts.append("     </span>\n")
+        parts.append("    </p>\n   </div>\n")
+    parts.append(HOCR_FOOTER)
+    return ''.join(parts).encode('utf-8')
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    hocr_pages = [synthetic_hocr() for _ in range(pages)]
+
+    soup_text = [TesseractOCR._parse_hocr_with_soup(page) for page in hocr_pages]
+    fast_text = [format_paragraphs(parse_hocr(page)) for page in hocr_pages]
+    assert soup_text == fast_text, "Saídas divergentes entre os parsers"
+
+    soup_time = min(timeit.repeat(
+        lambda: [TesseractOCR._parse_hocr_with_soup(page) for page in hocr_pages],
+        number=1, repeat=repeat))
+    fast_time = min(timeit.repeat(
+        lambda: [format_paragraphs(parse_hocr(page)) for page in hocr_pages],
+        number=1, repeat=repeat))
+
+    print(f"Páginas: {pages} ({len(hocr_pages[0]) // 1024} KiB de hOCR por página)")
+    print(f"BeautifulSoup: {soup_time / pages * 1000:8.2f} ms/página")
+    print(f"Incremental:   {fast_time / pages * 1000:8.2f} ms/página")
+    print(f"Aceleração:    {soup_time / fast_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
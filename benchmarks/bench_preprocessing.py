@@ -0,0 +1,59 @@
+"""
+Compara o pré-processamento em NumPy com a função original (limiar global
+seguido de autocontrast) em uma página A4 sintética a 300 dpi.
+
+Uso: python -m benchmarks.bench_preprocessing [repeticoes]
+"""
+import pickle
+import sys
+import timeit
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+from src.ocr.image_preprocessor import PreprocessingOptions, preprocess_image, preset_options
+
+A4_300DPI = (2480, 3508)
+
+
+def legacy_preprocess(image: Image.Image) -> Image.Image:
+    """Pré-processamento original do TesseractOCR"""
+    return ImageOps.autocontrast(image.convert('L').point(lambda x: 0 if x < 128 else 255))
+
+
+def synthetic_page() -> Image.Image:
+    """Página RGB com texto, iluminação irregular e inclinação de 1,5 grau"""
+    width, height = A4_300DPI
+    gradient = np.linspace(235, 150, width, dtype=np.float32)[None, :].repeat(height, axis=0)
+    page = Image.fromarray(gradient.astype(np.uint8)).convert('RGB')
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=42)
+    for line, y in enumerate(range(300, height - 300, 64)):
+        draw.text((250, y), f"Art. {line}º O presente documento trata do processo nº 0001234-56.2024", fill=(40, 40, 40), font=font)
+    return page.rotate(1.5, resample=Image.BICUBIC, fillcolor=(235, 235, 235))
+
+
+def describe(label: str, image: Image.Image, seconds: float) -> None:
+    pickled = len(pickle.dumps(image))
+    print(f"{label:<32} {seconds * 1000:8.1f} ms  {image.mode:>2} {image.width}x{image.height}"
+          f"  {pickled / 1024:8.0f} KiB serializados")
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    page = synthetic_page()
+    variants = [
+        ("Original", legacy_preprocess),
+        ("--preprocess global", lambda im: preprocess_image(im, preset_options('global'))),
+        ("--preprocess adaptive", lambda im: preprocess_image(im, preset_options('adaptive'))),
+        ("--preprocess full --no-deskew", lambda im: preprocess_image(im, preset_options('full', deskew=False))),
+        ("--preprocess full (padrão)", lambda im: preprocess_image(im)),
+        ("Completo + altura-x 12px", lambda im: preprocess_image(
+            im, PreprocessingOptions(target_x_height=12))),
+    ]
+    describe("Página de entrada", page, 0.0)
+    for label, function in variants:
+        seconds = min(timeit.repeat(lambda: function(page), number=1, repeat=repeat))
+        describe(label, function(page), seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+
+
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+from typing import List, Optional, TextIO, Tuple
+from .core.base_ocr import BaseOCRProcessor
+from .core.pipeline import OUTPUT_FORMATS, BatchPipeline, FileResult, PipelineOptions
+from .core.watcher import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_TIME
+from .ocr.hybrid_ocr import HybridOCR
+from .ocr.image_preprocessor import PREPROCESSING_PRESETS, preset_options
+from .ocr.mistral_bundler import MistralBundler
+from .ocr.mistral_ocr import MistralOCR
+from .ocr.tesseract_ocr import DEFAULT_PAGE_TIMEOUT, TesseractOCR
+from .ocr import tesserocr_ocr
+from .ocr.tesserocr_ocr import TesserocrOCR
+from .ocr.upload_optimizer import UploadOptimizer
+from .utils.jsonl_writer import FSYNC_CLOSE, FSYNC_POLICIES
+from .utils.ocr_cache import OCRCache
+
+ENGINES = ('tesseract', 'tesserocr', 'mistral', 'hybrid')
+API_KEY_ENV = "MISTRAL_API_KEY"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src",
+        description="Processa em lote os PDFs e imagens de um diretório, sem interface gráfica. "
+                    "O progresso é impresso na saída padrão em JSON, uma linha por evento."
+    )
+    parser.add_argument("input_dir", help="diretório com os PDFs e imagens")
+    parser.add_argument("output_dir", help="diretório das saídas")
+    parser.add_argument("--engine", choices=ENGINES, default="tesseract", help="motor de OCR (tesserocr: Tesseract em processo, requer o pacote tesserocr)")
+    parser.add_argument("--lang", default="por", help="idioma do Tesseract (ex.: por, eng, por+eng)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="documentos no OCR ao mesmo tempo (padrão: conforme o motor e os núcleos)")
+    parser.add_argument("--tesseract-workers", type=int, default=1,
+                        help="processos do Tesseract por documento")
+    parser.add_argument("--max-tasks-per-child", type=int, default=None,
+                        help="páginas por processo do Tesseract antes de reciclá-lo (libera memória); "
+                             "o OCR das páginas passa a rodar no pool mesmo com --tesseract-workers 1")
+    parser.add_argument("--page-timeout", type=float, default=DEFAULT_PAGE_TIMEOUT,
+                        help="prazo (s) do Tesseract por página; 0 desativa")
+    parser.add_argument("--preprocess", choices=tuple(PREPROCESSING_PRESETS), default="full",
+                        help="pré-processamento das páginas no Tesseract: full (limiar adaptativo, inclinação "
+                             "e margens), adaptive (só o limiar adaptativo) ou global (limiar fixo, o mais rápido)")
+    parser.add_argument("--no-deskew", action="store_true",
+                        help="não corrige a inclinação das páginas (digitalizações já alinhadas)")
+    parser.add_argument("--document-timeout", type=float, default=0,
+                        help="prazo (s) do OCR de cada documento; 0 desativa")
+    parser.add_argument("--recursive", action="store_true", help="inclui os subdiretórios da entrada")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB",
+                        help="processa apenas os arquivos que casarem com o padrão (repetível)")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="ignora arquivos ou diretórios que casarem com o padrão (repetível)")
+    parser.add_argument("--max-in-flight", type=int, default=64,
+                        help="arquivos admitidos e ainda não concluídos")
+    parser.add_argument("--max-in-flight-mb", type=int, default=512,
+                        help="orçamento (MB) dos arquivos admitidos e ainda não concluídos")
+    parser.add_argument("--no-count", action="store_true",
+                        help="não conta os arquivos de antemão; a árvore de entrada é percorrida uma única vez")
+    parser.add_argument("--formats", default="docx,json",
+                        help=f"saídas separadas por vírgula: {','.join(OUTPUT_FORMATS)}")
+    parser.add_argument("--ordered", action="store_true",
+                        help="grava o JSONL na ordem dos arquivos de entrada (saída reproduzível)")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default=FSYNC_CLOSE,
+                        help="quando forçar a gravação do JSONL em disco")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="reprocessa todos os arquivos, ignorando o manifesto do diretório de saída")
+    parser.add_argument("--watch", action="store_true",
+                        help="continua observando o diretório de entrada e processa os arquivos novos "
+                             "ou modificados até receber Ctrl+C / SIGTERM")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="intervalo (s) entre varreduras no modo --watch")
+    parser.add_argument("--settle-time", type=float, default=DEFAULT_SETTLE_TIME,
+                        help="tempo (s) sem alterações para considerar um arquivo completo")
+    parser.add_argument("--api-key", default=None,
+                        help=f"chave da API Mistral (padrão: variável {API_KEY_ENV})")
+    parser.add_argument("--no-cache", action="store_true", help="não reutiliza resultados de OCR anteriores")
+    parser.add_argument("--optimize-upload", action="store_true",
+                        help="recomprime PDFs digitalizados antes do envio ao Mistral")
+    parser.add_argument("--bundle-small", action="store_true",
+                        help="agrupa documentos pequenos (fotos, digitalizações de poucas páginas) "
+                             "em requisições compartilhadas ao Mistral")
+    parser.add_argument("--fallback", action="store_true",
+                        help="usa o Tesseract quando a API Mistral estiver indisponível")
+    parser.add_argument("--summary", action="store_true",
+                        help="gera sumário e tabela de conteúdo nos DOCX (API Mistral)")
+    parser.add_argument("--extract-data", action="store_true",
+                        help="extrai dados estruturados para CSV (API Mistral)")
+    parser.add_argument("--log-level", default="INFO", help="nível do log escrito em stderr")
+    return parser
+
+
+def parse_formats(value: str) -> Tuple[str, ...]:
+    formats = tuple(part.strip().lower() for part in value.split(',') if part.strip())
+    unknown = [name for name in formats if name not in OUTPUT_FORMATS]
+    if unknown or not formats:
+        raise ValueError(f"formato de saída inválido: {', '.join(unknown) or value!r}")
+    return formats
+
+
+def build_engines(args: argparse.Namespace) -> Tuple[BaseOCRProcessor, TesseractOCR]:
+    """Retorna o motor selecionado e o Tesseract, encerrado no final da execução"""
+    tesseract_class = TesserocrOCR if args.engine == 'tesserocr' else TesseractOCR
+    tesseract = tesseract_class(max_workers=args.tesseract_workers, max_tasks_per_child=args.max_tasks_per_child,
+                                page_timeout=args.page_timeout or None,
+                                preprocessing=preset_options(args.preprocess, deskew=not args.no_deskew))
+    engine: BaseOCRProcessor = tesseract
+    if args.engine in ('mistral', 'hybrid'):
+        mistral = MistralOCR(api_key=args.api_key)
+        if args.optimize_upload:
+            mistral.upload_optimizer = UploadOptimizer()
+        if args.bundle_small:
+            mistral.bundler = MistralBundler(mistral)
+        if args.fallback:
+            mistral.fallback_ocr = tesseract
+        engine = mistral if args.engine == 'mistral' else HybridOCR(tesseract, mistral)
+
+    engine.document_timeout = args.document_timeout or None
+
+    if not args.no_cache:
+        cache = OCRCache(os.path.join(args.output_dir, ".ocr_cache"))
+        tesseract.cache = cache
+        engine.cache = cache
+        if isinstance(engine, HybridOCR):
+            engine.mistral.cache = cache
+    return engine, tesseract
+
+
+class ProgressPrinter:
+    """Escreve um objeto JSON por linha para cada arquivo concluído e no final"""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def emit(self, event: dict) -> None:
+        self.stream.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+    def file_done(self, result: FileResult, done: int, total: int) -> None:
+        self.emit({
+            "event": "file",
+            "path": result.path,
+            "status": "skipped" if result.skipped else "ok" if result.success else "failed",
+            "seconds": round(result.seconds, 3),
+            "bytes": result.size,
+            "done": done,
+            "total": total
+        })
+
+
+def main(argv: Optional[List[str]] = None, stdout: TextIO = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    printer = ProgressPrinter(stdout or sys.stdout)
+
+    try:
+        formats = parse_formats(args.formats)
+    except ValueError as e:
+        parser.error(str(e))
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"diretório de entrada não encontrado: {args.input_dir}")
+    args.api_key = args.api_key or os.environ.get(API_KEY_ENV, "")
+    if (args.engine in ('mistral', 'hybrid') or args.summary or args.extract_data) and not args.api_key:
+        parser.error(f"API Key do Mistral não configurada (--api-key ou {API_KEY_ENV})")
+    if args.engine == 'tesserocr' and not tesserocr_ocr.TESSEROCR_AVAILABLE:
+        parser.error("o motor tesserocr requer o pacote 'tesserocr' (pip install tesserocr)")
+
+    # O log vai para stderr; a saída padrão fica reservada ao progresso em JSON
+    logging.basicConfig(level=args.log_level.upper(), stream=sys.stderr,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    engine, tesseract = build_engines(args)
+    options = PipelineOptions(lang=args.lang, output_formats=formats, workers=args.workers,
+                              engine_name=args.engine, api_key=args.api_key,
+                              ordered_output=args.ordered, jsonl_fsync=args.fsync,
+                              resume=not args.no_resume, recursive=args.recursive,
+                              include=tuple(args.include), exclude=tuple(args.exclude),
+                              max_in_flight=args.max_in_flight,
+                              max_in_flight_bytes=args.max_in_flight_mb * 1024 * 1024,
+                              count_total=not args.no_count,
+                              generate_summary=args.summary, extract_data=args.extract_data)
+    pipeline = BatchPipeline(engine, options, on_progress=printer.file_done)
+
+    def interrupt(signum, frame):
+        # As etapas são encerradas pelo stop_event, o que fecha o JSONL e o manifesto
+        logging.info("Interrupção recebida; encerrando o processamento")
+        engine.stop_event.set()
+
+    previous_handlers = {signum: signal.signal(signum, interrupt) for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        if args.watch:
+            summary = pipeline.watch(args.input_dir, args.output_dir, args.poll_interval, args.settle_time)
+        else:
+            summary = pipeline.run(args.input_dir, args.output_dir)
+    finally:
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+        tesseract.shutdown()
+
+    pipeline.log_engine_stats()
+    printer.emit({"event": "summary", **summary, "engine": pipeline.engine_stats()})
+    if args.watch:
+        # No modo contínuo a interrupção é o encerramento normal
+        return 0 if summary["failed"] == 0 else 1
+    return 0 if summary["failed"] == 0 and not summary["cancelled"] else 1
@@ -1,20 +1,397 @@
-
-
+import contextlib
+import hashlib
+import io
+import logging
+import re
 import threading
-from typing import List, Tuple
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from pdfminer.converter import PDFLayoutAnalyzer, TextConverter
+from pdfminer.layout import LAParams, LTContainer, LTImage, LTPage
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import PDFStream, resolve1
+from ..ocr.image_frames import count_frames, is_image_file
+from ..utils.concurrency import cpu_count
+from ..utils.ocr_cache import OCRCache, file_sha256
 
 MIN_TEXT_LENGTH = 50
+# Mínimo de caracteres para considerar que uma página tem camada de texto
+MIN_PAGE_TEXT_LENGTH = 20
+# Fração da página coberta por imagens a partir da qual ela é tratada como
+# digitalizada: o texto que ela tiver pode ser só um carimbo ou a assinatura
+# digital aplicada sobre a imagem
+SCANNED_PAGE_IMAGE_COVERAGE = 0.5
+# Densidade mínima (caracteres alfanuméricos por polegada quadrada) para que
+# o texto de uma página digitalizada seja aceito no lugar do OCR, como na
+# camada de um PDF pesquisável. Equivale a cerca de 750 caracteres em A4,
+# bem acima de uma linha de carimbo ou protocolo
+MIN_SCANNED_PAGE_TEXT_DENSITY = 8.0
+POINTS_PER_INCH = 72
+# Se as primeiras páginas não tiverem nenhuma fonte, o documento é tratado
+# como digitalizado e a varredura é encerrada
+PRESCAN_SAMPLE_PAGES = 5
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    """Conta as páginas do PDF sem interpretá-las"""
+    with open(pdf_path, 'rb') as fp:
+        return sum(1 for _ in PDFPage.get_pages(fp))
+
+
+class _PrescanConverter(TextConverter):
+    """TextConverter que mede também a área de cada página coberta por imagens"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page_area = 0.0
+        self.image_coverage = 0.0
+
+    def render_image(self, name, stream) -> None:
+        # O TextConverter descarta as imagens sem imagewriter; aqui elas
+        # entram no layout apenas para o cálculo da área
+        PDFLayoutAnalyzer.render_image(self, name, stream)
+
+    def receive_layout(self, ltpage: LTPage) -> None:
+        self.page_area = ltpage.width * ltpage.height
+        self.image_coverage = self._image_area(ltpage, ltpage) / self.page_area if self.page_area else 0.0
+        super().receive_layout(ltpage)
+
+    @classmethod
+    def _image_area(cls, item, ltpage: LTPage) -> float:
+        if isinstance(item, LTImage):
+            # Área visível na página; imagens sobrepostas podem somar mais de uma vez
+            width = min(item.x1, ltpage.x1) - max(item.x0, ltpage.x0)
+            height = min(item.y1, ltpage.y1) - max(item.y0, ltpage.y0)
+            return max(0.0, width) * max(0.0, height)
+        if isinstance(item, LTContainer):
+            return sum(cls._image_area(child, ltpage) for child in item)
+        return 0.0
+
+
+class PreparedDocument(NamedTuple):
+    """Documento após a etapa de preparação (ver BaseOCRProcessor.prepare)"""
+    path: str
+    document_key: Optional[str]
+    # Texto do documento inteiro já presente no cache
+    cached_text: Optional[str]
+    # {numero_pagina: texto} das páginas com camada de texto
+    text_pages: Dict[int, str]
+    # Páginas que precisam de OCR, ou None para todas
+    image_pages: Optional[List[int]]
+
 
 class BaseOCRProcessor:
     """Classe base para processadores de OCR"""
-    
+
+    # Erros que desviam o documento para fallback_ocr em vez de descartá-lo
+    fallback_errors: Tuple[type, ...] = ()
+
     def __init__(self):
         self.stop_event = threading.Event()
-    
+        # Extrai diretamente as páginas com camada de texto e envia ao OCR
+        # apenas as páginas compostas por imagens
+        self.prescan_text_layer = True
+        # Cache opcional de resultados (documento inteiro e por página)
+        self.cache: Optional[OCRCache] = None
+        self._fallback_ocr: Optional['BaseOCRProcessor'] = None
+        # Prazo (s) do OCR de um documento; ao expirar, as páginas restantes são
+        # abandonadas e o documento falha. None desativa
+        self.document_timeout: Optional[float] = None
+        # Prazo do documento em andamento em cada thread (ver document_deadline)
+        self.deadlines = threading.local()
+
+    @property
+    def fallback_ocr(self) -> Optional['BaseOCRProcessor']:
+        """Processador usado quando este falha com um dos fallback_errors"""
+        return self._fallback_ocr
+
+    @fallback_ocr.setter
+    def fallback_ocr(self, ocr: Optional['BaseOCRProcessor']) -> None:
+        # Como nos motores do HybridOCR, o cancelamento e o prazo do documento
+        # valem também para o documento desviado ao fallback
+        if ocr is not None:
+            ocr.stop_event = self.stop_event
+            ocr.deadlines = self.deadlines
+        self._fallback_ocr = ocr
+
+    def cache_signature(self) -> str:
+        """
+        Identifica o motor e as configurações que influenciam o texto reconhecido.
+        Subclasses devem incluir aqui parâmetros como o pré-processamento.
+        """
+        return type(self).__name__
+
+    def recommended_workers(self) -> int:
+        """
+        Documentos processados ao mesmo tempo quando o lote não define o
+        número de workers. O padrão supõe um motor limitado pela CPU.
+        """
+        return cpu_count()
+
     def extract_text(self, pdf_path: str, lang: str = 'por') -> str:
-        """Método a ser implementado pelas subclasses"""
+        """
+        Extrai o texto do PDF ou da imagem (cada quadro de um TIFF é uma
+        página). As páginas com camada de texto são lidas diretamente do
+        arquivo e apenas as demais passam pelo OCR da subclasse.
+        Com cache configurado, um documento já processado não passa pelo OCR e
+        uma versão revisada reprocessa apenas as páginas alteradas.
+        """
+        try:
+            prepared = self.prepare(pdf_path, lang)
+        except Exception as e:
+            logging.error(f"Erro no processamento com {type(self).__name__}: {e}")
+            return ""
+        return self.recognize(prepared, lang)
+
+    def prepare(self, pdf_path: str, lang: str = 'por') -> PreparedDocument:
+        """
+        Primeira etapa de extract_text, sem OCR: consulta o cache do documento
+        e separa as páginas com camada de texto das que precisam de OCR. Pode
+        ser executada antecipadamente para o próximo documento do lote.
+        """
+        document_key = self.document_cache_key(pdf_path, lang)
+        if document_key is not None:
+            cached = self.cache.get(document_key)
+            if cached is not None:
+                logging.info(f"Resultado de {pdf_path} obtido do cache de OCR")
+                return PreparedDocument(pdf_path, document_key, cached, {}, [])
+
+        text_pages, image_pages = self._scan_or_all_pages(pdf_path)
+        return PreparedDocument(pdf_path, document_key, None, text_pages, image_pages)
+
+    @contextlib.contextmanager
+    def document_deadline(self):
+        """Aplica document_timeout ao documento processado pela thread atual"""
+        previous = getattr(self.deadlines, 'value', None)
+        deadline = previous
+        if self.document_timeout is not None:
+            deadline = time.monotonic() + self.document_timeout
+            if previous is not None:
+                deadline = min(deadline, previous)
+        self.deadlines.value = deadline
+        try:
+            yield
+        finally:
+            self.deadlines.value = previous
+
+    def current_deadline(self) -> Optional[float]:
+        """Instante (time.monotonic) do prazo do documento da thread atual, ou None sem prazo"""
+        return getattr(self.deadlines, 'value', None)
+
+    def time_remaining(self) -> Optional[float]:
+        """Segundos até o prazo do documento da thread atual, ou None sem prazo"""
+        deadline = self.current_deadline()
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def deadline_exceeded(self) -> bool:
+        return self.time_remaining() == 0.0
+
+    def cancelled(self) -> bool:
+        """Indica se o OCR do documento atual deve parar (cancelamento ou prazo)"""
+        return self.stop_event.is_set() or self.deadline_exceeded()
+
+    def recognize(self, prepared: PreparedDocument, lang: str = 'por') -> str:
+        """Segunda etapa de extract_text: OCR das páginas pendentes e montagem do texto"""
+        if prepared.cached_text is not None:
+            return prepared.cached_text
+        with self.document_deadline():
+            return self._recognize_pages(prepared, lang)
+
+    def _recognize_pages(self, prepared: PreparedDocument, lang: str) -> str:
+        pdf_path = prepared.path
+        try:
+            page_texts = dict(prepared.text_pages)
+            image_pages = prepared.image_pages
+            complete = True
+            if image_pages is None or image_pages:
+                recognized = self._ocr_pages_cached(pdf_path, image_pages, lang)
+                page_texts.update(recognized)
+                # Um documento com páginas que falharam não vai para o cache,
+                # para que seja reprocessado na próxima vez
+                complete = image_pages is None or all(page in recognized for page in image_pages)
+
+            if self.deadline_exceeded():
+                logging.error(f"Prazo de {self.document_timeout:.0f}s excedido no OCR de {pdf_path}")
+                return ""
+
+            text = ''.join(page_texts[page] for page in sorted(page_texts))
+            text = text if len(text.strip()) > MIN_TEXT_LENGTH else ""
+
+            if prepared.document_key is not None and text and complete and not self.stop_event.is_set():
+                self.cache.put(prepared.document_key, text)
+            return text
+        except self.fallback_errors as e:
+            if self.fallback_ocr is None:
+                logging.error(f"Erro no processamento com {type(self).__name__}: {e}")
+                return ""
+            logging.warning(f"{e}; processando {pdf_path} com {type(self.fallback_ocr).__name__}")
+            return self.fallback_ocr.extract_text(pdf_path, lang)
+        except Exception as e:
+            logging.error(f"Erro no processamento com {type(self).__name__}: {e}")
+            return ""
+
+    def document_cache_key(self, path: str, lang: str) -> Optional[str]:
+        """Chave do documento inteiro no cache, ou None sem cache configurado"""
+        if self.cache is None:
+            return None
+        return OCRCache.make_key("doc", file_sha256(path), self.cache_signature(), lang)
+
+    def _ocr_pages_cached(self, pdf_path: str, pages: Optional[List[int]], lang: str) -> Dict[int, str]:
+        """Consulta o cache por página e envia ao OCR apenas as páginas ausentes"""
+        if self.cache is None:
+            return self._ocr_pages(pdf_path, pages, lang)
+
+        try:
+            fingerprints = self.page_fingerprints(pdf_path)
+        except Exception as e:
+            logging.warning(f"Não foi possível identificar as páginas de {pdf_path} para o cache: {e}")
+            return self._ocr_pages(pdf_path, pages, lang)
+
+        if pages is None:
+            pages = sorted(fingerprints)
+        signature = self.cache_signature()
+        page_keys = {page: OCRCache.make_key("page", fingerprints[page], signature, lang)
+                     for page in pages if page in fingerprints}
+
+        page_texts = {}
+        missing = []
+        for page in pages:
+            cached = self.cache.get(page_keys[page]) if page in page_keys else None
+            if cached is None:
+                missing.append(page)
+            else:
+                page_texts[page] = cached
+
+        if missing:
+            recognized = self._ocr_pages(pdf_path, missing, lang)
+            for page, page_text in recognized.items():
+                if page in page_keys:
+                    self.cache.put(page_keys[page], page_text)
+            page_texts.update(recognized)
+        return page_texts
+
+    def _ocr_pages(self, pdf_path: str, pages: Optional[List[int]], lang: str) -> Dict[int, str]:
+        """
+        Método a ser implementado pelas subclasses. Recebe os números das páginas
+        (a partir de 1, ou None para todas) e retorna {numero_pagina: texto}.
+        """
         raise NotImplementedError("Método deve ser implementado pela subclasse")
-    
+
+    def _scan_or_all_pages(self, pdf_path: str) -> Tuple[Dict[int, str], Optional[List[int]]]:
+        # Imagens não têm camada de texto: todos os quadros vão para o OCR
+        if not self.prescan_text_layer or is_image_file(pdf_path):
+            return {}, None
+        try:
+            return self.prescan_pages(pdf_path)
+        except Exception as e:
+            logging.warning(f"Pré-análise de {pdf_path} falhou, enviando todas as páginas ao OCR: {e}")
+            return {}, None
+
+    def prescan_pages(self, pdf_path: str) -> Tuple[Dict[int, str], List[int]]:
+        """
+        Classifica cada página do PDF como camada de texto ou somente imagem.
+        Uma página coberta em grande parte por imagens só é lida da camada de
+        texto se o texto for denso o bastante para ser a página inteira.
+
+        Returns:
+            Tupla ({numero_pagina: texto} das páginas com camada de texto,
+            lista das páginas que precisam de OCR)
+        """
+        text_pages: Dict[int, str] = {}
+        image_pages: List[int] = []
+
+        with open(pdf_path, 'rb') as fp:
+            rsrcmgr = PDFResourceManager()
+            output = io.StringIO()
+            device = _PrescanConverter(rsrcmgr, output, laparams=LAParams())
+            interpreter = PDFPageInterpreter(rsrcmgr, device)
+            pages_without_fonts = 0
+            scanned_document = False
+
+            try:
+                for page_number, page in enumerate(PDFPage.get_pages(fp), 1):
+                    if scanned_document:
+                        # Classificação já definida: apenas contabiliza as páginas
+                        image_pages.append(page_number)
+                        continue
+
+                    # Páginas sem fontes não podem ter texto: dispensa a análise de layout
+                    if not self._page_has_fonts(page):
+                        image_pages.append(page_number)
+                        pages_without_fonts += 1
+                        if pages_without_fonts == page_number == PRESCAN_SAMPLE_PAGES:
+                            scanned_document = True
+                        continue
+
+                    interpreter.process_page(page)
+                    page_text = output.getvalue().replace('\f', '').strip()
+                    output.seek(0)
+                    output.truncate(0)
+
+                    if self._has_text_layer(page_text, device.image_coverage, device.page_area):
+                        text_pages[page_number] = page_text + '\n\n'
+                    else:
+                        image_pages.append(page_number)
+            finally:
+                device.close()
+
+        logging.info(f"Pré-análise de {pdf_path}: {len(text_pages)} páginas com texto, "
+                     f"{len(image_pages)} páginas para OCR")
+        return text_pages, image_pages
+
+    @staticmethod
+    def _has_text_layer(page_text: str, image_coverage: float, page_area: float) -> bool:
+        if len(page_text) < MIN_PAGE_TEXT_LENGTH or not any(c.isalnum() for c in page_text):
+            return False
+        if image_coverage < SCANNED_PAGE_IMAGE_COVERAGE:
+            return True
+        # Página digitalizada: um carimbo não substitui o OCR da imagem
+        square_inches = page_area / (POINTS_PER_INCH * POINTS_PER_INCH)
+        alphanumeric = sum(1 for c in page_text if c.isalnum())
+        return square_inches > 0 and alphanumeric / square_inches >= MIN_SCANNED_PAGE_TEXT_DENSITY
+
+    def page_fingerprints(self, pdf_path: str) -> Dict[int, str]:
+        """
+        Calcula uma impressão digital de cada página a partir dos fluxos de
+        conteúdo e dos XObjects (imagens e formulários) que ela referencia,
+        sem renderizar a página. Os quadros de uma imagem são identificados
+        pelo conteúdo do arquivo.
+        """
+        if is_image_file(pdf_path):
+            digest = file_sha256(pdf_path)
+            return {frame: f"{digest}:{frame}" for frame in range(1, count_frames(pdf_path) + 1)}
+
+        fingerprints = {}
+        with open(pdf_path, 'rb') as fp:
+            for page_number, page in enumerate(PDFPage.get_pages(fp), 1):
+                digest = hashlib.sha256()
+                digest.update(repr((page.mediabox, page.rotate)).encode('utf-8'))
+                for stream in page.contents:
+                    stream = resolve1(stream)
+                    if isinstance(stream, PDFStream):
+                        digest.update(stream.get_rawdata() or b'')
+                self._hash_xobjects(resolve1(page.resources) or {}, digest, depth=0)
+                fingerprints[page_number] = digest.hexdigest()
+        return fingerprints
+
+    def _hash_xobjects(self, resources: Dict, digest, depth: int) -> None:
+        xobjects = resolve1(resources.get('XObject')) or {}
+        for name in sorted(xobjects):
+            xobject = resolve1(xobjects[name])
+            if not isinstance(xobject, PDFStream):
+                continue
+            digest.update(str(name).encode('utf-8'))
+            digest.update(xobject.get_rawdata() or b'')
+            # Formulários podem conter imagens próprias
+            if depth < 2 and 'Resources' in xobject.attrs:
+                self._hash_xobjects(resolve1(xobject.attrs['Resources']) or {}, digest, depth + 1)
+
+    @staticmethod
+    def _page_has_fonts(page: PDFPage) -> bool:
+        resources = resolve1(page.resources) or {}
+        return bool(resolve1(resources.get('Font')))
+
     def get_paragraphs(self, text: str) -> List[Tuple[str, str]]:
         """
         Divide o texto em parágrafos preservando estrutura básica
@@ -0,0 +1,172 @@
+
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+from ..utils.ocr_cache import file_sha256
+
+MANIFEST_FILE_NAME = ".ocr_manifest.sqlite"
+
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT,
+    size INTEGER,
+    mtime REAL,
+    config TEXT,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    outputs TEXT,
+    dataset_entry TEXT,
+    started REAL,
+    finished REAL,
+    seconds REAL,
+    order_key TEXT
+)
+"""
+
+
+class JobManifest:
+    """
+    Registro persistente (SQLite no diretório de saída) de cada arquivo de um
+    lote: hash, estado, saídas geradas, entrada do JSONL e tempos.
+
+    Um arquivo concluído é ignorado nas execuções seguintes enquanto o
+    conteúdo e a configuração (motor, idioma, formatos) forem os mesmos; os
+    que falharam ou foram interrompidos são processados de novo. O JSONL é
+    regenerado a partir do manifesto, então reexecutar o lote não duplica
+    entradas.
+    """
+
+    def __init__(self, path: str, config: str = ""):
+        self.path = path
+        # Identifica a configuração do lote; mudanças invalidam os concluídos
+        self.config = config
+        self._lock = threading.Lock()
+        # Arquivos reprocessados que já tinham entrada no JSONL; a nova entrada
+        # é acrescentada ao arquivo, que precisa ser regenerado no final
+        self.superseded_entries = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+        if 'order_key' not in columns:
+            # Manifesto anterior à ordenação pela varredura
+            self._conn.execute("ALTER TABLE files ADD COLUMN order_key TEXT")
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def is_done(self, path: str, order_key: Optional[str] = None) -> bool:
+        """
+        Verifica se o arquivo já foi concluído com o conteúdo atual. O hash só
+        é recalculado quando o tamanho ou a data de modificação mudaram.
+        order_key (ver start) é registrado se ainda não estiver no manifesto.
+        """
+        key = os.path.abspath(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, size, mtime, config, order_key FROM files WHERE path = ? AND state = ?",
+                (key, STATE_DONE)).fetchone()
+        if row is None or row[3] != self.config:
+            return False
+
+        stat = os.stat(path)
+        if (row[1], row[2]) != (stat.st_size, stat.st_mtime):
+            if row[1] != stat.st_size:
+                return False
+            # Mesmo tamanho com data diferente (cópia, restauração): decide pelo conteúdo
+            if file_sha256(path) != row[0]:
+                return False
+        elif order_key is None or row[4] == order_key:
+            return True
+        with self._lock:
+            self._conn.execute("UPDATE files SET mtime = ?, order_key = COALESCE(?, order_key) WHERE path = ?",
+                               (stat.st_mtime, order_key, key))
+            self._conn.commit()
+        return True
+
+    def start(self, path: str, order_key: Optional[str] = None) -> None:
+        """
+        Registra o início do processamento. order_key posiciona a entrada do
+        arquivo no JSONL regenerado (ver dataset_lines); sem ela, vale a já
+        registrada.
+        """
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            row = self._conn.execute("SELECT dataset_entry FROM files WHERE path = ?", (key,)).fetchone()
+            if row is not None and row[0] is not None:
+                self.superseded_entries += 1
+            self._conn.execute(
+                """INSERT INTO files (path, size, mtime, config, state, attempts, started, order_key)
+                   VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+                   ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime,
+                       config = excluded.config, state = excluded.state,
+                       attempts = attempts + 1, started = excluded.started,
+                       order_key = COALESCE(excluded.order_key, order_key)""",
+                (key, stat.st_size, stat.st_mtime, self.config, STATE_RUNNING, time.time(), order_key))
+            self._conn.commit()
+
+    def finish(self, path: str, success: bool, seconds: float, outputs: List[str],
+               dataset_entry: Optional[Dict] = None, sha256: Optional[str] = None) -> None:
+        """Registra o resultado; sha256 é o hash do conteúdo lido no início do processamento"""
+        entry = json.dumps(dataset_entry, ensure_ascii=False) if dataset_entry else None
+        with self._lock:
+            self._conn.execute(
+                """UPDATE files SET sha256 = ?, state = ?, outputs = ?, dataset_entry = ?,
+                       finished = ?, seconds = ? WHERE path = ?""",
+                (sha256, STATE_DONE if success else STATE_FAILED, json.dumps(outputs),
+                 entry, time.time(), seconds, os.path.abspath(path)))
+            self._conn.commit()
+
+    def dataset_lines(self) -> List[str]:
+        """
+        Linhas do JSONL dos arquivos concluídos, na ordem da chave registrada
+        (a da varredura da entrada, a mesma de --ordered); os arquivos sem
+        chave vêm depois, ordenados pelo caminho
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT dataset_entry FROM files WHERE state = ? AND dataset_entry IS NOT NULL "
+                "ORDER BY order_key IS NULL, order_key, path", (STATE_DONE,)).fetchall()
+        return [row[0] + '\n' for row in rows]
+
+    def rewrite_dataset(self, dataset_path: str) -> int:
+        """Regrava o JSONL com as entradas do manifesto (substituição atômica)"""
+        lines = self.dataset_lines()
+        directory = os.path.dirname(os.path.abspath(dataset_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".dataset_", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, dataset_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        logging.info(f"{dataset_path} regenerado a partir do manifesto com {len(lines)} entradas")
+        return len(lines)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM files GROUP BY state").fetchall()
+        counts = {STATE_DONE: 0, STATE_FAILED: 0, STATE_RUNNING: 0}
+        counts.update(dict(rows))
+        return counts
@@ -0,0 +1,670 @@
+
+
+import datetime
+import fnmatch
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from docx import Document
+from docx.shared import Pt
+from .base_ocr import BaseOCRProcessor, PreparedDocument
+from .manifest import MANIFEST_FILE_NAME, JobManifest
+from .stages import AdmissionControl, Stage, run_stages
+from .watcher import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_TIME, FolderWatcher
+from ..ocr.hybrid_ocr import HybridOCR
+from ..ocr.image_frames import IMAGE_EXTENSIONS, is_image_file
+from ..ocr.mistral_ocr import MistralOCR
+from ..utils.docx_formatter import DocxFormatter
+from ..utils.json_formatter import JsonFormatter
+from ..utils.jsonl_writer import DEFAULT_BATCH_SIZE, FSYNC_CLOSE, JsonlWriter
+from ..utils.markdown_formatter import MarkdownFormatter
+from ..utils.ocr_cache import file_sha256
+
+OUTPUT_FORMATS = ('docx', 'json', 'md')
+DATASET_FILE_NAME = "mistral_dataset.jsonl"
+EXTRACTED_DATA_FILE_NAME = "dados_extraidos.csv"
+DEFAULT_MAX_IN_FLIGHT_BYTES = 512 * 1024 * 1024
+# Intervalo (s) com que o cronômetro de cancelamento verifica o fim do lote
+STOP_WATCH_INTERVAL = 0.5
+
+
+@dataclass
+class PipelineOptions:
+    """Configuração de uma execução em lote"""
+    lang: str = 'por'
+    output_formats: Tuple[str, ...] = ('docx', 'json')
+    # Documentos no OCR ao mesmo tempo; None usa o recomendado pelo motor
+    # (núcleos para o Tesseract, limite de requisições para o Mistral)
+    workers: Optional[int] = None
+    # Threads das demais etapas e capacidade da fila de entrada de cada etapa.
+    # A preparação roda à frente do OCR até encher a fila deste
+    ingest_workers: int = 2
+    output_workers: int = 2
+    enrich_workers: int = 2
+    queue_size: int = 4
+    # JSONL: ordem estável pela posição do arquivo no lote, linhas por
+    # gravação e política de fsync (ver JsonlWriter)
+    ordered_output: bool = False
+    jsonl_batch_size: int = DEFAULT_BATCH_SIZE
+    jsonl_fsync: str = FSYNC_CLOSE
+    # Listagem da entrada: subdiretórios e padrões glob de inclusão/exclusão
+    recursive: bool = False
+    include: Tuple[str, ...] = ()
+    exclude: Tuple[str, ...] = ()
+    # Arquivos admitidos e ainda não concluídos; arquivos grandes também
+    # consomem um orçamento de bytes, limitando a memória em uso
+    max_in_flight: int = 64
+    max_in_flight_bytes: Optional[int] = DEFAULT_MAX_IN_FLIGHT_BYTES
+    # Conta os arquivos da entrada em paralelo para exibir o total no
+    # progresso. Desativado, a árvore é percorrida uma única vez e o total
+    # só é conhecido quando a listagem termina
+    count_total: bool = True
+    # Manifesto no diretório de saída: arquivos já concluídos são ignorados
+    # e o JSONL é regenerado sem duplicatas (ver JobManifest)
+    resume: bool = True
+    # Nome do motor exibido no cabeçalho dos documentos DOCX
+    engine_name: str = "tesseract"
+    # Recursos que usam a API Mistral: sumário no DOCX e extração para CSV
+    api_key: str = ""
+    generate_summary: bool = False
+    extract_data: bool = False
+
+
+class FileResult(NamedTuple):
+    """Resultado do processamento de um arquivo de entrada"""
+    path: str
+    success: bool
+    seconds: float
+    size: int
+    # Concluído em uma execução anterior (manifesto) e não reprocessado
+    skipped: bool = False
+
+
+class _Job:
+    """Estado de um arquivo ao longo das etapas do pipeline"""
+
+    def __init__(self, path: str, output_dir: str, sequence: int = 0, size: int = 0,
+                 order_key: Optional[str] = None):
+        self.path = path
+        # Diretório das saídas do arquivo; espelha os subdiretórios da entrada
+        self.output_dir = output_dir
+        # Posição do arquivo no lote, usada na ordenação do JSONL
+        self.sequence = sequence
+        # Posição estável entre execuções (scan_order_key), registrada no manifesto
+        self.order_key = order_key
+        self.is_image = is_image_file(path)
+        self.start = time.monotonic()
+        self.size = size
+        self.prepared: Optional[PreparedDocument] = None
+        self.text = ""
+        self.paragraphs: List[Tuple[str, str]] = []
+        self.docx_path: Optional[str] = None
+        self.success = False
+        self.skipped = False
+        self.sha256: Optional[str] = None
+        self.outputs: List[str] = []
+        self.dataset_entry: Optional[Dict] = None
+        self.dataset_written = False
+
+    def result(self) -> FileResult:
+        return FileResult(self.path, self.success or self.skipped, time.monotonic() - self.start,
+                          self.size, self.skipped)
+
+
+def _matches(relative_path: str, patterns: Sequence[str]) -> bool:
+    """
+    Compara o caminho relativo (com '/') e o nome do arquivo com os padrões
+    glob, sem diferenciar maiúsculas, como a verificação das extensões
+    """
+    relative_path = relative_path.lower()
+    name = relative_path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatchcase(relative_path, pattern.lower()) or
+               fnmatch.fnmatchcase(name, pattern.lower())
+               for pattern in patterns)
+
+
+def iter_input_files(input_dir: str, recursive: bool = False, include: Sequence[str] = (),
+                     exclude: Sequence[str] = (), skip_dirs: Sequence[str] = ()) -> Iterator[str]:
+    """
+    Gera os PDFs e imagens do diretório sob demanda, com os.scandir, em ordem
+    alfabética dentro de cada diretório. Com recursive, desce nos
+    subdiretórios depois dos arquivos do diretório atual.
+
+    Args:
+        include: padrões glob (ex.: '*.pdf', '2024/*'); se informados, apenas
+            os arquivos que casarem com algum deles são gerados
+        exclude: padrões glob de arquivos ou diretórios ignorados
+        skip_dirs: diretórios ignorados, como o de saída dentro do de entrada
+    """
+    skipped = {os.path.realpath(path) for path in skip_dirs}
+    pending = [(input_dir, "")]
+    while pending:
+        directory, prefix = pending.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            logging.warning(f"Não foi possível listar {directory}: {e}")
+            continue
+
+        subdirs = []
+        for entry in entries:
+            relative = prefix + entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if (recursive and not _matches(relative, exclude)
+                        and os.path.realpath(entry.path) not in skipped):
+                    subdirs.append((entry.path, relative + '/'))
+                continue
+            if not entry.name.lower().endswith(('.pdf',) + IMAGE_EXTENSIONS):
+                continue
+            if include and not _matches(relative, include):
+                continue
+            if exclude and _matches(relative, exclude):
+                continue
+            yield entry.path
+        # Pilha: inverte para visitar os subdiretórios em ordem alfabética
+        pending.extend(reversed(subdirs))
+
+
+def scan_order_key(relative_path: str) -> str:
+    """
+    Chave cuja ordem (de texto, como no ORDER BY do SQLite) é a mesma em que
+    iter_input_files gera os arquivos: cada componente do caminho relativo
+    recebe '0' se for o arquivo e '1' se for diretório, para que os arquivos
+    venham antes dos subdiretórios, seguido do nome em hexadecimal (UTF-8).
+    O separador '/' é menor que qualquer dígito hexadecimal, então um nome
+    vem antes dos que o têm como prefixo, como em sorted.
+    """
+    parts = relative_path.replace(os.sep, '/').split('/')
+    return '/'.join(('1' if index < len(parts) - 1 else '0') + part.encode('utf-8').hex()
+                    for index, part in enumerate(parts))
+
+
+def list_input_files(input_dir: str, recursive: bool = False, include: Sequence[str] = (),
+                     exclude: Sequence[str] = ()) -> List[str]:
+    """Lista completa de iter_input_files"""
+    return list(iter_input_files(input_dir, recursive, include, exclude))
+
+
+class BatchPipeline:
+    """
+    Processamento em lote de um diretório: OCR de cada arquivo, segmentação em
+    parágrafos e geração das saídas (DOCX, JSONL e Markdown). Cada etapa tem
+    as suas próprias threads e uma fila limitada de entrada (ver build_stages).
+    Não depende da interface gráfica; o progresso é informado pelo callback
+    on_progress.
+    """
+
+    def __init__(self, ocr: BaseOCRProcessor, options: Optional[PipelineOptions] = None,
+                 on_progress: Optional[Callable[[FileResult, int, Optional[int]], None]] = None):
+        self.ocr = ocr
+        self.options = options or PipelineOptions()
+        self.on_progress = on_progress
+        # Gravador único do JSONL, aberto durante run e process_file
+        self._dataset: Optional[JsonlWriter] = None
+        self._manifest: Optional[JobManifest] = None
+        # Total de arquivos do diretório, conhecido quando a contagem em paralelo termina
+        self._expected_total: Optional[int] = None
+
+    @property
+    def stop_event(self) -> threading.Event:
+        return self.ocr.stop_event
+
+    def run(self, input_dir: str, output_dir: str) -> Dict[str, float]:
+        """
+        Processa todos os arquivos do diretório de entrada.
+
+        Returns:
+            Resumo da execução com contagens, tempo total e vazão
+        """
+        logging.info(f"Iniciando processamento de {input_dir} com {self.options.engine_name} OCR")
+        # Os arquivos são enviados às etapas à medida que a listagem avança;
+        # o total, usado apenas no progresso, é contado em paralelo (opcional)
+        # ou ao fim da própria listagem
+        self._expected_total = None
+
+        if self.options.count_total:
+            def count():
+                self._expected_total = sum(1 for _ in self.iter_inputs(input_dir, output_dir))
+
+            threading.Thread(target=count, name="pipeline-counter", daemon=True).start()
+        return self.process_files(self._counted(self.iter_inputs(input_dir, output_dir)),
+                                  output_dir, input_dir=input_dir)
+
+    def _counted(self, files: Iterable[str]) -> Iterator[str]:
+        """Repassa os arquivos e registra o total quando a listagem termina"""
+        listed = 0
+        for path in files:
+            listed += 1
+            yield path
+        self._expected_total = listed
+
+    def iter_inputs(self, input_dir: str, output_dir: str) -> Iterator[str]:
+        options = self.options
+        return iter_input_files(input_dir, options.recursive, options.include, options.exclude,
+                                skip_dirs=(output_dir,))
+
+    def watch(self, input_dir: str, output_dir: str,
+              poll_interval: float = DEFAULT_POLL_INTERVAL,
+              settle_time: float = DEFAULT_SETTLE_TIME) -> Dict[str, float]:
+        """
+        Modo contínuo: processa os arquivos existentes e depois os que chegarem
+        ao diretório de entrada, até que o stop_event seja definido. As etapas,
+        o gravador do JSONL e os motores (com os seus pools) ficam ativos entre
+        as chegadas.
+        """
+        watcher = FolderWatcher(input_dir, lambda path: list(self.iter_inputs(path, output_dir)),
+                                poll_interval, settle_time)
+        logging.info(f"Observando {input_dir} com {self.options.engine_name} OCR")
+        self._expected_total = None
+        return self.process_files(watcher.watch(self.stop_event), output_dir, input_dir=input_dir)
+
+    def process_files(self, files: Iterable[str], output_dir: str, total: Optional[int] = None,
+                      input_dir: Optional[str] = None) -> Dict[str, float]:
+        """
+        Processa os arquivos à medida que o iterável os fornece, admitindo no
+        máximo options.max_in_flight arquivos (e options.max_in_flight_bytes)
+        ainda não concluídos. total é repassado ao on_progress (None quando
+        desconhecido). Com input_dir, as saídas espelham os subdiretórios.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        start = time.monotonic()
+        results: List[FileResult] = []
+        admission = AdmissionControl(self.options.max_in_flight, self.options.max_in_flight_bytes)
+
+        def admit():
+            for sequence, path in enumerate(files):
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    size = 0
+                if not admission.acquire(size, self.stop_event):
+                    return
+                yield _Job(path, self._output_dir_for(path, input_dir, output_dir), sequence, size,
+                           self._order_key_for(path, input_dir))
+
+        def collect(job: _Job):
+            admission.release(job.size)
+            if self._dataset is not None and not job.dataset_written:
+                # Documento que falhou antes da gravação: libera a sequência
+                self._dataset.write(None, job.sequence)
+            result = job.result()
+            if self._manifest is not None and not job.skipped:
+                self._manifest.finish(job.path, job.success, result.seconds, job.outputs,
+                                      job.dataset_entry, job.sha256)
+            results.append(result)
+            if self.on_progress is not None:
+                self.on_progress(result, len(results), total if total is not None else self._expected_total)
+
+        # Momento do cancelamento, para medir quanto as etapas levam para parar
+        stopped_at: List[float] = []
+        finished = threading.Event()
+
+        def watch_stop():
+            while not finished.is_set():
+                if self.stop_event.wait(STOP_WATCH_INTERVAL):
+                    stopped_at.append(time.monotonic())
+                    return
+
+        if total != 0:
+            threading.Thread(target=watch_stop, name="pipeline-stop-watch", daemon=True).start()
+            self._open_manifest(output_dir)
+            opened = self._open_dataset(output_dir)
+            try:
+                run_stages(self.build_stages(), admit(), collect, self.stop_event)
+            finally:
+                finished.set()
+                # Mesmo após um cancelamento o arquivo termina com linhas completas
+                if opened:
+                    self._close_dataset()
+                self._close_manifest(output_dir)
+
+        cancel_seconds = None
+        if stopped_at:
+            cancel_seconds = time.monotonic() - stopped_at[0]
+            logging.info(f"Processamento interrompido; etapas encerradas {cancel_seconds:.2f}s após o cancelamento")
+
+        successful = [result.path for result in results if result.success]
+        skipped = sum(1 for result in results if result.skipped)
+        if self.options.extract_data and not self.stop_event.is_set():
+            self.extract_structured_data(successful, output_dir)
+
+        elapsed = time.monotonic() - start
+        files_total = total if total is not None else self._expected_total
+        total_bytes = sum(result.size for result in results if not result.skipped)
+        return {
+            "files": files_total if files_total is not None else len(results),
+            "processed": len(results),
+            "succeeded": len(successful) - skipped,
+            "skipped": skipped,
+            "failed": len(results) - len(successful),
+            "cancelled": self.stop_event.is_set(),
+            # Tempo entre o cancelamento e o encerramento das etapas (None sem cancelamento)
+            "cancel_seconds": cancel_seconds,
+            "elapsed": elapsed,
+            "bytes": total_bytes,
+            "files_per_minute": (len(results) - skipped) * 60 / elapsed if elapsed > 0 else 0.0,
+            "mb_per_second": total_bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0.0
+        }
+
+    @staticmethod
+    def _order_key_for(path: str, input_dir: Optional[str]) -> Optional[str]:
+        if input_dir is None:
+            return None
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(input_dir))
+        if relative.startswith(os.pardir):
+            return None
+        return scan_order_key(relative)
+
+    @staticmethod
+    def _output_dir_for(path: str, input_dir: Optional[str], output_dir: str) -> str:
+        if input_dir is None:
+            return output_dir
+        relative = os.path.relpath(os.path.dirname(os.path.abspath(path)), os.path.abspath(input_dir))
+        if relative == os.curdir or relative.startswith(os.pardir):
+            return output_dir
+        return os.path.join(output_dir, relative)
+
+    def build_stages(self) -> List[Stage]:
+        """
+        Etapas do lote: preparação (leitura, cache e pré-análise do próximo
+        documento enquanto o atual está no OCR), OCR, segmentação em
+        parágrafos, gravação das saídas e, se configurado, sumário por IA.
+        """
+        options = self.options
+        stop_event = self.stop_event
+        stages = [
+            Stage("preparação", self._ingest, options.ingest_workers, options.queue_size, stop_event),
+            Stage("ocr", self._recognize, options.workers or self.ocr.recommended_workers(),
+                  options.queue_size, stop_event),
+            # Segmentação por expressões regulares: uma thread basta sob o GIL
+            Stage("segmentação", self._segment, 1, options.queue_size, stop_event),
+            Stage("saída", self._write, options.output_workers, options.queue_size, stop_event)
+        ]
+        if options.generate_summary:
+            stages.append(Stage("enriquecimento", self._enrich, options.enrich_workers,
+                                options.queue_size, stop_event))
+        return stages
+
+    def process_file(self, file_path: str, output_dir: str) -> FileResult:
+        """Executa todas as etapas para um único arquivo, na thread atual"""
+        job = _Job(file_path, output_dir)
+        try:
+            job.size = os.path.getsize(file_path)
+        except OSError:
+            pass
+        opened = self._open_dataset(output_dir)
+        try:
+            for handler in (self._ingest, self._recognize, self._segment, self._write, self._enrich):
+                if not handler(job):
+                    break
+        finally:
+            if opened:
+                self._close_dataset()
+        return job.result()
+
+    def manifest_config(self) -> str:
+        """Configuração registrada no manifesto; se mudar, os arquivos são reprocessados"""
+        return f"{self.ocr.cache_signature()}|{self.options.lang}|{','.join(sorted(self.options.output_formats))}"
+
+    def _open_manifest(self, output_dir: str) -> None:
+        if not self.options.resume:
+            return
+        os.makedirs(output_dir, exist_ok=True)
+        manifest_path = os.path.join(output_dir, MANIFEST_FILE_NAME)
+        dataset_path = os.path.join(output_dir, DATASET_FILE_NAME)
+        if not os.path.exists(manifest_path) and os.path.exists(dataset_path):
+            # JSONL de execuções sem manifesto: preservado, pois não pode ser regenerado
+            backup_path = f"{os.path.splitext(dataset_path)[0]}.anterior.jsonl"
+            os.replace(dataset_path, backup_path)
+            logging.warning(f"{dataset_path} gerado sem manifesto foi movido para {backup_path}")
+
+        self._manifest = JobManifest(manifest_path, self.manifest_config())
+        if 'json' in self.options.output_formats:
+            # Descarta entradas duplicadas ou incompletas de uma execução interrompida
+            self._manifest.rewrite_dataset(dataset_path)
+
+    def _close_manifest(self, output_dir: str) -> None:
+        manifest, self._manifest = self._manifest, None
+        if manifest is None:
+            return
+        try:
+            # O JSONL gravado durante a execução (em lotes, na ordem de --ordered)
+            # só é regenerado, na ordem da varredura, se algum arquivo já concluído
+            # foi reprocessado e deixou a entrada antiga no arquivo
+            if 'json' in self.options.output_formats and manifest.superseded_entries:
+                manifest.rewrite_dataset(os.path.join(output_dir, DATASET_FILE_NAME))
+        finally:
+            manifest.close()
+
+    def _open_dataset(self, output_dir: str) -> bool:
+        """Abre o gravador do JSONL; retorna False se já estiver aberto ou não for usado"""
+        if self._dataset is not None or 'json' not in self.options.output_formats:
+            return False
+        options = self.options
+        os.makedirs(output_dir, exist_ok=True)
+        self._dataset = JsonlWriter(os.path.join(output_dir, DATASET_FILE_NAME),
+                                    ordered=options.ordered_output,
+                                    batch_size=options.jsonl_batch_size,
+                                    fsync=options.jsonl_fsync).open()
+        return True
+
+    def _close_dataset(self) -> None:
+        dataset, self._dataset = self._dataset, None
+        dataset.close()
+
+    def _ingest(self, job: '_Job') -> bool:
+        job.start = time.monotonic()
+        file_name = os.path.basename(job.path)
+        try:
+            if self._manifest is not None:
+                if self._manifest.is_done(job.path, job.order_key):
+                    logging.info(f"{file_name} já processado em uma execução anterior; ignorando")
+                    job.skipped = True
+                    return False
+                self._manifest.start(job.path, job.order_key)
+                job.sha256 = file_sha256(job.path)
+            # PDFs e imagens seguem pelo mesmo motor, com cache e paralelismo
+            job.prepared = self.ocr.prepare(job.path, self.options.lang)
+            return True
+        except Exception as e:
+            logging.error(f"Erro ao ler {job.path}: {e}")
+            return False
+
+    def _recognize(self, job: '_Job') -> bool:
+        file_name = os.path.basename(job.path)
+        try:
+            logging.info(f"Processando {file_name} com {self.options.engine_name} OCR")
+            job.text = self.ocr.recognize(job.prepared, self.options.lang)
+            job.prepared = None
+
+            if not job.text or job.text.startswith("Erro:"):
+                logging.error(f"Falha ao extrair texto de {file_name}: {job.text}")
+                return False
+            return True
+
+        except Exception as e:
+            logging.error(f"Erro desconhecido ao processar {job.path}: {e}")
+            return False
+
+    def _segment(self, job: '_Job') -> bool:
+        job.paragraphs = self.ocr.get_paragraphs(job.text)
+        return True
+
+    def _write(self, job: '_Job') -> bool:
+        """Gera as saídas configuradas; retorna True se o documento segue para o sumário"""
+        formats = self.options.output_formats
+        file_name = os.path.basename(job.path)
+        heading = f"Imagem: {file_name}" if job.is_image else f"Documento: {file_name}"
+        engine_label = f"{self.options.engine_name.capitalize()} OCR"
+
+        success = True
+        os.makedirs(job.output_dir, exist_ok=True)
+        if 'docx' in formats:
+            job.docx_path = self.write_docx(job.path, job.output_dir, job.paragraphs, heading, engine_label)
+            success = job.docx_path is not None
+            if success:
+                job.outputs.append(job.docx_path)
+        if 'json' in formats:
+            job.dataset_entry = self.write_json(job.path, job.text, job.paragraphs, job.sequence)
+            job.dataset_written = True
+            success = job.dataset_entry is not None and success
+            if job.dataset_entry is not None:
+                job.outputs.append(self._dataset.path)
+        if 'md' in formats:
+            MarkdownFormatter.save_as_markdown(job.output_dir, file_name, job.text)
+            job.outputs.append(os.path.join(job.output_dir, f"{os.path.splitext(file_name)[0]}.md"))
+
+        job.success = success
+        return self.options.generate_summary and job.docx_path is not None
+
+    def _enrich(self, job: '_Job') -> bool:
+        self.generate_summary_and_toc(job.docx_path)
+        return True
+
+    def write_docx(self, file_path: str, output_dir: str, paragraphs: List[Tuple[str, str]],
+                   heading: str, engine_label: str) -> Optional[str]:
+        """Cria o DOCX do arquivo e retorna o seu caminho, ou None em caso de erro"""
+        try:
+            docx_path = os.path.join(output_dir,
+                                     f"{os.path.splitext(os.path.basename(file_path))[0]}.docx")
+
+            doc = Document()
+            DocxFormatter.setup_document_styles(doc)
+            doc.add_heading(heading, level=0)
+            doc.add_paragraph(f"Processado com: {engine_label}")
+            doc.add_paragraph(f"Data de processamento: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+            doc.add_paragraph(f"Idioma: {self.options.lang}")
+            doc.add_paragraph("").paragraph_format.space_after = Pt(20)
+
+            for para_text, para_type in paragraphs:
+                DocxFormatter.add_paragraph_with_style(doc, para_text, para_type)
+
+            doc.save(docx_path)
+            logging.info(f"Documento DOCX criado: {docx_path}")
+            return docx_path
+
+        except Exception as e:
+            logging.error(f"Erro ao gerar DOCX para {file_path}: {e}")
+            return None
+
+    def write_json(self, file_path: str, text: str, paragraphs: List[Tuple[str, str]],
+                   sequence: int = 0) -> Optional[Dict]:
+        """
+        Envia a entrada do documento ao gravador do JSONL (ver _open_dataset).
+
+        Returns:
+            A entrada gravada, ou None se o texto não gerou uma entrada válida
+        """
+        try:
+            entry = JsonFormatter.create_mistral_entry(text, paragraphs)
+            if not entry:
+                logging.warning(f"Ignorando entrada inválida para {file_path}")
+        except Exception as e:
+            logging.error(f"Erro JSON: {e}")
+            entry = None
+
+        # Sem entrada a sequência é liberada assim mesmo, para não reter as seguintes
+        entry = entry or None
+        self._dataset.write(entry, sequence)
+        return entry
+
+    def generate_summary_and_toc(self, docx_path: str) -> bool:
+        if not self.options.api_key:
+            logging.warning("API Key do Mistral não configurada. Não é possível gerar sumário.")
+            return False
+
+        try:
+            # Importado sob demanda: o cliente mistralai só é necessário para o sumário
+            from ..utils.document_enhancer import DocumentEnhancer
+
+            logging.info(f"Iniciando geração de sumário e tabela de conteúdo para {os.path.basename(docx_path)}")
+            enhancer = DocumentEnhancer(self.options.api_key)
+            success = enhancer.process_document(docx_path, "mistral-large-latest")
+
+            if success:
+                logging.info(f"Sumário e tabela de conteúdo gerados com sucesso para {os.path.basename(docx_path)}")
+            else:
+                logging.error(f"Falha ao gerar sumário e tabela de conteúdo para {os.path.basename(docx_path)}")
+            return bool(success)
+
+        except Exception as e:
+            logging.error(f"Erro ao gerar sumário e tabela de conteúdo: {e}")
+            return False
+
+    def extract_structured_data(self, file_paths: List[str], output_dir: str) -> Optional[str]:
+        """Extrai dados estruturados dos arquivos processados para um CSV"""
+        if not self.options.api_key:
+            logging.warning("API Key do Mistral não configurada. Não é possível extrair dados.")
+            return None
+        if not file_paths:
+            logging.warning("Nenhum arquivo processado com sucesso para extração de dados.")
+            return None
+
+        logging.info("Iniciando extração de dados estruturados...")
+        try:
+            from ..utils.document_data_extractor import DocumentDataExtractor
+
+            extractor = DocumentDataExtractor(self.options.api_key)
+            data_df = extractor.process_document_batch(file_paths)
+            csv_path = os.path.join(output_dir, EXTRACTED_DATA_FILE_NAME)
+            data_df.to_csv(csv_path, index=False)
+            logging.info(f"Dados estruturados salvos em {csv_path}")
+            return csv_path
+        except Exception as e:
+            logging.error(f"Erro na extração de dados: {e}")
+            return None
+
+    def engine_stats(self) -> Dict[str, Dict[str, float]]:
+        """Estatísticas do cache e dos motores usados na execução"""
+        stats = {}
+        if self.ocr.cache is not None:
+            stats["cache"] = self.ocr.cache.stats()
+
+        mistral = None
+        if isinstance(self.ocr, HybridOCR):
+            stats["hybrid"] = self.ocr.stats()
+            mistral = self.ocr.mistral
+        elif isinstance(self.ocr, MistralOCR):
+            mistral = self.ocr
+
+        if mistral is not None:
+            stats["http"] = mistral.http_stats()
+            stats["circuit"] = mistral.circuit_breaker.stats()
+            stats["concurrency"] = mistral.limiter.stats()
+            if mistral.upload_optimizer is not None:
+                stats["upload"] = mistral.upload_optimizer.stats()
+        return stats
+
+    def log_engine_stats(self) -> None:
+        stats = self.engine_stats()
+        if "cache" in stats:
+            cache = stats["cache"]
+            logging.info(f"Cache de OCR: {cache['hits']} acertos, {cache['misses']} falhas "
+                         f"(taxa de acerto {cache['hit_rate']:.0%})")
+        if "hybrid" in stats:
+            hybrid = stats["hybrid"]
+            logging.info(f"OCR híbrido: {hybrid['local_pages']} páginas pelo Tesseract, "
+                         f"{hybrid['escalated_pages']} reenviadas ao Mistral")
+        if "http" in stats:
+            http = stats["http"]
+            logging.info(f"API Mistral: {http['requests']} requisições, {http['retries']} novas tentativas, "
+                         f"latência média {http['avg_latency']:.1f}s (p95 {http['p95_latency']:.1f}s)")
+            concurrency = stats["concurrency"]
+            logging.info(f"Concorrência da API Mistral: limite final {concurrency['limit']} "
+                         f"(máximo {concurrency['peak_limit']}), {concurrency['decreases']} reduções, "
+                         f"{concurrency['throttled']} respostas de sobrecarga")
+            circuit = stats["circuit"]
+            if circuit['opened']:
+                logging.info(f"Circuito da API Mistral aberto {circuit['opened']} vezes, "
+                             f"{circuit['rejected']} requisições recusadas")
+        if "upload" in stats:
+            logging.info(f"Envio otimizado: {stats['upload']['documents']} documentos, "
+                         f"{stats['upload']['saved_bytes'] / 1024 / 1024:.1f} MB economizados")
@@ -0,0 +1,183 @@
+
+
+import logging
+import queue
+import threading
+from typing import Any, Callable, List, Optional
+
+# Intervalo (s) entre verificações do stop_event enquanto aguarda espaço na fila
+PUT_POLL_INTERVAL = 0.2
+
+# Marca o fim da entrada de uma etapa
+_CLOSE = object()
+
+
+class Stage:
+    """
+    Etapa de um pipeline com workers próprios lendo de uma fila limitada. O
+    handler recebe cada item e retorna True para repassá-lo à etapa seguinte
+    ou False para encerrá-lo ali (item concluído ou com falha). Itens
+    encerrados, e os que saem da última etapa, vão para a fila de resultados.
+
+    Quando a fila está cheia, put bloqueia quem produz: as etapas anteriores
+    só avançam no ritmo da mais lenta, e a memória em uso fica limitada a
+    capacity itens por etapa. Com o stop_event definido, os itens ainda na
+    fila são descartados sem processamento.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], bool], workers: int,
+                 capacity: int, stop_event: threading.Event):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.stop_event = stop_event
+        self.queue: queue.Queue = queue.Queue(maxsize=max(1, capacity))
+        self.downstream: Optional['Stage'] = None
+        self.results: Optional[queue.Queue] = None
+        self._threads: List[threading.Thread] = []
+        self._alive = 0
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+
+    def start(self, downstream: Optional['Stage'], results: queue.Queue) -> None:
+        self.downstream = downstream
+        self.results = results
+        self._alive = self.workers
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{index + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item: Any) -> bool:
+        """
+        Enfileira o item, aguardando espaço na fila.
+
+        Returns:
+            False se o stop_event foi definido antes de haver espaço
+        """
+        while True:
+            try:
+                self.queue.put(item, timeout=PUT_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                if self.stop_event.is_set():
+                    return False
+
+    def close(self) -> None:
+        """Sinaliza que não haverá mais itens; os workers terminam após esvaziar a fila"""
+        for _ in range(self.workers):
+            # Os workers continuam consumindo (ou descartando) os itens, então
+            # este put sempre encontra espaço
+            self.queue.put(_CLOSE)
+
+    def join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is _CLOSE:
+                break
+            if self.stop_event.is_set():
+                with self._lock:
+                    self.dropped += 1
+                continue
+
+            try:
+                forward = self.handler(item)
+            except Exception as e:
+                logging.error(f"Erro na etapa {self.name}: {e}")
+                forward = False
+            with self._lock:
+                self.processed += 1
+
+            if forward and self.downstream is not None:
+                if not self.downstream.put(item):
+                    with self._lock:
+                        self.dropped += 1
+            else:
+                self.results.put(item)
+
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        # O último worker a sair fecha a etapa seguinte
+        if last:
+            if self.downstream is not None:
+                self.downstream.close()
+            else:
+                self.results.put(_CLOSE)
+
+
+def run_stages(stages: List[Stage], items, on_result: Callable[[Any], None],
+               stop_event: threading.Event) -> None:
+    """
+    Encadeia as etapas, alimenta a primeira com os itens a partir de uma
+    thread dedicada e chama on_result, na thread atual, para cada item que
+    sai do pipeline. Retorna quando todas as etapas terminam.
+    """
+    results: queue.Queue = queue.Queue()
+    for stage, downstream in zip(stages, stages[1:] + [None]):
+        stage.start(downstream, results)
+
+    def feed():
+        try:
+            for item in items:
+                if stop_event.is_set() or not stages[0].put(item):
+                    break
+        finally:
+            stages[0].close()
+
+    feeder = threading.Thread(target=feed, name="pipeline-feeder", daemon=True)
+    feeder.start()
+
+    while True:
+        item = results.get()
+        if item is _CLOSE:
+            break
+        on_result(item)
+
+    feeder.join()
+    for stage in stages:
+        stage.join()
+
+
+class AdmissionControl:
+    """
+    Limita o trabalho admitido no pipeline e ainda não concluído: no máximo
+    max_items itens e max_bytes bytes. Um arquivo maior que max_bytes é
+    admitido sozinho, quando nada mais estiver em processamento.
+    """
+
+    def __init__(self, max_items: int, max_bytes: Optional[int] = None):
+        self.max_items = max(1, max_items)
+        self.max_bytes = max_bytes
+        self._condition = threading.Condition()
+        self.items = 0
+        self.bytes = 0
+
+    def _cost(self, size: int) -> int:
+        return size if self.max_bytes is None else min(size, self.max_bytes)
+
+    def acquire(self, size: int, stop_event: threading.Event) -> bool:
+        """Aguarda espaço para o item; retorna False se o stop_event for definido antes"""
+        cost = self._cost(size)
+        with self._condition:
+            while (self.items >= self.max_items or
+                   (self.max_bytes is not None and self.items and self.bytes + cost > self.max_bytes)):
+                if stop_event.is_set():
+                    return False
+                self._condition.wait(PUT_POLL_INTERVAL)
+            if stop_event.is_set():
+                return False
+            self.items += 1
+            self.bytes += cost
+            return True
+
+    def release(self, size: int) -> None:
+        with self._condition:
+            self.items -= 1
+            self.bytes -= self._cost(size)
+            self._condition.notify_all()
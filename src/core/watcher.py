@@ -0,0 +1,91 @@
+
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Tuple
+from ..utils.ocr_cache import file_sha256
+
+DEFAULT_POLL_INTERVAL = 2.0
+# Tempo (s) sem mudança de tamanho e data para considerar o arquivo completo
+DEFAULT_SETTLE_TIME = 3.0
+
+
+class FolderWatcher:
+    """
+    Observa um diretório por varredura periódica, sem dependências extras e
+    funcionando também em compartilhamentos de rede, onde eventos do sistema
+    de arquivos não são confiáveis.
+
+    Um arquivo é entregue quando é novo ou foi modificado e o seu tamanho e
+    data de modificação ficaram estáveis por settle_time segundos (o scanner
+    terminou de gravá-lo). Arquivos apenas tocados, com o mesmo conteúdo
+    (SHA-256) já entregue, não são entregues de novo.
+    """
+
+    def __init__(self, input_dir: str, list_files: Callable[[str], List[str]],
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 settle_time: float = DEFAULT_SETTLE_TIME,
+                 clock: Callable[[], float] = time.monotonic):
+        self.input_dir = input_dir
+        self.list_files = list_files
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self._clock = clock
+        # Último (tamanho, mtime) observado e desde quando está inalterado
+        self._observed: Dict[str, Tuple[int, float]] = {}
+        self._stable_since: Dict[str, float] = {}
+        # (tamanho, mtime, sha256) de cada arquivo quando foi entregue
+        self._delivered: Dict[str, Tuple[int, float, str]] = {}
+
+    def poll(self) -> List[str]:
+        """Varre o diretório uma vez e retorna os arquivos prontos para processamento"""
+        now = self._clock()
+        ready = []
+        present = set()
+
+        for path in self.list_files(self.input_dir):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            present.add(path)
+            snapshot = (stat.st_size, stat.st_mtime)
+
+            delivered = self._delivered.get(path)
+            if delivered is not None and delivered[:2] == snapshot:
+                continue
+            if self._observed.get(path) != snapshot:
+                self._observed[path] = snapshot
+                self._stable_since[path] = now
+                continue
+            if now - self._stable_since[path] < self.settle_time or stat.st_size == 0:
+                continue
+
+            try:
+                sha256 = file_sha256(path)
+            except OSError as e:
+                # Ainda bloqueado pelo processo que está gravando
+                logging.debug(f"{path} ainda não pode ser lido: {e}")
+                continue
+            self._delivered[path] = (stat.st_size, stat.st_mtime, sha256)
+            if delivered is not None and delivered[2] == sha256:
+                continue
+            ready.append(path)
+
+        for path in list(self._observed):
+            if path not in present:
+                self._observed.pop(path, None)
+                self._stable_since.pop(path, None)
+                self._delivered.pop(path, None)
+        return ready
+
+    def watch(self, stop_event: threading.Event) -> Iterator[str]:
+        """Gera os arquivos prontos até que o stop_event seja definido"""
+        while not stop_event.is_set():
+            for path in self.poll():
+                if stop_event.is_set():
+                    return
+                yield path
+            stop_event.wait(self.poll_interval)
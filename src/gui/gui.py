@@ -1,15 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import logging
+import logging.handlers
 import os
+from ..core.pipeline import BatchPipeline, FileResult, PipelineOptions
 from ..ocr.tesseract_ocr import TesseractOCR
+from ..ocr import tesserocr_ocr
+from ..ocr.tesserocr_ocr import TesserocrOCR
 from ..ocr.mistral_ocr import MistralOCR
-from ..utils.docx_formatter import DocxFormatter
-from ..utils.json_formatter import JsonFormatter
-from ..utils.document_data_extractor import DocumentDataExtractor
-from ..utils.document_enhancer import DocumentEnhancer
+from ..ocr.mistral_bundler import MistralBundler
+from ..ocr.hybrid_ocr import HybridOCR
+from ..ocr.image_preprocessor import PREPROCESSING_PRESETS, preset_options
+from ..ocr.upload_optimizer import UploadOptimizer
+from ..utils.ocr_cache import OCRCache
 import threading
-import datetime
+import uuid
+from typing import Optional
+import requests
 
 class PDFProcessorApp(tk.Tk):
     """Interface gráfica principal"""
@@ -20,11 +27,12 @@ class PDFProcessorApp(tk.Tk):
         self.geometry("800x700")
         
         self.tesseract_ocr = TesseractOCR()
+        # Tesseract em processo, disponível apenas com o pacote tesserocr
+        self.tesserocr_ocr = TesserocrOCR() if tesserocr_ocr.TESSEROCR_AVAILABLE else None
         self.mistral_ocr = MistralOCR()
+        self.hybrid_ocr = HybridOCR(self.tesseract_ocr, self.mistral_ocr)
         self.current_ocr = self.tesseract_ocr
         
-        self._json_write_lock = threading.Lock()
-        
         self._setup_ui()
         self._update_api_stats()
 
@@ -34,6 +42,9 @@ class PDFProcessorApp(tk.Tk):
         self.progress_var = tk.DoubleVar()
         self.lang_var = tk.StringVar(value='por')
         self.ocr_type_var = tk.StringVar(value='tesseract')
+        self.tesseract_workers_var = tk.IntVar(value=1)
+        self.preprocess_var = tk.StringVar(value='full')
+        self.deskew_var = tk.BooleanVar(value=True)
         
         main_frame = ttk.Frame(self)
         main_frame.pack(fill='both', expand=True, padx=5, pady=5)
@@ -74,6 +85,50 @@ class PDFProcessorApp(tk.Tk):
             variable=self.extract_data_var
         ).pack(anchor='w')
         
+        self.save_as_md_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            extract_frame,
+            text="Salvar também o texto em Markdown (.md)",
+            variable=self.save_as_md_var
+        ).pack(anchor='w')
+        
+        self.watch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            extract_frame,
+            text="Continuar observando a pasta de entrada (novos arquivos até Cancelar)",
+            variable=self.watch_var
+        ).pack(anchor='w')
+        
+        self.use_cache_var = tk.BooleanVar(value=True)
+        cache_frame = ttk.Frame(left_frame)
+        cache_frame.pack(fill='x', padx=10, pady=5)
+        ttk.Checkbutton(
+            cache_frame,
+            text="Reutilizar resultados de OCR anteriores (cache)",
+            variable=self.use_cache_var
+        ).pack(anchor='w')
+        
+        self.optimize_upload_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            cache_frame,
+            text="Recomprimir PDFs digitalizados antes do envio ao Mistral",
+            variable=self.optimize_upload_var
+        ).pack(anchor='w')
+        
+        self.bundle_small_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            cache_frame,
+            text="Agrupar documentos pequenos em uma requisição ao Mistral",
+            variable=self.bundle_small_var
+        ).pack(anchor='w')
+        
+        self.mistral_fallback_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            cache_frame,
+            text="Usar Tesseract quando a API Mistral estiver indisponível",
+            variable=self.mistral_fallback_var
+        ).pack(anchor='w')
+        
         self._create_controls(left_frame)
         self._create_progress_bar(left_frame)
 
@@ -112,6 +167,29 @@ class PDFProcessorApp(tk.Tk):
             command=self._update_ocr_processor
         ).pack(anchor='w', padx=10)
         
+        ttk.Radiobutton(
+            ocr_frame, 
+            text="Tesseract em processo (tesserocr)", 
+            variable=self.ocr_type_var,
+            value="tesserocr",
+            command=self._update_ocr_processor,
+            state='normal' if self.tesserocr_ocr is not None else 'disabled'
+        ).pack(anchor='w', padx=10)
+        
+        workers_frame = ttk.Frame(ocr_frame)
+        workers_frame.pack(anchor='w', padx=30)
+        ttk.Label(workers_frame, text="Processos por documento:").pack(side='left')
+        ttk.Spinbox(workers_frame, from_=1, to=os.cpu_count() or 1, width=4,
+                    textvariable=self.tesseract_workers_var, state='readonly').pack(side='left')
+
+        preprocess_frame = ttk.Frame(ocr_frame)
+        preprocess_frame.pack(anchor='w', padx=30)
+        ttk.Label(preprocess_frame, text="Pré-processamento:").pack(side='left')
+        ttk.Combobox(preprocess_frame, textvariable=self.preprocess_var, width=9,
+                     values=list(PREPROCESSING_PRESETS), state='readonly').pack(side='left')
+        ttk.Checkbutton(preprocess_frame, text="Corrigir inclinação",
+                        variable=self.deskew_var).pack(side='left', padx=5)
+        
         ttk.Radiobutton(
             ocr_frame, 
             text="Mistral OCR (digitar API Key)", 
@@ -128,6 +206,14 @@ class PDFProcessorApp(tk.Tk):
             command=self._update_ocr_processor
         ).pack(anchor='w', padx=10)
         
+        ttk.Radiobutton(
+            ocr_frame, 
+            text="Híbrido (Tesseract; Mistral nas páginas de baixa confiança)", 
+            variable=self.ocr_type_var,
+            value="hybrid",
+            command=self._update_ocr_processor
+        ).pack(anchor='w', padx=10)
+        
         self.mistral_config_frame = ttk.Frame(ocr_frame)
         self.mistral_config_frame.pack(fill='x', pady=5)
         
@@ -205,7 +291,7 @@ class PDFProcessorApp(tk.Tk):
             }
             
             response = requests.post(
-                "https://api.mistral.ai/v1/ocr",
+                self.mistral_ocr.api_url,
                 headers=headers,
                 json=test_payload,
                 timeout=10
@@ -263,12 +349,23 @@ class PDFProcessorApp(tk.Tk):
             logging.info("Usando Tesseract OCR para processamento")
             self.mistral_config_frame.pack_forget()
             
+        elif ocr_type == "tesserocr":
+            self.current_ocr = self.tesserocr_ocr
+            logging.info("Usando Tesseract em processo (tesserocr) para processamento")
+            self.mistral_config_frame.pack_forget()
+            
         elif ocr_type == "mistral":
             self.mistral_ocr.api_key = self.api_key_entry.get().strip()
             self.current_ocr = self.mistral_ocr
             logging.info("Usando Mistral OCR para processamento")
             self.mistral_config_frame.pack(fill='x', pady=5)
             
+        elif ocr_type == "hybrid":
+            self.mistral_ocr.api_key = self.api_key_entry.get().strip()
+            self.current_ocr = self.hybrid_ocr
+            logging.info("Usando OCR híbrido: Tesseract com Mistral nas páginas de baixa confiança")
+            self.mistral_config_frame.pack(fill='x', pady=5)
+            
         elif ocr_type == "mistral_file":
             api_key = self._load_api_key_from_file()
             if api_key:
@@ -332,7 +429,7 @@ class PDFProcessorApp(tk.Tk):
         
         ocr_type = self.ocr_type_var.get()
         
-        if ocr_type == "mistral":
+        if ocr_type in ("mistral", "hybrid"):
             if not self.api_key_entry.get().strip():
                 messagebox.showwarning("Aviso", "API Key do Mistral OCR não configurada. Por favor, configure uma chave válida.")
                 return        
@@ -341,6 +438,23 @@ class PDFProcessorApp(tk.Tk):
 
         self.tesseract_ocr.stop_event.clear()
         self.mistral_ocr.stop_event.clear()
+        self.tesseract_ocr.max_workers = self.tesseract_workers_var.get()
+        preprocessing = preset_options(self.preprocess_var.get(), deskew=self.deskew_var.get())
+        self.tesseract_ocr.preprocessing = preprocessing
+        if self.tesserocr_ocr is not None:
+            self.tesserocr_ocr.stop_event.clear()
+            self.tesserocr_ocr.max_workers = self.tesseract_workers_var.get()
+            self.tesserocr_ocr.preprocessing = preprocessing
+        
+        cache = OCRCache(os.path.join(output_dir, ".ocr_cache")) if self.use_cache_var.get() else None
+        self.tesseract_ocr.cache = cache
+        if self.tesserocr_ocr is not None:
+            self.tesserocr_ocr.cache = cache
+        self.mistral_ocr.cache = cache
+        self.hybrid_ocr.cache = cache
+        self.mistral_ocr.upload_optimizer = UploadOptimizer() if self.optimize_upload_var.get() else None
+        self.mistral_ocr.bundler = MistralBundler(self.mistral_ocr) if self.bundle_small_var.get() else None
+        self.mistral_ocr.fallback_ocr = self.tesseract_ocr if self.mistral_fallback_var.get() else None
         
         self._update_ocr_processor()
         
@@ -356,210 +470,46 @@ class PDFProcessorApp(tk.Tk):
 
     def _process_files(self, input_dir: str, output_dir: str):
         try:
-            pdfs = [f for f in os.listdir(input_dir) if f.lower().endswith('.pdf')]
-            images = [f for f in os.listdir(input_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp'))]
-            
-            all_files = pdfs + images
-            
-            if not all_files:
-                messagebox.showinfo("Informação", "Nenhum arquivo PDF ou imagem encontrado no diretório de entrada.")
-                return
-            
-            logging.info(f"Iniciando processamento de {len(all_files)} arquivos ({len(pdfs)} PDFs, {len(images)} imagens) com {self.ocr_type_var.get()} OCR")
-
-            processed_files = []
+            formats = ('docx', 'json', 'md') if self.save_as_md_var.get() else ('docx', 'json')
+            options = PipelineOptions(
+                lang=self.lang_var.get(),
+                output_formats=formats,
+                engine_name=self.ocr_type_var.get(),
+                api_key=self.mistral_ocr.api_key,
+                generate_summary=self.generate_summary_var.get(),
+                extract_data=self.extract_data_var.get()
+            )
+            pipeline = BatchPipeline(self.current_ocr, options,
+                                     on_progress=self._on_file_processed)
 
-            with threading.ThreadPoolExecutor() as executor:
-                futures = {executor.submit(self._process_single_file_or_image,
-                                        os.path.join(input_dir, f),
-                                        output_dir): f for f in all_files}
+            if self.watch_var.get():
+                summary = pipeline.watch(input_dir, output_dir)
+                pipeline.log_engine_stats()
+                messagebox.showinfo("Interrompido", f"Observação encerrada. {summary['processed']} arquivos processados.")
+                return
 
-                for i, future in enumerate(as_completed(futures), 1):
-                    file_name = futures[future]
-                    result = future.result()
-                    processed_files.append((os.path.join(input_dir, file_name), result))
-                    
-                    progress = (i / len(all_files)) * 100
-                    self.progress_var.set(round(progress, 1))
-                    self.update_idletasks()
-                    
-                    if self.current_ocr.stop_event.is_set():
-                        break
+            # Basta o primeiro arquivo: a listagem completa é feita sob demanda pelo pipeline
+            if next(pipeline.iter_inputs(input_dir, output_dir), None) is None:
+                messagebox.showinfo("Informação", "Nenhum arquivo PDF ou imagem encontrado no diretório de entrada.")
+                return
 
-            if self.extract_data_var.get() and hasattr(self, 'mistral_ocr') and self.mistral_ocr.api_key:
-                logging.info("Iniciando extração de dados estruturados...")
-                
-                successful_files = [path for path, success in processed_files if success]
-                
-                if successful_files:
-                    try:
-                        extractor = DocumentDataExtractor(self.mistral_ocr.api_key)
-                        data_df = extractor.process_document_batch(successful_files)
-                        csv_path = os.path.join(output_dir, "dados_extraidos.csv")
-                        data_df.to_csv(csv_path, index=False)
-                        logging.info(f"Dados estruturados salvos em {csv_path}")
-                        messagebox.showinfo("Extração de Dados", f"Dados estruturados extraídos de {len(successful_files)} documentos e salvos em {csv_path}")
-                    except Exception as e:
-                        logging.error(f"Erro na extração de dados: {e}")
-                        messagebox.showerror("Erro", f"Falha na extração de dados estruturados: {e}")
-                else:
-                    logging.warning("Nenhum arquivo processado com sucesso para extração de dados.")
+            summary = pipeline.run(input_dir, output_dir)
+            pipeline.log_engine_stats()
 
-            if not self.current_ocr.stop_event.is_set():
-                messagebox.showinfo("Concluído", f"Processamento concluído com sucesso! {i} de {len(all_files)} arquivos processados.")
+            if not summary['cancelled']:
+                messagebox.showinfo("Concluído", f"Processamento concluído com sucesso! {summary['processed']} de {summary['files']} arquivos processados.")
             else:
-                messagebox.showinfo("Interrompido", f"Operação interrompida. {i} de {len(all_files)} arquivos processados.")
+                messagebox.showinfo("Interrompido", f"Operação interrompida. {summary['processed']} de {summary['files']} arquivos processados.")
 
         except Exception as e:
             logging.error(f"Erro crítico: {e}")
             messagebox.showerror("Erro", f"Falha no processamento: {e}")
 
-    def _process_single_file_or_image(self, file_path: str, output_dir: str) -> bool:
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
-        if file_ext in ['.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp']:
-            return self._process_single_image(file_path, output_dir)
-        else:
-            return self._process_single_file(file_path, output_dir)
-    
-    def _process_single_image(self, image_path: str, output_dir: str) -> bool:
-        try:
-            file_name = os.path.basename(image_path)
-            logging.info(f"Processando imagem {file_name}")
-            
-            with Image.open(image_path) as img:
-                preprocessed = self.tesseract_ocr._preprocess_image(img)
-                text = pytesseract.image_to_string(preprocessed, lang=self.lang_var.get())
-                
-                if not text or len(text.strip()) < 50:
-                    logging.warning(f"Texto extraído da imagem {file_name} é muito curto ou vazio.")
-                    return False
-                
-                paragraphs = self.current_ocr.get_paragraphs(text)
-                
-                docx_path = os.path.join(output_dir, f"{os.path.splitext(file_name)[0]}.docx")
-                
-                doc = Document()
-                DocxFormatter.setup_document_styles(doc)
-                doc.add_heading(f"Imagem: {file_name}", level=0)
-                doc.add_paragraph(f"Processado com: Tesseract OCR")
-                doc.add_paragraph(f"Data de processamento: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
-                doc.add_paragraph(f"Idioma: {self.lang_var.get()}")
-                doc.add_paragraph("").paragraph_format.space_after = Pt(20)
-                
-                for para_text, para_type in paragraphs:
-                    DocxFormatter.add_paragraph_with_style(doc, para_text, para_type)
-                
-                doc.save(docx_path)
-                logging.info(f"Documento DOCX criado para imagem: {docx_path}")
-                
-                self._generate_json(image_path, output_dir, text, paragraphs)
-                
-                if self.generate_summary_var.get():
-                    self._generate_summary_and_toc(docx_path, text)
-                
-                return True
-                
-        except Exception as e:
-            logging.error(f"Erro ao processar imagem {image_path}: {e}")
-            return False
-    
-    def _process_single_file(self, file_path: str, output_dir: str):
-        try:
-            file_name = os.path.basename(file_path)
-            logging.info(f"Processando {file_name} com {self.ocr_type_var.get()} OCR")
-            
-            text = self.current_ocr.extract_text(file_path, self.lang_var.get())
-            
-            if not text or text.startswith("Erro:"):
-                logging.error(f"Falha ao extrair texto de {file_name}: {text}")
-                return False
-            
-            paragraphs = self.current_ocr.get_paragraphs(text)
-            
-            docx_success = self._generate_docx(file_path, output_dir, paragraphs)
-            json_success = self._generate_json(file_path, output_dir, text, paragraphs)
-
-            if self.save_as_md_var.get():
-                MarkdownFormatter.save_as_markdown(output_dir, os.path.basename(file_path), text)
-            
-            if self.generate_summary_var.get() and docx_success:
-                docx_path = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(file_path))[0]}.docx")
-                self._generate_summary_and_toc(docx_path, text)
-            
-            return docx_success and json_success
-            
-        except Exception as e:
-            logging.error(f"Erro desconhecido ao processar {file_path}: {e}")
-            return False
-    
-    def _generate_summary_and_toc(self, docx_path: str, text: str) -> bool:
-        try:
-            if not hasattr(self, 'mistral_ocr') or not self.mistral_ocr.api_key:
-                logging.warning("API Key do Mistral não configurada. Não é possível gerar sumário.")
-                messagebox.showwarning("Aviso", "API Key do Mistral é necessária para gerar sumário. Por favor, configure uma chave válida.")
-                return False
-            
-            logging.info(f"Iniciando geração de sumário e tabela de conteúdo para {os.path.basename(docx_path)}")
-            
-            enhancer = DocumentEnhancer(self.mistral_ocr.api_key)
-            success = enhancer.process_document(docx_path, "mistral-large-latest")
-            
-            if success:
-                logging.info(f"Sumário e tabela de conteúdo gerados com sucesso para {os.path.basename(docx_path)}")
-                return True
-            else:
-                logging.error(f"Falha ao gerar sumário e tabela de conteúdo para {os.path.basename(docx_path)}")
-                return False
-                
-        except Exception as e:
-            logging.error(f"Erro ao gerar sumário e tabela de conteúdo: {e}")
-            return False
+    def _on_file_processed(self, result: FileResult, done: int, total: Optional[int]):
+        # No modo de observação o total é desconhecido e a barra mostra a contagem
+        self.progress_var.set(round(done / total * 100, 1) if total else done)
+        self.update_idletasks()
 
-    def _generate_docx(self, file_path: str, output_dir: str, paragraphs: List[Tuple[str, str]]):
-        try:
-            docx_path = os.path.join(output_dir,
-                              f"{os.path.splitext(os.path.basename(file_path))[0]}.docx")
-            
-            doc = Document()
-            DocxFormatter.setup_document_styles(doc)
-            doc.add_heading(f"Documento: {os.path.basename(file_path)}", level=0)
-            doc.add_paragraph(f"Processado com: {self.ocr_type_var.get().capitalize()} OCR")
-            doc.add_paragraph(f"Data de processamento: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
-            doc.add_paragraph(f"Idioma: {self.lang_var.get()}")
-            doc.add_paragraph("").paragraph_format.space_after = Pt(20)
-            
-            for para_text, para_type in paragraphs:
-                DocxFormatter.add_paragraph_with_style(doc, para_text, para_type)
-            
-            doc.save(docx_path)
-            logging.info(f"Documento DOCX criado: {docx_path}")
-            
-        except Exception as e:
-            logging.error(f"Erro ao gerar DOCX para {file_path}: {e}")
-            return False
-        
-        return True
-    
-    def _generate_json(self, file_path: str, output_dir: str, text: str, paragraphs: List[Tuple[str, str]]):
-        try:
-            entry = JsonFormatter.create_mistral_entry(text, paragraphs)
-            
-            if not entry:
-                logging.warning(f"Ignorando entrada inválida para {file_path}")
-                return False
-                
-            output_file = os.path.join(output_dir, "mistral_dataset.jsonl")
-            
-            with self._json_write_lock:
-                with open(output_file, 'a', encoding='utf-8') as f:
-                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
-                
-            return True
-        except Exception as e:
-            logging.error(f"Erro JSON: {e}")
-            return False
-        
     def _update_api_stats(self):
         if hasattr(self, 'active_requests_label') and hasattr(self, 'mistral_ocr'):
             self.active_requests_label.config(text=str(self.mistral_ocr.active_requests))
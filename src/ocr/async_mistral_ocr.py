@@ -0,0 +1,343 @@
+
+
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+import httpx
+from ..core.base_ocr import MIN_TEXT_LENGTH, count_pdf_pages
+from ..utils.circuit_breaker import CircuitOpenError
+from ..utils.streaming import JsonArrayStreamParser
+from .image_frames import is_image_file
+from .mistral_ocr import CHUNK_RETRY_ROUNDS, RESPONSE_CHUNK_SIZE, MistralOCR
+
+DEFAULT_MAX_IN_FLIGHT = 16
+# Intervalo (s) entre verificações do stop_event enquanto há documentos em voo
+STOP_POLL_INTERVAL = 0.2
+
+
+class TokenBucket:
+    """
+    Limitador de taxa por balde de fichas para asyncio. A taxa é expressa por
+    minuto; a capacidade padrão permite rajadas de até 10 segundos de taxa.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute / 6)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        # Pedidos maiores que a capacidade consomem o balde inteiro
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+
+
+class _RequestLimiter:
+    """Limites compartilhados pelas requisições de uma chamada a extract_many"""
+
+    def __init__(self, max_in_flight: int, requests_per_minute: Optional[float],
+                 pages_per_minute: Optional[float]):
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.page_bucket = TokenBucket(pages_per_minute) if pages_per_minute else None
+
+    @contextlib.asynccontextmanager
+    async def slot(self, page_total: int):
+        if self.request_bucket is not None:
+            await self.request_bucket.acquire()
+        if self.page_bucket is not None:
+            await self.page_bucket.acquire(page_total)
+        async with self.semaphore:
+            yield
+
+
+class AsyncMistralOCR(MistralOCR):
+    """
+    Variante assíncrona do MistralOCR. Um único loop asyncio mantém até
+    max_in_flight requisições simultâneas, respeitando limites opcionais de
+    requisições e de páginas por minuto, sem uma thread por requisição.
+    """
+
+    def __init__(self, api_key="", api_url: Optional[str] = None,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 requests_per_minute: Optional[float] = None,
+                 pages_per_minute: Optional[float] = None):
+        super().__init__(api_key=api_key, api_url=api_url, max_connections=max_in_flight)
+        self.max_in_flight = max_in_flight
+        self.requests_per_minute = requests_per_minute
+        self.pages_per_minute = pages_per_minute
+
+    async def extract_many(self, pdf_paths: Iterable[str],
+                           lang: str = 'por') -> AsyncIterator[Tuple[str, str]]:
+        """
+        Processa os documentos concorrentemente e gera (caminho, texto) à medida
+        que cada um termina. Os caminhos são consumidos sob demanda, então a
+        entrada pode ser um gerador com milhares de arquivos. Com o stop_event
+        definido, os documentos em andamento são cancelados e não são gerados.
+        """
+        paths = iter(pdf_paths)
+        # Primitivas asyncio precisam ser criadas dentro do loop em execução
+        limiter = _RequestLimiter(self.max_in_flight, self.requests_per_minute, self.pages_per_minute)
+        limits = httpx.Limits(max_connections=self.max_in_flight,
+                              max_keepalive_connections=self.max_in_flight)
+
+        async with httpx.AsyncClient(limits=limits, timeout=self.http.timeout) as client:
+            pending = set()
+
+            def refill():
+                # Mantém uma fila curta de documentos além dos que estão em voo
+                while len(pending) < self.max_in_flight * 2 and not self.stop_event.is_set():
+                    path = next(paths, None)
+                    if path is None:
+                        return
+                    pending.add(asyncio.ensure_future(self._extract_one(client, path, lang, limiter)))
+
+            refill()
+            try:
+                while pending and not self.stop_event.is_set():
+                    done, pending = await asyncio.wait(pending, timeout=STOP_POLL_INTERVAL,
+                                                       return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+                    refill()
+            finally:
+                for task in pending:
+                    task.cancel()
+                # Aguarda os cancelamentos para que as conexões e arquivos sejam liberados
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def extract_text_async(self, pdf_path: str, lang: str = 'por') -> str:
+        """Versão assíncrona de extract_text para um único documento"""
+        async for _, text in self.extract_many([pdf_path], lang):
+            return text
+        return ""
+
+    async def _extract_one(self, client: httpx.AsyncClient, pdf_path: str, lang: str,
+                           limiter: _RequestLimiter) -> Tuple[str, str]:
+        try:
+            document_key = await asyncio.to_thread(self.document_cache_key, pdf_path, lang)
+            if document_key is not None:
+                cached = await asyncio.to_thread(self.cache.get, document_key)
+                if cached is not None:
+                    return pdf_path, cached
+
+            text_pages, image_pages = await asyncio.to_thread(self._scan_or_all_pages, pdf_path)
+            page_texts = dict(text_pages)
+
+            complete = True
+            if image_pages is None or image_pages:
+                recognized = await self._ocr_pages_async(client, pdf_path, image_pages, lang, limiter)
+                page_texts.update(recognized)
+                complete = image_pages is None or all(page in recognized for page in image_pages)
+
+            text = ''.join(page_texts[page] for page in sorted(page_texts))
+            text = text if len(text.strip()) > MIN_TEXT_LENGTH else ""
+            if document_key is not None and text and complete:
+                await asyncio.to_thread(self.cache.put, document_key, text)
+            return pdf_path, text
+        except CircuitOpenError as e:
+            if self.fallback_ocr is None:
+                logging.error(f"Erro no processamento com {type(self).__name__} de {pdf_path}: {e}")
+                return pdf_path, ""
+            logging.warning(f"{e}; processando {pdf_path} com {type(self.fallback_ocr).__name__}")
+            return pdf_path, await asyncio.to_thread(self.fallback_ocr.extract_text, pdf_path, lang)
+        except Exception as e:
+            logging.error(f"Erro no processamento com {type(self).__name__} de {pdf_path}: {e}")
+            return pdf_path, ""
+
+    async def _ocr_pages_async(self, client: httpx.AsyncClient, pdf_path: str,
+                               pages: Optional[List[int]], lang: str,
+                               limiter: _RequestLimiter) -> Dict[int, str]:
+        if is_image_file(pdf_path):
+            # A montagem do PDF dos quadros decodifica imagens: fora do loop
+            images = self.image_as_pdf(pdf_path, pages)
+            temp_path, frame_numbers = await asyncio.to_thread(images.__enter__)
+            try:
+                recognized = await self._ocr_document_async(client, temp_path, None, lang, limiter)
+                return self.frame_pages(recognized, frame_numbers)
+            finally:
+                images.__exit__(None, None, None)
+        if self.upload_optimizer is not None:
+            optimized = await asyncio.to_thread(self.upload_optimizer.optimize, pdf_path, pages)
+            if optimized is not None:
+                try:
+                    recognized = await self._ocr_document_async(client, optimized.path, None, lang, limiter)
+                    return optimized.original_pages(recognized)
+                finally:
+                    optimized.cleanup()
+        return await self._ocr_document_async(client, pdf_path, pages, lang, limiter)
+
+    async def _ocr_document_async(self, client: httpx.AsyncClient, pdf_path: str,
+                                  pages: Optional[List[int]], lang: str,
+                                  limiter: _RequestLimiter) -> Dict[int, str]:
+        chunks = await asyncio.to_thread(self.page_chunks, pdf_path, pages)
+        document = None
+        if os.path.getsize(pdf_path) < self.stream_threshold:
+            # Documento lido e codificado uma vez para todos os intervalos, fora do loop
+            document = await asyncio.to_thread(self._read_inline_document, pdf_path)
+        return await self._ocr_chunks_async(client, pdf_path, document, lang, chunks, limiter)
+
+    async def _ocr_chunks_async(self, client: httpx.AsyncClient, pdf_path: str,
+                                document: Optional[Dict], lang: str,
+                                chunks: List[Optional[List[int]]],
+                                limiter: _RequestLimiter) -> Dict[int, str]:
+        """
+        Processa os intervalos de páginas concorrentemente, repetindo só os que
+        ficaram com páginas faltando. Um intervalo recusado pela API com erro
+        definitivo (ex.: 400) não é reenviado.
+        """
+        page_texts: Dict[int, str] = {}
+        pending = chunks
+        for _ in range(CHUNK_RETRY_ROUNDS + 1):
+            results = await asyncio.gather(*(
+                self._ocr_chunk_async(client, pdf_path, document, lang, chunk, limiter)
+                for chunk in pending))
+            failed = []
+            for chunk, chunk_texts in zip(pending, results):
+                if chunk_texts is None:
+                    continue
+                page_texts.update(chunk_texts)
+                # Sem a lista de páginas (documento inteiro), só a resposta vazia indica falha
+                missing = not chunk_texts if chunk is None else any(page not in chunk_texts for page in chunk)
+                if missing:
+                    failed.append(chunk)
+            if not failed or self.stop_event.is_set():
+                break
+            pending = failed
+        return page_texts
+
+    async def _ocr_chunk_async(self, client: httpx.AsyncClient, pdf_path: str,
+                               document: Optional[Dict], lang: str, pages: Optional[List[int]],
+                               limiter: _RequestLimiter) -> Optional[Dict[int, str]]:
+        """Retorna None se a API recusou o intervalo com um erro definitivo"""
+        page_total = len(pages) if pages else await asyncio.to_thread(count_pdf_pages, pdf_path)
+        if document is not None:
+            request = {"json": self._payload_for(document, lang, pages)}
+        else:
+            # Arquivo grande: codificado em blocos durante o envio de cada intervalo
+            request = {"body": self.streaming_body(pdf_path, lang, pages)}
+        try:
+            return await self._post_async(client, pages, limiter=limiter, page_total=page_total, **request)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logging.error(f"Erro no envio de {pdf_path} para a API Mistral OCR: {e}")
+            return {}
+
+    async def _post_async(self, client: httpx.AsyncClient, pages: Optional[List[int]],
+                          json: Optional[Dict] = None, body=None,
+                          limiter: Optional[_RequestLimiter] = None,
+                          page_total: int = 1) -> Optional[Dict[int, str]]:
+        """
+        Envia a requisição com as mesmas regras de repetição do cliente síncrono.
+        Um corpo em blocos (body) é gerado novamente a cada tentativa e a
+        resposta é lida página a página. Cada tentativa, inclusive as
+        repetições após 429, ocupa uma vaga e consome as fichas do limiter.
+
+        Returns:
+            {numero_pagina: texto}; {} se as tentativas se esgotaram; None se
+            a API respondeu com um erro que não é repetido (ex.: 400)
+        """
+        http = self.http
+        headers = self._headers()
+        if body is not None:
+            headers["Content-Length"] = str(len(body))
+
+        for attempt in range(http.max_retries + 1):
+            http.check_circuit()
+            started = time.monotonic()
+            content = _aiter_in_thread(body) if body is not None else None
+            # Indica se o resultado da tentativa já foi (ou será, logo abaixo)
+            # registrado no disjuntor
+            settled = False
+            slot = limiter.slot(page_total) if limiter is not None else contextlib.nullcontext()
+            try:
+                async with slot, client.stream('POST', self.api_url, json=json, content=content,
+                                               headers=headers) as response:
+                    if response.status_code == 200:
+                        try:
+                            page_texts = await self._read_pages_async(response, pages)
+                        except (ValueError, KeyError, TypeError):
+                            # Resposta truncada ou malformada: falha do serviço
+                            http.record(time.monotonic() - started, healthy=False)
+                            settled = True
+                            raise
+                        http.record(time.monotonic() - started)
+                        settled = True
+                        return page_texts
+                    await response.aread()
+                error, settled = None, True
+            except httpx.TransportError as e:
+                response, error, settled = None, e, True
+            finally:
+                if not settled:
+                    # Cancelada ou erro inesperado: com o circuito meio aberto,
+                    # a chamada de teste é devolvida ao disjuntor
+                    http.release_probe()
+            healthy = response is not None and response.status_code not in http.retry_status_codes
+            http.record(time.monotonic() - started, healthy)
+
+            if healthy:
+                # Erro que a repetição não resolve (ex.: 400)
+                logging.error(f"Erro na API Mistral OCR: Status {response.status_code} - {response.text}")
+                return None
+            if attempt == http.max_retries:
+                http.record_failure()
+                if response is None:
+                    raise error
+                break
+
+            http.record_retry()
+            await asyncio.sleep(http.retry_delay(attempt, response))
+
+        logging.error(f"Erro na API Mistral OCR: Status {response.status_code} - {response.text}")
+        return {}
+
+    async def _read_pages_async(self, response: httpx.Response,
+                                pages: Optional[List[int]]) -> Dict[int, str]:
+        parser = JsonArrayStreamParser("pages")
+        page_items = []
+        async for chunk in response.aiter_bytes(RESPONSE_CHUNK_SIZE):
+            page_items.extend(parser.feed(chunk))
+        parser.close()
+        return self._collect_pages(page_items, pages)
+
+
+async def _aiter_in_thread(body) -> AsyncIterator[bytes]:
+    """
+    Percorre um corpo síncrono lendo cada bloco fora do loop de eventos. O
+    iterador (e o arquivo aberto por ele) é fechado mesmo se o envio for
+    interrompido.
+    """
+    chunks = iter(body)
+    reading = None
+    try:
+        while True:
+            # Protegida do cancelamento: a leitura continua na thread de qualquer forma
+            reading = asyncio.ensure_future(asyncio.to_thread(next, chunks, None))
+            chunk = await asyncio.shield(reading)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        if reading is not None and not reading.done():
+            # Um gerador não pode ser fechado enquanto executa na outra thread
+            await asyncio.wait([reading])
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
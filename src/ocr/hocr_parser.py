@@ -0,0 +1,116 @@
+
+
+import re
+from typing import Iterator, List, NamedTuple, Optional, Union
+from xml.etree.ElementTree import XMLPullParser
+
+WCONF_PATTERN = re.compile(r'x_wconf\s+(-?\d+)')
+FEED_CHUNK_SIZE = 64 * 1024
+
+
+class HocrWord(NamedTuple):
+    text: str
+    bold: bool
+    confidence: Optional[int]
+
+
+# Um parágrafo é uma lista de linhas; cada linha é uma lista de palavras
+HocrParagraph = List[List[HocrWord]]
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _classes(element) -> List[str]:
+    return element.get('class', '').split()
+
+
+def iter_hocr_paragraphs(hocr_data: Union[bytes, str]) -> Iterator[HocrParagraph]:
+    """
+    Percorre o hOCR do Tesseract de forma incremental, sem construir a árvore
+    completa do documento, e gera um parágrafo (p.ocr_par) por vez.
+
+    Mantém a mesma seleção do caminho com BeautifulSoup: palavras
+    (span.ocrx_word) dentro de linhas (span.ocr_line) dentro de parágrafos.
+
+    Raises:
+        xml.etree.ElementTree.ParseError: se o hOCR não for XML bem formado
+    """
+    if isinstance(hocr_data, str):
+        hocr_data = hocr_data.encode('utf-8')
+
+    parser = XMLPullParser(events=('start', 'end'))
+    paragraph: Optional[HocrParagraph] = None
+    line: Optional[List[HocrWord]] = None
+    line_depth = 0
+
+    for offset in range(0, len(hocr_data), FEED_CHUNK_SIZE):
+        parser.feed(hocr_data[offset:offset + FEED_CHUNK_SIZE])
+        for event, element in parser.read_events():
+            tag = _local_name(element.tag)
+
+            if event == 'start':
+                if tag == 'p' and 'ocr_par' in _classes(element):
+                    paragraph = []
+                elif paragraph is not None and tag == 'span' and 'ocr_line' in _classes(element):
+                    if line is None:
+                        line = []
+                    line_depth += 1
+                continue
+
+            if tag == 'span' and line is not None:
+                classes = _classes(element)
+                if 'ocrx_word' in classes:
+                    match = WCONF_PATTERN.search(element.get('title', ''))
+                    line.append(HocrWord(
+                        text=''.join(element.itertext()).strip(),
+                        bold='bold' in classes,
+                        confidence=int(match.group(1)) if match else None
+                    ))
+                elif 'ocr_line' in classes:
+                    line_depth -= 1
+                    if line_depth == 0:
+                        paragraph.append(line)
+                        line = None
+                        element.clear()
+            elif tag == 'p' and paragraph is not None and 'ocr_par' in _classes(element):
+                yield paragraph
+                paragraph = None
+                line = None
+                line_depth = 0
+                element.clear()
+
+    parser.close()
+
+
+def parse_hocr(hocr_data: Union[bytes, str]) -> List[HocrParagraph]:
+    """Retorna todos os parágrafos do hOCR (ver iter_hocr_paragraphs)"""
+    return list(iter_hocr_paragraphs(hocr_data))
+
+
+def format_paragraphs(paragraphs: List[HocrParagraph]) -> str:
+    """Monta o texto da página no formato usado pelo TesseractOCR"""
+    text = ""
+    for paragraph in paragraphs:
+        lines = []
+        for line in paragraph:
+            lines.append(' '.join(f"**{word.text}**" if word.bold else word.text for word in line))
+        text += '\n'.join(lines) + '\n\n'
+    return text
+
+
+def page_confidence(paragraphs: List[HocrParagraph]) -> Optional[float]:
+    """
+    Confiança média da página (0 a 100), ponderada pelo número de caracteres
+    de cada palavra. Retorna None se a página não tiver palavras com confiança.
+    """
+    total = weight = 0
+    for paragraph in paragraphs:
+        for line in paragraph:
+            for word in line:
+                if word.confidence is None or not word.text:
+                    continue
+                total += word.confidence * len(word.text)
+                weight += len(word.text)
+    return total / weight if weight else None
@@ -0,0 +1,76 @@
+
+
+import logging
+import threading
+from typing import Dict, List, Optional
+from ..core.base_ocr import BaseOCRProcessor
+from .mistral_ocr import MistralOCR
+from .tesseract_ocr import ScoredPage, TesseractOCR
+
+# Confiança média (0 a 100) abaixo da qual a página é reenviada ao Mistral
+DEFAULT_MIN_CONFIDENCE = 75.0
+
+
+class HybridOCR(BaseOCRProcessor):
+    """
+    Executa o Tesseract localmente em todas as páginas e reenvia ao Mistral
+    OCR apenas as de baixa confiança. O texto do Tesseract é mantido quando a
+    API falha, então o documento sai sempre completo.
+    """
+
+    def __init__(self, tesseract: TesseractOCR, mistral: MistralOCR,
+                 min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                 escalate_empty_pages: bool = True):
+        super().__init__()
+        self.tesseract = tesseract
+        self.mistral = mistral
+        self.min_confidence = min_confidence
+        # Páginas sem nenhuma palavra reconhecida (fotos, manuscritos) também
+        # são reenviadas
+        self.escalate_empty_pages = escalate_empty_pages
+        # Um único stop_event interrompe os dois motores, e o prazo do
+        # documento vale também para as páginas processadas por eles
+        self.tesseract.stop_event = self.stop_event
+        self.mistral.stop_event = self.stop_event
+        self.tesseract.deadlines = self.deadlines
+        self.mistral.deadlines = self.deadlines
+        self._lock = threading.Lock()
+        self.local_pages = 0
+        self.escalated_pages = 0
+
+    def cache_signature(self) -> str:
+        return (f"{type(self).__name__}|{self.tesseract.cache_signature()}|"
+                f"{self.mistral.cache_signature()}|min={self.min_confidence}|"
+                f"empty={self.escalate_empty_pages}")
+
+    def recommended_workers(self) -> int:
+        # Enquanto parte dos documentos aguarda o Mistral, os demais ocupam a CPU
+        return min(self.mistral.recommended_workers(), 2 * self.tesseract.recommended_workers())
+
+    def _ocr_pages(self, pdf_path: str, pages: Optional[List[int]], lang: str) -> Dict[int, str]:
+        scored = self.tesseract.ocr_pages_scored(pdf_path, pages, lang)
+        page_texts = {page: result.text for page, result in scored.items()}
+        escalated = [page for page in sorted(scored) if self.needs_escalation(scored[page])]
+
+        if escalated and not self.cancelled():
+            logging.info(f"{len(escalated)} de {len(scored)} páginas de {pdf_path} "
+                         f"com baixa confiança enviadas ao Mistral OCR")
+            try:
+                page_texts.update(self.mistral._ocr_pages(pdf_path, escalated, lang))
+            except Exception as e:
+                logging.warning(f"Mistral OCR indisponível para {pdf_path}, "
+                                f"mantendo o texto do Tesseract: {e}")
+
+        with self._lock:
+            self.local_pages += len(scored) - len(escalated)
+            self.escalated_pages += len(escalated)
+        return page_texts
+
+    def needs_escalation(self, result: ScoredPage) -> bool:
+        if result.confidence is None:
+            return self.escalate_empty_pages
+        return result.confidence < self.min_confidence
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"local_pages": self.local_pages, "escalated_pages": self.escalated_pages}
@@ -0,0 +1,61 @@
+
+
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+from PIL import Image, ImageOps
+from ..utils.pdf_writer import encode_jpeg_page, encode_mono_page, write_image_pdf
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp')
+# Resolução assumida para imagens sem DPI nos metadados
+DEFAULT_FRAME_DPI = 200
+
+
+def is_image_file(path: str) -> bool:
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def count_frames(image_path: str) -> int:
+    """Número de quadros (páginas) da imagem, sem decodificá-los"""
+    with Image.open(image_path) as image:
+        return getattr(image, 'n_frames', 1)
+
+
+def iter_frames(image_path: str,
+                pages: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, Image.Image]]:
+    """
+    Gera (numero_quadro, imagem) na ordem dos quadros, decodificando um
+    quadro por vez: um TIFF de várias páginas não é carregado inteiro na
+    memória. A orientação EXIF é aplicada a cada quadro.
+
+    Args:
+        image_path: Caminho da imagem
+        pages: Números dos quadros (a partir de 1); todos se None
+    """
+    with Image.open(image_path) as image:
+        total = getattr(image, 'n_frames', 1)
+        numbers = range(1, total + 1) if pages is None else sorted(p for p in set(pages) if 1 <= p <= total)
+        for number in numbers:
+            image.seek(number - 1)
+            # exif_transpose devolve uma cópia já decodificada do quadro atual
+            frame = ImageOps.exif_transpose(image)
+            yield number, frame
+
+
+def write_frames_pdf(image_path: str, pages: Optional[Iterable[int]], output: BinaryIO) -> List[int]:
+    """
+    Grava um PDF com um quadro da imagem por página, como no MistralBundler,
+    codificando e gravando cada quadro assim que é lido. Quadros em preto e
+    branco (fax) mantêm 1 bit por pixel.
+
+    Returns:
+        Número do quadro de cada página do PDF, na ordem das páginas
+    """
+    frame_numbers: List[int] = []
+
+    def pages_to_write():
+        for number, frame in iter_frames(image_path, pages):
+            dpi = frame.info.get('dpi', (DEFAULT_FRAME_DPI,))[0] or DEFAULT_FRAME_DPI
+            frame_numbers.append(number)
+            yield encode_mono_page(frame, dpi) if frame.mode == '1' else encode_jpeg_page(frame, dpi)
+
+    write_image_pdf(pages_to_write(), output)
+    return frame_numbers
@@ -0,0 +1,217 @@
+
+
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageFilter
+
+# Largura máxima da cópia reduzida usada para estimar a inclinação
+SKEW_ESTIMATION_WIDTH = 1000
+# Número máximo de pixels de tinta considerados na estimativa de inclinação
+SKEW_MAX_POINTS = 200_000
+# Passo da busca grosseira de inclinação; o melhor ângulo é refinado com o
+# passo configurado apenas na vizinhança dele
+SKEW_COARSE_STEP = 1.0
+# Inclinações menores que isso são toleradas pelo Tesseract e não são corrigidas
+MIN_SKEW_CORRECTION = 0.5
+# Mínimo de transições tinta/fundo para que uma linha ou coluna conte como
+# texto; bordas de digitalização e fios contínuos têm apenas duas
+MIN_TEXT_TRANSITIONS = 6
+
+
+@dataclass(frozen=True)
+class PreprocessingOptions:
+    """Configuração do pré-processamento aplicado a cada página antes do OCR"""
+    adaptive_threshold: bool = True
+    # Janela (px) da média local e fração abaixo da média considerada tinta
+    threshold_window: int = 31
+    threshold_sensitivity: float = 0.15
+    # Limiar global usado quando adaptive_threshold é False
+    global_threshold: int = 128
+    deskew: bool = True
+    max_skew_angle: float = 5.0
+    skew_step: float = 0.2
+    crop_margins: bool = True
+    crop_padding: int = 16
+    # Altura-x alvo em pixels; páginas com letras maiores são reduzidas
+    target_x_height: Optional[int] = None
+    # Mantém a página binarizada em 1 bit ('1') em vez de 8 bits ('L')
+    binary_output: bool = True
+
+
+# Predefinições escolhidas na linha de comando (--preprocess) e na interface
+PREPROCESSING_PRESETS: Dict[str, PreprocessingOptions] = {
+    # Limiar adaptativo, correção de inclinação e recorte das margens
+    'full': PreprocessingOptions(),
+    # Apenas o limiar adaptativo, para digitalizações já alinhadas
+    'adaptive': PreprocessingOptions(deskew=False, crop_margins=False),
+    # Limiar global fixo, o mais rápido, para páginas limpas e uniformes
+    'global': PreprocessingOptions(adaptive_threshold=False, deskew=False, crop_margins=False),
+}
+
+
+def preset_options(name: str, deskew: bool = True) -> PreprocessingOptions:
+    """Retorna as opções da predefinição, com a correção de inclinação opcionalmente desligada"""
+    options = PREPROCESSING_PRESETS[name]
+    return options if deskew else replace(options, deskew=False)
+
+
+def binarize(gray: Image.Image, options: PreprocessingOptions) -> np.ndarray:
+    """Retorna a máscara de tinta (True = pixel de texto) da imagem em tons de cinza"""
+    pixels = np.asarray(gray, dtype=np.uint8)
+    if not options.adaptive_threshold:
+        return pixels < options.global_threshold
+
+    # Limiar de Bradley: o pixel é tinta se for mais escuro que a média da
+    # vizinhança menos uma fração. A média local vem do BoxBlur do Pillow (em C).
+    local_mean = np.asarray(gray.filter(ImageFilter.BoxBlur(options.threshold_window // 2)),
+                            dtype=np.uint8)
+    # Comparação em inteiros de 16 bits: pixel * 100 < média * (100 - sensibilidade%)
+    keep_percent = int(round((1.0 - options.threshold_sensitivity) * 100))
+    return pixels.astype(np.uint16) * 100 < local_mean.astype(np.uint16) * keep_percent
+
+
+def _projection_score(ys: np.ndarray, xs: np.ndarray, angle: float) -> float:
+    """Soma dos quadrados do histograma da projeção dos pontos no ângulo dado"""
+    theta = np.deg2rad(angle)
+    projected = ys * np.cos(theta) + xs * np.sin(theta)
+    rows = np.round(projected - projected.min()).astype(np.int64)
+    histogram = np.bincount(rows).astype(np.float64)
+    # Linhas alinhadas concentram a tinta em poucas linhas do histograma
+    return float(np.dot(histogram, histogram))
+
+
+def estimate_skew(ink: np.ndarray, max_angle: float, step: float) -> float:
+    """
+    Estima a inclinação das linhas de texto pelo perfil de projeção horizontal
+    de uma cópia reduzida da máscara. A busca é feita primeiro em passos de
+    SKEW_COARSE_STEP e depois refinada com o passo dado em torno do melhor ângulo.
+
+    Returns:
+        Ângulo em graus a ser passado para Image.rotate para endireitar a página
+    """
+    factor = max(1, ink.shape[1] // SKEW_ESTIMATION_WIDTH)
+    small = ink[::factor, ::factor]
+    ys, xs = np.nonzero(small)
+    if len(ys) < 100:
+        return 0.0
+    if len(ys) > SKEW_MAX_POINTS:
+        stride = len(ys) // SKEW_MAX_POINTS + 1
+        ys, xs = ys[::stride], xs[::stride]
+    ys = ys.astype(np.float32)
+    xs = xs.astype(np.float32)
+
+    coarse_step = max(step, SKEW_COARSE_STEP)
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + coarse_step / 2, coarse_step):
+        score = _projection_score(ys, xs, angle)
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    if coarse_step > step:
+        low = max(-max_angle, best_angle - coarse_step)
+        high = min(max_angle, best_angle + coarse_step)
+        for angle in np.arange(low, high + step / 2, step):
+            score = _projection_score(ys, xs, angle)
+            if score > best_score:
+                best_angle, best_score = float(angle), score
+    # O ângulo que alinha a projeção é o oposto da rotação necessária
+    return round(-best_angle, 2) or 0.0
+
+
+def rotate_ink(ink: np.ndarray, angle: float) -> np.ndarray:
+    """
+    Gira a máscara de tinta pelo vizinho mais próximo, como o Leptonica faz
+    com imagens binárias; evita interpolar e binarizar de novo a página.
+    """
+    rotated = Image.fromarray(ink).rotate(angle, resample=Image.NEAREST, expand=True, fillcolor=0)
+    return np.asarray(rotated)
+
+
+def _text_rows_and_columns(ink: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Marca as linhas e colunas que atravessam texto, contando as transições
+    entre tinta e fundo. Bordas escuras da digitalização e fios contínuos
+    geram poucas transições e são ignorados.
+    """
+    row_transitions = np.count_nonzero(ink[:, 1:] != ink[:, :-1], axis=1)
+    col_transitions = np.count_nonzero(ink[1:, :] != ink[:-1, :], axis=0)
+    return (_drop_short_runs(row_transitions >= MIN_TEXT_TRANSITIONS),
+            _drop_short_runs(col_transitions >= MIN_TEXT_TRANSITIONS))
+
+
+def _drop_short_runs(mask: np.ndarray, min_length: int = 3) -> np.ndarray:
+    """Descarta sequências de True mais curtas que min_length (ruído isolado)"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    result = np.zeros_like(mask)
+    for start, end in zip(edges[::2], edges[1::2]):
+        if end - start >= min_length:
+            result[start:end] = True
+    return result
+
+
+def text_bounding_box(ink: np.ndarray, padding: int) -> Optional[Tuple[int, int, int, int]]:
+    """Retorna (esquerda, topo, direita, base) da área com texto ou None se vazia"""
+    text_rows, text_cols = _text_rows_and_columns(ink)
+    rows = np.flatnonzero(text_rows)
+    cols = np.flatnonzero(text_cols)
+    if len(rows) == 0 or len(cols) == 0:
+        return None
+    height, width = ink.shape
+    return (max(0, int(cols[0]) - padding), max(0, int(rows[0]) - padding),
+            min(width, int(cols[-1]) + 1 + padding), min(height, int(rows[-1]) + 1 + padding))
+
+
+def estimate_x_height(ink: np.ndarray) -> Optional[float]:
+    """
+    Estima a altura-x mediana do texto. Em cada faixa de linhas com tinta,
+    conta as linhas cuja densidade passa da metade do pico da faixa, que
+    correspondem ao corpo das minúsculas.
+    """
+    _, text_cols = _text_rows_and_columns(ink)
+    profile = np.count_nonzero(ink[:, text_cols], axis=1)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], (profile > 0).astype(np.int8), [0]))))
+    heights = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if end - start < 3:
+            continue
+        band = profile[start:end]
+        heights.append(int(np.count_nonzero(band >= band.max() / 2)))
+    if not heights:
+        return None
+    return float(np.median(heights))
+
+
+def preprocess_image(image: Image.Image, options: Optional[PreprocessingOptions] = None) -> Image.Image:
+    """
+    Prepara a página para o Tesseract: binarização (adaptativa ou global),
+    correção de inclinação, recorte das margens e redução para a altura-x alvo.
+    """
+    options = options or PreprocessingOptions()
+    gray = image.convert('L')
+    ink = binarize(gray, options)
+
+    if options.deskew:
+        angle = estimate_skew(ink, options.max_skew_angle, options.skew_step)
+        if abs(angle) >= MIN_SKEW_CORRECTION:
+            ink = rotate_ink(ink, angle)
+            # A página girada passa a ser a própria máscara (tinta em preto)
+            gray = Image.fromarray(~ink).convert('L')
+
+    if options.crop_margins:
+        box = text_bounding_box(ink, options.crop_padding)
+        if box is not None:
+            gray = gray.crop(box)
+            ink = ink[box[1]:box[3], box[0]:box[2]]
+
+    if options.target_x_height:
+        x_height = estimate_x_height(ink)
+        if x_height and x_height > options.target_x_height * 1.15:
+            scale = options.target_x_height / x_height
+            size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+            gray = gray.resize(size, resample=Image.LANCZOS)
+            ink = binarize(gray, options)
+
+    if options.binary_output:
+        # Em modo '1' a página é serializada com 8 pixels por byte
+        return Image.fromarray(~ink)
+    return Image.fromarray(np.where(ink, 0, 255).astype(np.uint8))
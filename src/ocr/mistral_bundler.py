@@ -0,0 +1,355 @@
+
+
+import io
+import itertools
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from ..core.base_ocr import MIN_TEXT_LENGTH, count_pdf_pages
+from ..utils.circuit_breaker import CircuitOpenError
+from ..utils.pdf_writer import ImagePage, encode_jpeg_page, write_image_pdf
+from .image_frames import DEFAULT_FRAME_DPI, count_frames, is_image_file, iter_frames
+from .mistral_ocr import MistralOCR
+from .pdf_rasterizer import PdfRasterizer
+
+# Limites de um lote enviado em uma única requisição
+MAX_BUNDLE_PAGES = 30
+MAX_BUNDLE_BYTES = 10 * 1024 * 1024
+# Documentos com mais páginas que isso são enviados sozinhos
+MAX_BUNDLED_DOCUMENT_PAGES = 4
+BUNDLE_DPI = 200
+DEFAULT_BUNDLE_WORKERS = 4
+# Tempo (s) que um lote incompleto aguarda outros documentos antes do envio
+DEFAULT_BUNDLE_LINGER = 0.5
+# Intervalo (s) entre verificações de cancelamento enquanto o lote não volta
+BUNDLE_POLL_INTERVAL = 0.2
+
+
+class BundlePage(NamedTuple):
+    """Origem de uma página do lote: arquivo e número da página nele (a partir de 1)"""
+    source: str
+    page: int
+
+
+class _PreparedDocument:
+    """Documento pronto para entrar em um lote"""
+
+    def __init__(self, path: str, document_key: Optional[str]):
+        self.path = path
+        self.document_key = document_key
+        self.page_texts: Dict[int, str] = {}
+        self.images: List[Tuple[int, ImagePage]] = []
+        self.text: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return sum(len(image.data) for _, image in self.images)
+
+
+class _PendingBundle:
+    """Lote em formação com os documentos enviados por várias threads (ver MistralBundler.recognize)"""
+
+    def __init__(self, lang: str):
+        self.lang = lang
+        self.entries: List[Tuple[BundlePage, ImagePage]] = []
+        self.futures: Dict[str, Future] = {}
+        self.pages = 0
+        self.size = 0
+
+    def add(self, ticket: str, images: List[Tuple[int, ImagePage]]) -> Future:
+        self.entries.extend((BundlePage(ticket, page_number), image) for page_number, image in images)
+        self.pages += len(images)
+        self.size += sum(len(image.data) for _, image in images)
+        future = self.futures[ticket] = Future()
+        return future
+
+
+class MistralBundler:
+    """
+    Agrupa documentos pequenos (digitalizações de poucas páginas e fotos) em
+    um único PDF de várias páginas e o envia ao Mistral OCR em uma requisição.
+    Um mapa página do lote -> (arquivo, página) separa o resultado de volta por
+    documento. Páginas com camada de texto são lidas diretamente e não entram
+    no lote; documentos grandes seguem pelo MistralOCR normalmente.
+
+    Há duas formas de uso: extract_many processa uma sequência de arquivos, e
+    recognize, chamado pelo MistralOCR quando o bundler está configurado
+    (MistralOCR.bundler), junta os documentos pequenos que os workers do
+    pipeline enviam ao mesmo tempo.
+    """
+
+    def __init__(self, ocr: MistralOCR, poppler_path=None,
+                 max_bundle_pages: int = MAX_BUNDLE_PAGES,
+                 max_bundle_bytes: int = MAX_BUNDLE_BYTES,
+                 max_document_pages: int = MAX_BUNDLED_DOCUMENT_PAGES,
+                 dpi: int = BUNDLE_DPI, max_workers: int = DEFAULT_BUNDLE_WORKERS,
+                 linger: float = DEFAULT_BUNDLE_LINGER):
+        self.ocr = ocr
+        self.rasterizer = PdfRasterizer(poppler_path, dpi=dpi, adaptive_dpi=False)
+        self.max_bundle_pages = max_bundle_pages
+        self.max_bundle_bytes = max_bundle_bytes
+        self.max_document_pages = max_document_pages
+        self.max_workers = max_workers
+        self.linger = linger
+        self._bundle_numbers = itertools.count(1)
+        self._tickets = itertools.count(1)
+        # Lote em formação por idioma, usado por recognize
+        self._pending: Dict[str, _PendingBundle] = {}
+        self._lock = threading.Lock()
+
+    def recognize(self, path: str, pages: Optional[List[int]], lang: str) -> Optional[Dict[int, str]]:
+        """
+        Reconhece as páginas de um documento pequeno em um lote compartilhado
+        com os documentos que outras threads enviarem em seguida. O lote é
+        enviado quando enche ou após linger segundos.
+
+        Returns:
+            {numero_pagina: texto}, ou None se o documento não cabe em um lote
+            ou se o lote não trouxe todas as suas páginas; nesse caso o
+            documento segue pelo caminho normal do MistralOCR
+
+        Raises:
+            CircuitOpenError: se o circuito da API estiver aberto
+        """
+        images = self._encode_pages(path, pages)
+        if images is None:
+            return None
+        if not images:
+            return {}
+
+        future = self._enqueue(path, images, lang)
+        while True:
+            try:
+                recognized = future.result(timeout=BUNDLE_POLL_INTERVAL)
+                break
+            except FutureTimeoutError:
+                if self.ocr.cancelled():
+                    return {}
+        if any(page_number not in recognized for page_number, _ in images) and not self.ocr.cancelled():
+            return None
+        return recognized
+
+    def _enqueue(self, path: str, images: List[Tuple[int, ImagePage]], lang: str) -> Future:
+        pages, size = len(images), sum(len(image.data) for _, image in images)
+        ready = []
+        with self._lock:
+            bundle = self._pending.get(lang)
+            if bundle is not None and (bundle.pages + pages > self.max_bundle_pages or
+                                       bundle.size + size > self.max_bundle_bytes):
+                ready.append(self._pending.pop(lang))
+                bundle = None
+            if bundle is None:
+                bundle = self._pending[lang] = _PendingBundle(lang)
+                timer = threading.Timer(self.linger, self._flush_pending, args=(bundle,))
+                timer.daemon = True
+                timer.start()
+            future = bundle.add(f"{next(self._tickets)}:{path}", images)
+            if bundle.pages >= self.max_bundle_pages:
+                ready.append(self._pending.pop(lang))
+        # O envio ocorre fora do lock, na thread que completou o lote
+        for full_bundle in ready:
+            self._send_pending(full_bundle)
+        return future
+
+    def _flush_pending(self, bundle: _PendingBundle) -> None:
+        """Envia o lote incompleto após linger segundos, se ele ainda não foi enviado"""
+        with self._lock:
+            if self._pending.get(bundle.lang) is not bundle:
+                return
+            del self._pending[bundle.lang]
+        self._send_pending(bundle)
+
+    def _send_pending(self, bundle: _PendingBundle) -> None:
+        try:
+            recognized = self._ocr_image_pages(bundle.entries, bundle.lang)
+        except BaseException as e:
+            # Circuito aberto (ou erro inesperado): cada documento recebe a exceção
+            for future in bundle.futures.values():
+                future.set_exception(e)
+            return
+        page_texts: Dict[str, Dict[int, str]] = {ticket: {} for ticket in bundle.futures}
+        for bundle_page, page_text in recognized.items():
+            page_texts[bundle_page.source][bundle_page.page] = page_text
+        for ticket, future in bundle.futures.items():
+            future.set_result(page_texts[ticket])
+
+    def _encode_pages(self, path: str, pages: Optional[List[int]]) -> Optional[List[Tuple[int, ImagePage]]]:
+        """
+        Codifica as páginas indicadas (todas se None) para o lote, ou retorna
+        None se o documento tiver mais de max_document_pages páginas ou não
+        couber em max_bundle_bytes
+        """
+        if is_image_file(path):
+            total = count_frames(path)
+            selected = [page for page in (pages or range(1, total + 1)) if 1 <= page <= total]
+            if len(selected) > self.max_document_pages:
+                return None
+            images = []
+            # Um quadro por vez: o TIFF não é carregado inteiro
+            for frame_number, frame in iter_frames(path, selected):
+                dpi = frame.info.get('dpi', (DEFAULT_FRAME_DPI,))[0] or DEFAULT_FRAME_DPI
+                images.append((frame_number, encode_jpeg_page(frame.convert('L'), dpi)))
+        else:
+            if os.path.getsize(path) > self.max_bundle_bytes:
+                return None
+            if pages is None:
+                pages = list(range(1, count_pdf_pages(path) + 1))
+            if len(pages) > self.max_document_pages:
+                return None
+            images = [(page_number, encode_jpeg_page(image, self.rasterizer.dpi))
+                      for page_number, image in self.rasterizer.iter_pages(path, pages)]
+        if sum(len(image.data) for _, image in images) > self.max_bundle_bytes:
+            return None
+        return images
+
+    def extract_many(self, paths: Iterable[str], lang: str = 'por') -> Iterator[Tuple[str, str]]:
+        """
+        Gera (caminho, texto) para cada arquivo. Os lotes são montados nesta
+        thread enquanto os anteriores aguardam a API em até max_workers threads.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = deque()
+            for job in self._jobs(paths, lang):
+                in_flight.append(executor.submit(job))
+                while len(in_flight) > self.max_workers:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+
+    def _jobs(self, paths: Iterable[str], lang: str) -> Iterator[Callable[[], List[Tuple[str, str]]]]:
+        bundle: List[_PreparedDocument] = []
+        bundle_pages = bundle_bytes = 0
+        for path in paths:
+            if self.ocr.stop_event.is_set():
+                break
+            try:
+                document = self._prepare(path, lang)
+            except Exception as e:
+                # Segue sozinho pelo MistralOCR, que trata os próprios erros e o fallback
+                logging.warning(f"Não foi possível preparar {path} para o lote; enviando sozinho: {e}")
+                document = None
+
+            if document is None:
+                yield lambda path=path: [(path, self.ocr.extract_text(path, lang))]
+                continue
+            if document.text is not None:
+                yield lambda document=document: [(document.path, document.text)]
+                continue
+
+            pages, size = len(document.images), document.size
+            if bundle and (bundle_pages + pages > self.max_bundle_pages or
+                           bundle_bytes + size > self.max_bundle_bytes):
+                yield lambda bundle=bundle: self._run_bundle(bundle, lang)
+                bundle, bundle_pages, bundle_bytes = [], 0, 0
+            bundle.append(document)
+            bundle_pages += pages
+            bundle_bytes += size
+
+        if bundle:
+            yield lambda: self._run_bundle(bundle, lang)
+
+    def _prepare(self, path: str, lang: str) -> Optional[_PreparedDocument]:
+        """
+        Lê o documento e codifica as páginas que precisam de OCR. Retorna None
+        se o documento for grande demais para entrar em um lote.
+        """
+        if not is_image_file(path) and os.path.getsize(path) > self.max_bundle_bytes:
+            return None
+
+        document = _PreparedDocument(path, self.ocr.document_cache_key(path, lang))
+        if document.document_key is not None:
+            document.text = self.ocr.cache.get(document.document_key)
+            if document.text is not None:
+                return document
+
+        text_pages, image_pages = self.ocr._scan_or_all_pages(path)
+        images = self._encode_pages(path, image_pages)
+        if images is None:
+            return None
+
+        document.page_texts.update(text_pages)
+        document.images = images
+        if not document.images:
+            document.text = self._finish(document)
+        return document
+
+    def _run_bundle(self, documents: List[_PreparedDocument], lang: str) -> List[Tuple[str, str]]:
+        try:
+            return self._recognize_bundle(documents, lang)
+        except CircuitOpenError as e:
+            return [(document.path, self._fallback(document.path, lang, e)) for document in documents]
+
+    def _fallback(self, path: str, lang: str, error: CircuitOpenError) -> str:
+        """Desvia o documento para o fallback_ocr do MistralOCR, como em extract_text"""
+        fallback_ocr = self.ocr.fallback_ocr
+        if fallback_ocr is None:
+            logging.error(f"Erro no processamento com {type(self.ocr).__name__}: {error}")
+            return ""
+        logging.warning(f"{error}; processando {path} com {type(fallback_ocr).__name__}")
+        return fallback_ocr.extract_text(path, lang)
+
+    def _recognize_bundle(self, documents: List[_PreparedDocument], lang: str) -> List[Tuple[str, str]]:
+        entries = [(BundlePage(document.path, page_number), image)
+                   for document in documents for page_number, image in document.images]
+        recognized = self._ocr_image_pages(entries, lang)
+
+        results = []
+        for document in documents:
+            missing = [(BundlePage(document.path, page_number), image)
+                       for page_number, image in document.images
+                       if BundlePage(document.path, page_number) not in recognized]
+            if missing and len(documents) > 1 and not self.ocr.stop_event.is_set():
+                # O lote falhou para este documento: tenta enviá-lo sozinho
+                recognized.update(self._ocr_image_pages(missing, lang))
+            for page_number, _ in document.images:
+                bundle_page = BundlePage(document.path, page_number)
+                if bundle_page in recognized:
+                    document.page_texts[page_number] = recognized[bundle_page]
+            results.append((document.path, self._finish(document)))
+        return results
+
+    def _ocr_image_pages(self, entries: List[Tuple[BundlePage, ImagePage]],
+                         lang: str) -> Dict[BundlePage, str]:
+        """Monta o PDF do lote, envia-o em uma requisição e mapeia as páginas de volta"""
+        page_map = [bundle_page for bundle_page, _ in entries]
+        buffer = io.BytesIO()
+        write_image_pdf((image for _, image in entries), buffer)
+        bundle_name = f"lote_{next(self._bundle_numbers)}.pdf"
+        payload = self.ocr._payload_for(
+            self.ocr._inline_document(buffer.getvalue(), bundle_name), lang)
+        del buffer
+
+        try:
+            response = self.ocr.http.post_json(
+                self.ocr.api_url,
+                payload,
+                headers=self.ocr._headers(),
+                stop_event=self.ocr.stop_event,
+                units=len(page_map)
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logging.error(f"Erro no envio do lote {bundle_name}: {e}")
+            return {}
+        if response.status_code != 200:
+            logging.error(f"Erro na API Mistral OCR: Status {response.status_code} - {response.text}")
+            return {}
+
+        recognized = {}
+        for bundle_page_number, page_text in self.ocr._parse_pages(response.json()).items():
+            if 1 <= bundle_page_number <= len(page_map):
+                recognized[page_map[bundle_page_number - 1]] = page_text
+        return recognized
+
+    def _finish(self, document: _PreparedDocument) -> str:
+        page_texts = document.page_texts
+        text = ''.join(page_texts[page] for page in sorted(page_texts))
+        text = text if len(text.strip()) > MIN_TEXT_LENGTH else ""
+        complete = all(page in page_texts for page, _ in document.images)
+        if document.document_key is not None and text and complete:
+            self.ocr.cache.put(document.document_key, text)
+        return text
@@ -1,32 +1,399 @@
 
 
-import requests
 import base64
+import contextlib
 import uuid
 import logging
-from typing import Dict
-from ..core.base_ocr import BaseOCRProcessor, MIN_TEXT_LENGTH
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from ..core.base_ocr import BaseOCRProcessor, count_pdf_pages
+from ..utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from ..utils.concurrency import AdaptiveLimiter
+from ..utils.http_client import RequestCancelled, RetryingHttpClient
+from ..utils.streaming import Base64JsonBody, MultipartFileBody, iter_json_array
+from .image_frames import is_image_file, write_frames_pdf
 import configparser
 
 MISTRAL_OCR_API_URL = "https://api.mistral.ai/v1/ocr"
+MISTRAL_OCR_MODEL = "mistral-ocr-latest"
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'config.ini')
+# Requisições simultâneas: o limite parte de DEFAULT_INITIAL_CONCURRENCY e é
+# ajustado pela latência e pelas respostas 429 até max_connections. O motor é
+# limitado pela rede, não pela CPU, então o teto não depende dos núcleos
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_INITIAL_CONCURRENCY = 8
+# A partir deste tamanho o corpo da requisição é gerado em blocos durante o envio
+STREAM_THRESHOLD_BYTES = 8 * 1024 * 1024
+RESPONSE_CHUNK_SIZE = 64 * 1024
+# Validade (horas) da URL assinada de um arquivo enviado pela API de arquivos
+SIGNED_URL_EXPIRY_HOURS = 1
+# Documentos acima destes limites são divididos em intervalos de páginas
+# enviados em requisições separadas
+MAX_PAGES_PER_REQUEST = 50
+MAX_BYTES_PER_REQUEST = 20 * 1024 * 1024
+DEFAULT_CHUNK_WORKERS = 4
+# Rodadas extras para os intervalos que falharam
+CHUNK_RETRY_ROUNDS = 2
+
+
+def load_api_url(config_path: str = CONFIG_PATH) -> str:
+    """Lê [mistral] api_url do config.ini, com a URL oficial como padrão"""
+    config = configparser.ConfigParser()
+    config.read(config_path, encoding='utf-8')
+    return config.get('mistral', 'api_url', fallback=MISTRAL_OCR_API_URL)
+
 
 class MistralOCR(BaseOCRProcessor):
-    def __init__(self, api_key=""):
+    # Com o circuito da API aberto o documento segue para fallback_ocr, se houver
+    fallback_errors = (CircuitOpenError,)
+
+    def __init__(self, api_key="", api_url: Optional[str] = None,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 stream_threshold: int = STREAM_THRESHOLD_BYTES,
+                 use_files_api: bool = False,
+                 max_pages_per_request: int = MAX_PAGES_PER_REQUEST,
+                 max_bytes_per_request: int = MAX_BYTES_PER_REQUEST,
+                 chunk_workers: int = DEFAULT_CHUNK_WORKERS,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 limiter: Optional[AdaptiveLimiter] = None):
         super().__init__()
         self.api_key = api_key
+        self.api_url = api_url or load_api_url()
+        # Documentos grandes são codificados em base64 durante o envio e a
+        # resposta é lida página a página, limitando a memória por documento
+        self.stream_threshold = stream_threshold
+        # Envia o arquivo uma vez pela API de arquivos e referencia a sua URL
+        # assinada na requisição de OCR, em vez de embuti-lo em base64
+        self.use_files_api = use_files_api
+        # Divisão de documentos longos: cada intervalo tem até
+        # max_pages_per_request páginas e cerca de max_bytes_per_request bytes
+        # do arquivo, e até chunk_workers intervalos são processados ao mesmo tempo
+        self.max_pages_per_request = max_pages_per_request
+        self.max_bytes_per_request = max_bytes_per_request
+        self.chunk_workers = chunk_workers
+        # Recompressão opcional de PDFs digitalizados antes do envio (UploadOptimizer)
+        self.upload_optimizer = None
+        # Agrupamento opcional de documentos pequenos em requisições compartilhadas (MistralBundler)
+        self.bundler = None
+        # Sessão compartilhada por todas as threads que usam esta instância. O
+        # disjuntor evita que cada worker espere o timeout durante uma
+        # indisponibilidade da API
+        self.circuit_breaker = circuit_breaker or CircuitBreaker("API Mistral")
+        # Vagas de requisição compartilhadas por documentos e intervalos de páginas
+        self.limiter = limiter or AdaptiveLimiter(
+            initial=min(DEFAULT_INITIAL_CONCURRENCY, max_connections), max_limit=max_connections)
+        self.http = RetryingHttpClient(pool_size=max_connections, circuit_breaker=self.circuit_breaker,
+                                       limiter=self.limiter)
+
+    def cache_signature(self) -> str:
+        return f"{type(self).__name__}|{MISTRAL_OCR_MODEL}"
+
+    def recommended_workers(self) -> int:
+        # Workers aguardando uma vaga não consomem CPU; o AdaptiveLimiter
+        # decide quantos enviam de fato
+        return self.limiter.max_limit
+
+    @property
+    def files_url(self) -> str:
+        return self.api_url.rsplit('/', 1)[0] + '/files'
+
+    def _ocr_pages(self, pdf_path: str, pages: Optional[List[int]], lang: str) -> Dict[int, str]:
+        if self.bundler is not None:
+            bundled = self.bundler.recognize(pdf_path, pages, lang)
+            if bundled is not None:
+                return bundled
+        if is_image_file(pdf_path):
+            with self.image_as_pdf(pdf_path, pages) as (temp_path, frame_numbers):
+                return self.frame_pages(self._ocr_document(temp_path, None, lang), frame_numbers)
+        if self.upload_optimizer is not None:
+            optimized = self.upload_optimizer.optimize(pdf_path, pages)
+            if optimized is not None:
+                try:
+                    return optimized.original_pages(self._ocr_document(optimized.path, None, lang))
+                finally:
+                    optimized.cleanup()
+        return self._ocr_document(pdf_path, pages, lang)
 
-    def extract_text(self, pdf_path: str, lang: str = 'por') -> str:
+    def _ocr_document(self, pdf_path: str, pages: Optional[List[int]], lang: str) -> Dict[int, str]:
+        chunks = self.page_chunks(pdf_path, pages)
+        if len(chunks) > 1:
+            return self._ocr_chunks(pdf_path, chunks, lang)
+        return self._ocr_page_range(pdf_path, chunks[0], lang)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def image_as_pdf(image_path: str, pages: Optional[List[int]]):
+        """
+        PDF temporário com os quadros selecionados da imagem, um por página,
+        que segue o mesmo caminho dos documentos (divisão em intervalos,
+        envio em blocos, API de arquivos).
+
+        Yields:
+            Tupla (caminho do PDF, número do quadro de cada página do PDF)
+        """
+        fd, temp_path = tempfile.mkstemp(prefix="ocr_imagem_", suffix=".pdf")
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                frame_numbers = write_frames_pdf(image_path, pages, output)
+            yield temp_path, frame_numbers
+        finally:
+            os.remove(temp_path)
+
+    @staticmethod
+    def frame_pages(page_texts: Dict[int, str], frame_numbers: List[int]) -> Dict[int, str]:
+        """Converte as páginas do PDF temporário de image_as_pdf nos quadros da imagem"""
+        return {frame_numbers[page - 1]: text for page, text in page_texts.items()
+                if 1 <= page <= len(frame_numbers)}
+
+    def page_chunks(self, pdf_path: str, pages: Optional[List[int]]) -> List[List[int]]:
+        """
+        Divide as páginas em intervalos consecutivos quando o documento passa do
+        limite de páginas ou de bytes por requisição. Um documento dentro dos
+        limites resulta em um único intervalo.
+        """
+        file_size = os.path.getsize(pdf_path)
         try:
-            with open(pdf_path, 'rb') as pdf_file:
-                pdf_data = pdf_file.read()
-                return self._call_mistral_ocr_api(pdf_data, pdf_path, lang)
+            page_total = count_pdf_pages(pdf_path)
         except Exception as e:
-            logging.error(f"Erro no processamento com Mistral: {e}")
-            return ""
+            logging.warning(f"Não foi possível contar as páginas de {pdf_path}; documento enviado inteiro: {e}")
+            return [pages]
+        if pages is None:
+            pages = list(range(1, page_total + 1))
 
-    def _call_mistral_ocr_api(self, pdf_data: bytes, file_name: str, lang: str) -> str:
-        base64_pdf = base64.b64encode(pdf_data).decode('utf-8')
+        chunk_size = self.max_pages_per_request
+        if file_size > self.max_bytes_per_request and page_total:
+            # Páginas que somam aproximadamente max_bytes_per_request do arquivo
+            pages_per_bytes = page_total * self.max_bytes_per_request // file_size
+            chunk_size = max(1, min(chunk_size, pages_per_bytes))
+
+        if len(pages) <= chunk_size:
+            return [pages]
+        return [pages[start:start + chunk_size] for start in range(0, len(pages), chunk_size)]
+
+    def _ocr_chunks(self, pdf_path: str, chunks: List[List[int]], lang: str) -> Dict[int, str]:
+        """
+        Processa os intervalos em paralelo e repete apenas os que falharam. O
+        documento é lido e codificado em base64 uma única vez, mas cada
+        requisição leva o documento inteiro; a partir de stream_threshold (ou
+        com use_files_api) ele é enviado uma única vez pela API de arquivos e
+        as requisições apenas referenciam a sua URL.
+        """
+        file_id = None
+        if self.use_files_api or os.path.getsize(pdf_path) >= self.stream_threshold:
+            file_id, document = self._upload_document(pdf_path)
+            if document is None:
+                return {}
+        else:
+            document = self._read_inline_document(pdf_path)
+
+        # As threads do executor não herdam o prazo da thread do documento
+        deadline = self.current_deadline()
+        # Payload (e id) de cada intervalo mantido entre as rodadas de repetição
+        payloads = {tuple(chunk): self._payload_for(document, lang, chunk) for chunk in chunks}
+        page_texts: Dict[int, str] = {}
+        try:
+            pending = chunks
+            with ThreadPoolExecutor(max_workers=min(self.chunk_workers, len(chunks))) as executor:
+                for round_number in range(CHUNK_RETRY_ROUNDS + 1):
+                    if self.cancelled():
+                        break
+                    results = list(executor.map(
+                        lambda chunk: self._ocr_chunk(payloads[tuple(chunk)], chunk, deadline), pending))
+                    failed = []
+                    for chunk, chunk_texts in zip(pending, results):
+                        page_texts.update(chunk_texts)
+                        if any(page not in chunk_texts for page in chunk):
+                            failed.append(chunk)
+                    if not failed:
+                        break
+                    pending = failed
+                    logging.warning(f"{len(failed)} de {len(chunks)} intervalos de {pdf_path} "
+                                    f"falharam (rodada {round_number + 1})")
+                else:
+                    failed_pages = [f"{chunk[0]}-{chunk[-1]}" for chunk in pending]
+                    logging.error(f"Páginas {', '.join(failed_pages)} de {pdf_path} não foram reconhecidas")
+        finally:
+            if file_id:
+                self._delete_file(file_id)
+        return page_texts
+
+    def _ocr_chunk(self, payload: Dict, pages: List[int],
+                   deadline: Optional[float] = None) -> Dict[int, str]:
+        # Intervalos ainda na fila do executor após o cancelamento não são enviados
+        if self.stop_event.is_set():
+            return {}
+        try:
+            response = self.http.request(
+                'POST',
+                self.api_url,
+                stop_event=self.stop_event,
+                deadline=deadline,
+                units=len(pages),
+                json=payload,
+                headers=self._headers(),
+                stream=True
+            )
+            return self._read_pages_stream(response, pages)
+        except CircuitOpenError:
+            raise
+        except RequestCancelled:
+            return {}
+        except Exception as e:
+            logging.error(f"Erro no intervalo de páginas {pages[0]}-{pages[-1]}: {e}")
+            return {}
+
+    def _ocr_page_range(self, pdf_path: str, pages: Optional[List[int]], lang: str) -> Dict[int, str]:
+        if self.use_files_api:
+            return self._call_mistral_ocr_api_with_upload(pdf_path, lang, pages)
+        if os.path.getsize(pdf_path) >= self.stream_threshold:
+            return self._call_mistral_ocr_api_streaming(pdf_path, lang, pages)
+        with open(pdf_path, 'rb') as pdf_file:
+            pdf_data = pdf_file.read()
+        return self._call_mistral_ocr_api(pdf_data, pdf_path, lang, pages)
+
+    def _call_mistral_ocr_api(self, pdf_data: bytes, file_name: str, lang: str,
+                              pages: Optional[List[int]] = None) -> Dict[int, str]:
+        payload = self._build_payload(pdf_data, file_name, lang, pages)
         
+        response = self.http.post_json(
+            self.api_url,
+            payload,
+            headers=self._headers(),
+            stop_event=self.stop_event,
+            deadline=self.current_deadline(),
+            units=len(pages) if pages else 1
+        )
+        
+        if response.status_code == 200:
+            return self._parse_pages(response.json(), pages)
+        else:
+            logging.error(f"Erro na API Mistral OCR: Status {response.status_code} - {response.text}")
+            return {}
+
+    def _call_mistral_ocr_api_streaming(self, pdf_path: str, lang: str,
+                                        pages: Optional[List[int]] = None) -> Dict[int, str]:
+        body = self.streaming_body(pdf_path, lang, pages)
+        response = self.http.request(
+            'POST',
+            self.api_url,
+            stop_event=self.stop_event,
+            deadline=self.current_deadline(),
+            units=len(pages) if pages else 1,
+            data=body,
+            headers=self._headers(),
+            stream=True
+        )
+        return self._read_pages_stream(response, pages)
+
+    def _call_mistral_ocr_api_with_upload(self, pdf_path: str, lang: str,
+                                          pages: Optional[List[int]] = None) -> Dict[int, str]:
+        file_id, document = self._upload_document(pdf_path)
+        if document is None:
+            return {}
+        try:
+            response = self.http.request(
+                'POST',
+                self.api_url,
+                stop_event=self.stop_event,
+                deadline=self.current_deadline(),
+                units=len(pages) if pages else 1,
+                json=self._payload_for(document, lang, pages),
+                headers=self._headers(),
+                stream=True
+            )
+            return self._read_pages_stream(response, pages)
+        finally:
+            self._delete_file(file_id)
+
+    def _upload_document(self, pdf_path: str) -> Tuple[Optional[str], Optional[Dict]]:
+        """
+        Envia o PDF pela API de arquivos e retorna (id do arquivo, documento
+        que referencia a sua URL assinada), ou (None, None) em caso de erro.
+        """
+        file_id = self._upload_file(pdf_path)
+        if not file_id:
+            return None, None
+        response = self.http.request(
+            'GET',
+            f"{self.files_url}/{file_id}/url",
+            stop_event=self.stop_event,
+            deadline=self.current_deadline(),
+            params={"expiry": SIGNED_URL_EXPIRY_HOURS},
+            headers=self._headers()
+        )
+        if response.status_code != 200:
+            logging.error(f"Erro ao obter a URL do arquivo na API Mistral: Status {response.status_code} - {response.text}")
+            self._delete_file(file_id)
+            return None, None
+        document = {
+            "type": "document_url",
+            "document_url": response.json()["url"],
+            "document_name": pdf_path
+        }
+        return file_id, document
+
+    def _upload_file(self, pdf_path: str) -> Optional[str]:
+        """Envia o PDF em blocos para a API de arquivos e retorna o seu id"""
+        body = MultipartFileBody({"purpose": "ocr"}, "file", pdf_path, 'application/pdf')
+        response = self.http.request(
+            'POST',
+            self.files_url,
+            stop_event=self.stop_event,
+            deadline=self.current_deadline(),
+            data=body,
+            headers=self._headers(body.content_type)
+        )
+        if response.status_code != 200:
+            logging.error(f"Erro no envio do arquivo para a API Mistral: Status {response.status_code} - {response.text}")
+            return None
+        return response.json()["id"]
+
+    def _delete_file(self, file_id: str) -> None:
+        try:
+            self.http.request('DELETE', f"{self.files_url}/{file_id}", headers=self._headers())
+        except Exception as e:
+            logging.warning(f"Não foi possível remover o arquivo {file_id} da API Mistral: {e}")
+
+    def _read_pages_stream(self, response, pages: Optional[List[int]]) -> Dict[int, str]:
+        """Lê as páginas da resposta à medida que chegam, sem carregá-la inteira"""
+        try:
+            if response.status_code != 200:
+                logging.error(f"Erro na API Mistral OCR: Status {response.status_code} - {response.text}")
+                return {}
+            return self._collect_pages(
+                iter_json_array(response.iter_content(RESPONSE_CHUNK_SIZE), "pages"), pages)
+        finally:
+            response.close()
+
+    def streaming_body(self, pdf_path: str, lang: str,
+                       pages: Optional[List[int]] = None) -> Base64JsonBody:
+        """Corpo da requisição de OCR que codifica o arquivo durante o envio"""
+        document = {"type": "document_base64", "document_name": pdf_path}
+        return Base64JsonBody(self._payload_for(document, lang, pages),
+                              ["document", "document_base64"], pdf_path)
+
+    def _build_payload(self, pdf_data: bytes, file_name: str, lang: str,
+                       pages: Optional[List[int]] = None) -> Dict:
+        return self._payload_for(self._inline_document(pdf_data, file_name), lang, pages)
+
+    @classmethod
+    def _read_inline_document(cls, pdf_path: str) -> Dict:
+        with open(pdf_path, 'rb') as pdf_file:
+            return cls._inline_document(pdf_file.read(), pdf_path)
+
+    @staticmethod
+    def _inline_document(pdf_data: bytes, file_name: str) -> Dict:
+        base64_pdf = base64.b64encode(pdf_data).decode('utf-8')
+        return {
+            "type": "document_base64",
+            "document_base64": base64_pdf,
+            "document_name": file_name
+        }
+
+    def _payload_for(self, document: Dict, lang: str,
+                     pages: Optional[List[int]] = None) -> Dict:
         lang_mapping = {
             'por': 'portuguese',
             'eng': 'english',
@@ -36,42 +403,49 @@ class MistralOCR(BaseOCRProcessor):
         }
         
         payload = {
-            "model": "mistral-ocr-latest",
+            "model": MISTRAL_OCR_MODEL,
             "id": str(uuid.uuid4()),
-            "document": {
-                "type": "document_base64",
-                "document_base64": base64_pdf,
-                "document_name": file_name
-            },
+            "document": document,
             "include_image_base64": False
         }
         
         if lang in lang_mapping:
             payload["language"] = lang_mapping[lang]
-        
-        headers = {
-            "Content-Type": "application/json",
+
+        # Seleção de páginas da API (índices a partir de 0): apenas as páginas
+        # sem camada de texto são processadas
+        if pages is not None:
+            payload["pages"] = [page - 1 for page in pages]
+        return payload
+
+    def _headers(self, content_type: str = "application/json") -> Dict[str, str]:
+        return {
+            "Content-Type": content_type,
             "Authorization": f"Bearer {self.api_key}"
         }
-        
-        response = requests.post(
-            MISTRAL_OCR_API_URL,
-            headers=headers,
-            json=payload,
-            timeout=120
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            all_text = ""
-            if "pages" in result:
-                for page in result["pages"]:
-                    if "text" in page:
-                        all_text += page["text"].strip() + "\n\n"
-                    elif "markdown" in page:
-                        all_text += page["markdown"].strip() + "\n\n"
-            return all_text.strip() if len(all_text.strip()) > MIN_TEXT_LENGTH else ""
-        else:
-            logging.error(f"Erro na API Mistral OCR: Status {response.status_code} - {response.text}")
-            return ""
 
+    def http_stats(self) -> Dict[str, float]:
+        """Número de requisições, novas tentativas, falhas e latências da API"""
+        return self.http.stats()
+
+    @staticmethod
+    def _parse_pages(result: Dict, pages: Optional[List[int]] = None) -> Dict[int, str]:
+        """Converte a resposta da API em {numero_pagina: texto}"""
+        return MistralOCR._collect_pages(result.get("pages", []), pages)
+
+    @staticmethod
+    def _collect_pages(page_items, pages: Optional[List[int]] = None) -> Dict[int, str]:
+        page_texts = {}
+        for position, page in enumerate(page_items):
+            if "index" in page:
+                page_number = page["index"] + 1
+            elif pages is not None and position < len(pages):
+                page_number = pages[position]
+            else:
+                page_number = position + 1
+
+            if "text" in page:
+                page_texts[page_number] = page["text"].strip() + "\n\n"
+            elif "markdown" in page:
+                page_texts[page_number] = page["markdown"].strip() + "\n\n"
+        return page_texts
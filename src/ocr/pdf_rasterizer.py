@@ -0,0 +1,167 @@
+
+
+import os
+import tempfile
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
+from .image_preprocessor import (PreprocessingOptions, binarize, estimate_skew, estimate_x_height,
+                                 rotate_ink)
+
+DEFAULT_DPI = 200
+DEFAULT_WINDOW_SIZE = 4
+# Resoluções candidatas para a renderização adaptativa
+DPI_CHOICES = (150, 200, 300)
+# Resolução da sondagem usada para medir o tamanho das letras
+PROBE_DPI = 72
+# Altura-x mínima (px) para boa precisão do Tesseract
+MIN_X_HEIGHT_PX = 20
+
+
+class PdfRasterizer:
+    """
+    Renderiza as páginas de um PDF em pequenas janelas de páginas consecutivas,
+    entregando-as uma a uma através de um gerador. Apenas uma janela fica
+    materializada por vez, então o pico de memória não depende do tamanho do
+    documento.
+    """
+
+    def __init__(self, poppler_path=None, dpi: int = DEFAULT_DPI,
+                 window_size: int = DEFAULT_WINDOW_SIZE, use_temp_folder: bool = False,
+                 grayscale: bool = True, adaptive_dpi: bool = True,
+                 dpi_choices: Sequence[int] = DPI_CHOICES):
+        self.poppler_path = poppler_path
+        # Resolução fixa, ou usada quando a sondagem não encontra texto
+        self.dpi = dpi
+        self.window_size = max(1, window_size)
+        # Com use_temp_folder a janela é gravada em disco pelo pdftoppm e cada
+        # página só é carregada em memória quando consumida
+        self.use_temp_folder = use_temp_folder
+        # Renderiza diretamente em tons de cinza (1 byte por pixel em vez de 4)
+        self.grayscale = grayscale
+        # Escolhe a resolução de cada página a partir de uma sondagem em baixa
+        # resolução: letras pequenas em 300 dpi, letras grandes em 150 dpi
+        self.adaptive_dpi = adaptive_dpi
+        self.dpi_choices = tuple(sorted(dpi_choices))
+
+    def page_count(self, pdf_path: str) -> int:
+        info = pdfinfo_from_path(pdf_path, poppler_path=self.poppler_path)
+        return int(info["Pages"])
+
+    def iter_pages(self, pdf_path: str,
+                   pages: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, Image.Image]]:
+        """
+        Gera tuplas (numero_pagina, imagem) na ordem das páginas.
+
+        Args:
+            pdf_path: Caminho do PDF
+            pages: Números de página (a partir de 1) a renderizar; todas se None
+        """
+        if pages is None:
+            pages = range(1, self.page_count(pdf_path) + 1)
+
+        for first_page, last_page in self._page_windows(pages, self.window_size):
+            for run_first, run_last, dpi in self._dpi_runs(pdf_path, first_page, last_page):
+                if self.use_temp_folder:
+                    yield from self._render_window_to_folder(pdf_path, run_first, run_last, dpi)
+                else:
+                    yield from self._render_window(pdf_path, run_first, run_last, dpi)
+
+    def render_page(self, pdf_path: str, page: int, dpi: int) -> Image.Image:
+        """Renderiza uma única página na resolução indicada"""
+        return next(self._render_window(pdf_path, page, page, dpi))[1]
+
+    def _render_window(self, pdf_path: str, first_page: int, last_page: int,
+                       dpi: int) -> Iterator[Tuple[int, Image.Image]]:
+        images = convert_from_path(
+            pdf_path,
+            dpi=dpi,
+            first_page=first_page,
+            last_page=last_page,
+            grayscale=self.grayscale,
+            poppler_path=self.poppler_path
+        )
+        for offset in range(len(images)):
+            # Remove a referência da lista para que a página possa ser
+            # liberada assim que o consumidor terminar de usá-la
+            image, images[offset] = images[offset], None
+            image.info['dpi'] = (dpi, dpi)
+            yield first_page + offset, image
+
+    def _render_window_to_folder(self, pdf_path: str, first_page: int, last_page: int,
+                                 dpi: int) -> Iterator[Tuple[int, Image.Image]]:
+        with tempfile.TemporaryDirectory(prefix="ocr_pages_") as temp_dir:
+            paths = convert_from_path(
+                pdf_path,
+                dpi=dpi,
+                first_page=first_page,
+                last_page=last_page,
+                grayscale=self.grayscale,
+                poppler_path=self.poppler_path,
+                output_folder=temp_dir,
+                paths_only=True
+            )
+            for offset, path in enumerate(sorted(paths)):
+                # load() lê a página e fecha o arquivo, que pode então ser removido
+                image = Image.open(path)
+                image.load()
+                os.remove(path)
+                image.info['dpi'] = (dpi, dpi)
+                yield first_page + offset, image
+
+    def _dpi_runs(self, pdf_path: str, first_page: int,
+                  last_page: int) -> List[Tuple[int, int, int]]:
+        """Divide a janela em sequências de páginas com a mesma resolução escolhida"""
+        if not self.adaptive_dpi:
+            return [(first_page, last_page, self.dpi)]
+
+        probes = convert_from_path(
+            pdf_path,
+            dpi=PROBE_DPI,
+            first_page=first_page,
+            last_page=last_page,
+            grayscale=True,
+            poppler_path=self.poppler_path
+        )
+        runs = []
+        for offset, probe in enumerate(probes):
+            page, dpi = first_page + offset, self.choose_dpi(probe)
+            if runs and runs[-1][2] == dpi and runs[-1][1] == page - 1:
+                runs[-1] = (runs[-1][0], page, dpi)
+            else:
+                runs.append((page, page, dpi))
+        return runs
+
+    def choose_dpi(self, probe: Image.Image) -> int:
+        """
+        Escolhe a menor resolução candidata em que a altura-x do texto da
+        sondagem (renderizada a PROBE_DPI) atinge MIN_X_HEIGHT_PX.
+        """
+        options = PreprocessingOptions()
+        ink = binarize(probe.convert('L'), options)
+        angle = estimate_skew(ink, options.max_skew_angle, options.skew_step)
+        if angle:
+            ink = rotate_ink(ink, angle)
+
+        x_height = estimate_x_height(ink)
+        if not x_height:
+            return self.dpi
+
+        needed_dpi = MIN_X_HEIGHT_PX * PROBE_DPI / x_height
+        for dpi in self.dpi_choices:
+            if dpi >= needed_dpi:
+                return dpi
+        return self.dpi_choices[-1]
+
+    @staticmethod
+    def _page_windows(pages: Iterable[int], window_size: int) -> List[Tuple[int, int]]:
+        """Agrupa números de página em intervalos contíguos de até window_size páginas"""
+        windows = []
+        for page in sorted(set(pages)):
+            if windows:
+                first, last = windows[-1]
+                if page == last + 1 and last - first + 1 < window_size:
+                    windows[-1] = (first, page)
+                    continue
+            windows.append((page, page))
+        return windows
@@ -1,56 +1,372 @@
 
 
 import pytesseract
-from PIL import Image, ImageOps
-from pdf2image import convert_from_path
+from PIL import Image
 from bs4 import BeautifulSoup
 import logging
-from typing import List
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from xml.etree.ElementTree import ParseError
 from ..core.base_ocr import BaseOCRProcessor, MIN_TEXT_LENGTH
+from ..utils.concurrency import cpu_count, omp_environment
+from .hocr_parser import format_paragraphs, page_confidence, parse_hocr
+from .image_frames import is_image_file, iter_frames
+from .image_preprocessor import PreprocessingOptions, preprocess_image
+from .pdf_rasterizer import PdfRasterizer
+
+# Intervalo (s) entre verificações do stop_event enquanto aguarda o pool
+POOL_POLL_INTERVAL = 0.2
+# Intervalo (s) entre verificações de cancelamento e prazo durante uma página
+PAGE_POLL_INTERVAL = 0.1
+# Prazo (s) do OCR de uma página; uma página travada não bloqueia o worker
+DEFAULT_PAGE_TIMEOUT = 300.0
+
+
+class ScoredPage(NamedTuple):
+    """Texto de uma página e a confiança média (0 a 100) das suas palavras"""
+    text: str
+    confidence: Optional[float]
+
+
+class PageTimeoutError(RuntimeError):
+    """O OCR da página excedeu o prazo e o processo do Tesseract foi encerrado"""
+
+
+class OCRCancelledError(RuntimeError):
+    """O OCR da página foi interrompido pelo cancelamento do lote"""
+
+
+class PageLimits(NamedTuple):
+    """Prazo (s), evento de cancelamento e threads OpenMP do OCR de uma página"""
+    timeout: Optional[float] = None
+    # Nos processos do pool é usado o evento recebido em _init_pool_worker
+    cancel_event: Optional[Any] = None
+    # Threads internas do Tesseract; None mantém o ambiente do processo
+    omp_threads: Optional[int] = None
+
+
+# Evento de cancelamento compartilhado com os processos do pool
+_pool_cancel_event = None
+
+
+def _init_pool_worker(cancel_event) -> None:
+    global _pool_cancel_event
+    _pool_cancel_event = cancel_event
+
+
+def run_tesseract(image: Image.Image, args: List[str], limits: Optional[PageLimits] = None) -> bytes:
+    """
+    Executa o Tesseract na imagem e retorna a sua saída padrão. Ao contrário
+    do pytesseract, acompanha o processo enquanto ele roda: o Tesseract é
+    encerrado assim que o prazo da página expira ou o cancelamento é pedido.
+
+    Raises:
+        PageTimeoutError, OCRCancelledError, pytesseract.TesseractError
+    """
+    limits = limits or PageLimits()
+    cancel_event = limits.cancel_event if limits.cancel_event is not None else _pool_cancel_event
+    deadline = time.monotonic() + limits.timeout if limits.timeout is not None else None
+    image, _ = pytesseract.pytesseract.prepare(image)
+
+    with tempfile.TemporaryDirectory(prefix="tess_") as temp_dir:
+        input_path = os.path.join(temp_dir, "pagina.png")
+        image.save(input_path, format='PNG')
+        popen_args = pytesseract.pytesseract.subprocess_args()
+        # O limite vai apenas no ambiente do subprocesso, não no do processo atual
+        popen_args['env'] = omp_environment(limits.omp_threads, popen_args.get('env'))
+        try:
+            process = subprocess.Popen([pytesseract.pytesseract.tesseract_cmd, input_path, 'stdout', *args],
+                                       **popen_args)
+        except FileNotFoundError:
+            raise pytesseract.TesseractNotFoundError()
+
+        while True:
+            try:
+                output, errors = process.communicate(timeout=PAGE_POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                if cancel_event is not None and cancel_event.is_set():
+                    _kill(process)
+                    raise OCRCancelledError("OCR da página cancelado")
+                if deadline is not None and time.monotonic() >= deadline:
+                    _kill(process)
+                    raise PageTimeoutError(f"OCR da página excedeu o prazo de {limits.timeout:.0f}s")
+
+    if process.returncode:
+        raise pytesseract.TesseractError(process.returncode, errors.decode('utf-8', 'replace').strip())
+    return output
+
+
+def _kill(process: subprocess.Popen) -> None:
+    # Aguarda o término para que o arquivo temporário possa ser removido (Windows)
+    process.kill()
+    process.communicate()
+
+
+def _ocr_page_worker(ocr_cls, image: Image.Image, lang: str,
+                     options: Optional[PreprocessingOptions], scored: bool = False,
+                     limits: Optional[PageLimits] = None):
+    """Executa o OCR de uma única página, na thread atual ou em um processo do pool"""
+    if scored:
+        return ocr_cls._ocr_page_scored(image, lang, options, limits)
+    return ocr_cls._ocr_page(image, lang, options, limits)
+
 
 class TesseractOCR(BaseOCRProcessor):
-    def __init__(self, poppler_path=None):
+    def __init__(self, poppler_path=None, max_workers: int = 1,
+                 preprocessing: Optional[PreprocessingOptions] = None,
+                 max_tasks_per_child: Optional[int] = None,
+                 omp_threads: Optional[int] = 1,
+                 page_timeout: Optional[float] = DEFAULT_PAGE_TIMEOUT):
         super().__init__()
         self.poppler_path = poppler_path
+        self.rasterizer = PdfRasterizer(poppler_path=poppler_path)
+        self.preprocessing = preprocessing or PreprocessingOptions()
+        # Com max_workers > 1 as páginas são distribuídas em um pool de processos,
+        # compartilhado pelos documentos; max_workers limita as páginas em voo
+        # de cada documento
+        self.max_workers = max_workers
+        # Páginas por processo do pool antes de ele ser substituído, liberando a
+        # memória acumulada pelo PIL e pelo numpy; None mantém os processos.
+        # Com reciclagem, o pool é usado mesmo com max_workers = 1
+        self.max_tasks_per_child = max_tasks_per_child
+        # Prazo de cada página; o prazo do documento (document_timeout), se
+        # menor, prevalece. None desativa
+        self.page_timeout = page_timeout
+        self._pool = None
+        self._pool_config = None
+        self._pool_lock = threading.Lock()
+        # Sinaliza o cancelamento aos processos do pool, que encerram o Tesseract
+        self._pool_cancel_event = None
+        # Threads OpenMP por página, aplicadas ao Tesseract de cada página;
+        # None mantém o padrão do Tesseract (todos os núcleos), adequado
+        # apenas a um documento por vez
+        self.omp_threads = omp_threads
+
+    def cache_signature(self) -> str:
+        rasterizer = self.rasterizer
+        return (f"{type(self).__name__}|{self.preprocessing!r}|dpi={rasterizer.dpi}"
+                f"|adaptive={rasterizer.adaptive_dpi}:{rasterizer.dpi_choices}|gray={rasterizer.grayscale}")
 
-    def _preprocess_image(self, image: Image.Image) -> Image.Image:
-        return ImageOps.autocontrast(image.convert('L').point(lambda x: 0 if x < 128 else 255))
+    def recommended_workers(self) -> int:
+        # Cada documento mantém até max_workers páginas no pool: o total acompanha os núcleos
+        return max(1, cpu_count() // max(1, self.max_workers))
+
+    def pool_size(self) -> int:
+        """Processos do pool compartilhado pelos documentos: um por núcleo"""
+        return max(self.max_workers, cpu_count())
+
+    @staticmethod
+    def _preprocess_image(image: Image.Image,
+                          options: Optional[PreprocessingOptions] = None) -> Image.Image:
+        return preprocess_image(image, options)
+
+    def _ocr_pages(self, pdf_path: str, pages: Optional[List[int]], lang: str) -> Dict[int, str]:
+        return self._ocr_numbered_images(self.iter_page_images(pdf_path, pages), lang)
+
+    def ocr_pages_scored(self, pdf_path: str, pages: Optional[List[int]],
+                         lang: str) -> Dict[int, ScoredPage]:
+        """Como _ocr_pages, mas retorna também a confiança de cada página"""
+        return self._ocr_numbered_images(self.iter_page_images(pdf_path, pages), lang, scored=True)
+
+    def iter_page_images(self, path: str, pages: Optional[List[int]]) -> Iterable[Tuple[int, Image.Image]]:
+        """
+        Páginas do documento consumidas sob demanda: renderizadas em janelas,
+        no caso de PDFs, ou decodificadas um quadro por vez, no caso de imagens
+        """
+        if is_image_file(path):
+            return iter_frames(path, pages)
+        return self.rasterizer.iter_pages(path, pages)
+
+    def _perform_ocr(self, images: Iterable[Image.Image], lang: str) -> str:
+        page_texts = self._ocr_numbered_images(enumerate(images, 1), lang)
+        text = ''.join(page_texts[page] for page in sorted(page_texts))
+        return text if len(text.strip()) > MIN_TEXT_LENGTH else ""
+
+    def _ocr_numbered_images(self, numbered_images: Iterable[Tuple[int, Image.Image]],
+                             lang: str, scored: bool = False) -> Dict[int, str]:
+        if self.uses_pool():
+            return self._ocr_pages_parallel(numbered_images, lang, scored)
+        return self._ocr_pages_serial(numbered_images, lang, scored)
+
+    def uses_pool(self) -> bool:
+        """
+        Indica se o pré-processamento e o OCR das páginas rodam no pool de
+        processos: com mais de um worker ou com reciclagem dos processos
+        """
+        return self.max_workers > 1 or bool(self.max_tasks_per_child and sys.version_info >= (3, 11))
+
+    def page_limits(self, cancel_event=None) -> PageLimits:
+        timeout = self.time_remaining()
+        if self.page_timeout is not None:
+            timeout = self.page_timeout if timeout is None else min(timeout, self.page_timeout)
+        return PageLimits(timeout, cancel_event, self.omp_threads)
+
+    def _ocr_pages_serial(self, numbered_images: Iterable[Tuple[int, Image.Image]],
+                          lang: str, scored: bool = False) -> Dict[int, str]:
+        page_texts = {}
+        for page_number, image in numbered_images:
+            if self.cancelled():
+                break
+            try:
+                page_texts[page_number] = _ocr_page_worker(type(self), image, lang, self.preprocessing,
+                                                           scored, self.page_limits(self.stop_event))
+            except PageTimeoutError as e:
+                logging.error(f"Página {page_number}: {e}")
+            except OCRCancelledError:
+                break
+        return page_texts
+
+    def _ocr_pages_parallel(self, numbered_images: Iterable[Tuple[int, Image.Image]],
+                            lang: str, scored: bool = False) -> Dict[int, str]:
+        """
+        Distribui as páginas entre os processos do pool e devolve os textos por
+        número de página. No máximo max_workers páginas do documento ficam em
+        voo, de modo que as imagens ainda não submetidas não se acumulam na
+        memória e os demais documentos também ocupam o pool.
+        """
+        pool = self._get_pool()
+        window = self.max_workers
+        submitted = []
+        pending = {}
+        results: Dict[int, str] = {}
+        timed_out = set()
+
+        def collect(done):
+            for future in done:
+                page_number = pending.pop(future)
+                try:
+                    results[page_number] = future.result()
+                except PageTimeoutError as e:
+                    logging.error(f"Página {page_number}: {e}")
+                    timed_out.add(page_number)
+                except OCRCancelledError:
+                    pass
 
-    def extract_text(self, pdf_path: str, lang: str = 'por') -> str:
         try:
-            images = convert_from_path(pdf_path, poppler_path=self.poppler_path)
-            return self._perform_ocr(images, lang)
-        except Exception as e:
-            logging.error(f"Erro no processamento com Tesseract: {e}")
-            return ""
+            for page_number, image in numbered_images:
+                if self.cancelled():
+                    break
+                while len(pending) >= window and not self.cancelled():
+                    done, _ = wait(pending, timeout=POOL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                    collect(done)
+                if self.cancelled():
+                    break
+                future = pool.submit(_ocr_page_worker, type(self), image, lang, self.preprocessing,
+                                     scored, self.page_limits())
+                pending[future] = page_number
+                submitted.append(page_number)
 
-    def _perform_ocr(self, images: List[Image.Image], lang: str) -> str:
-        text = ""
-        for image in images:
-            if self.stop_event.is_set():
+            while pending and not self.cancelled():
+                done, _ = wait(pending, timeout=POOL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                collect(done)
+        finally:
+            for future in pending:
+                future.cancel()
+            if pending and self.stop_event.is_set():
+                # Páginas já em execução: os processos do pool encerram o Tesseract
+                self._pool_cancel_event.set()
+
+        # Em caso de cancelamento, mantém apenas as páginas contíguas desde o início,
+        # como no modo sequencial
+        page_texts = {}
+        for page_number in submitted:
+            if page_number in timed_out:
+                continue
+            if page_number not in results:
                 break
+            page_texts[page_number] = results[page_number]
+        return page_texts
 
-            processed = self._preprocess_image(image)
-            hocr_data = pytesseract.image_to_pdf_or_hocr(
-                processed,
-                extension='hocr',
-                config=f'--psm 1 -l {lang}'
-            )
-            
-            soup = BeautifulSoup(hocr_data, 'html.parser')
-            paragraphs = soup.find_all('p', class_='ocr_par')
-            
-            for para in paragraphs:
-                lines = []
-                for line in para.find_all('span', class_='ocr_line'):
-                    words = line.find_all('span', class_='ocrx_word')
-                    line_text = ' '.join(self._process_words(words))
-                    lines.append(line_text)
-                text += '\n'.join(lines) + '\n\n'
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            config = (self.pool_size(), self.max_tasks_per_child)
+            if self._pool is not None and self._pool_config != config:
+                # Configuração do pool alterada entre execuções: recria o pool
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            if self._pool is None:
+                # 'spawn' evita herdar locks de threads da interface gráfica via fork
+                context = multiprocessing.get_context('spawn')
+                self._pool_cancel_event = context.Event()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=config[0],
+                    mp_context=context,
+                    initializer=_init_pool_worker,
+                    initargs=(self._pool_cancel_event,),
+                    **self._recycling_options()
+                )
+                self._pool_config = config
+            elif not self.stop_event.is_set():
+                # Nova execução após um cancelamento
+                self._pool_cancel_event.clear()
+            return self._pool
 
-        return text if len(text.strip()) > MIN_TEXT_LENGTH else ""
+    def _recycling_options(self) -> Dict[str, int]:
+        if not self.max_tasks_per_child:
+            return {}
+        if sys.version_info < (3, 11):
+            logging.warning("max_tasks_per_child requer Python 3.11 ou superior; processos não serão reciclados")
+            return {}
+        return {"max_tasks_per_child": self.max_tasks_per_child}
+
+    def shutdown(self):
+        """Encerra o pool de processos, se existir"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+
+    @classmethod
+    def _ocr_page(cls, image: Image.Image, lang: str,
+                  options: Optional[PreprocessingOptions] = None,
+                  limits: Optional[PageLimits] = None) -> str:
+        return cls._ocr_page_scored(image, lang, options, limits).text
+
+    @classmethod
+    def _ocr_page_scored(cls, image: Image.Image, lang: str,
+                         options: Optional[PreprocessingOptions] = None,
+                         limits: Optional[PageLimits] = None) -> ScoredPage:
+        processed = cls._preprocess_image(image, options)
+        hocr_data = cls._recognize_hocr(processed, lang, limits)
+
+        try:
+            paragraphs = parse_hocr(hocr_data)
+            return ScoredPage(format_paragraphs(paragraphs), page_confidence(paragraphs))
+        except ParseError as e:
+            logging.warning(f"hOCR malformado, usando BeautifulSoup: {e}")
+            return ScoredPage(cls._parse_hocr_with_soup(hocr_data), None)
+
+    @classmethod
+    def _recognize_hocr(cls, image: Image.Image, lang: str,
+                        limits: Optional[PageLimits] = None) -> bytes:
+        """Executa o Tesseract na imagem já pré-processada e retorna o hOCR"""
+        return run_tesseract(image, ['-l', lang, '--psm', '1', 'hocr'], limits)
+
+    @classmethod
+    def _parse_hocr_with_soup(cls, hocr_data: bytes) -> str:
+        soup = BeautifulSoup(hocr_data, 'html.parser')
+        paragraphs = soup.find_all('p', class_='ocr_par')
+
+        text = ""
+        for para in paragraphs:
+            lines = []
+            for line in para.find_all('span', class_='ocr_line'):
+                words = line.find_all('span', class_='ocrx_word')
+                line_text = ' '.join(cls._process_words(words))
+                lines.append(line_text)
+            text += '\n'.join(lines) + '\n\n'
+        return text
 
-    def _process_words(self, words: List[BeautifulSoup]) -> List[str]:
+    @staticmethod
+    def _process_words(words: List[BeautifulSoup]) -> List[str]:
         processed_words = []
         for word in words:
             word_text = word.get_text().strip()
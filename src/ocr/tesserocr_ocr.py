@@ -0,0 +1,72 @@
+
+
+import importlib
+import importlib.util
+import threading
+from typing import Optional
+from PIL import Image
+from .tesseract_ocr import PageLimits, PageTimeoutError, TesseractOCR
+from ..utils.concurrency import pin_omp_threads
+
+# O pacote é importado apenas na primeira página (ver _load_tesserocr)
+TESSEROCR_AVAILABLE = importlib.util.find_spec("tesserocr") is not None
+tesserocr = None
+_import_lock = threading.Lock()
+
+# Uma instância da API por thread e idioma. Nos processos do pool cada worker
+# mantém a sua, reaproveitada entre páginas e documentos.
+_thread_state = threading.local()
+
+
+def _load_tesserocr(omp_threads: Optional[int]):
+    """
+    Importa o tesserocr. O OpenMP lê OMP_THREAD_LIMIT uma única vez, ao
+    carregar a biblioteca do Tesseract: o limite de threads por página é
+    definido no ambiente logo antes do import, não depois.
+    """
+    global tesserocr
+    with _import_lock:
+        if tesserocr is None:
+            pin_omp_threads(omp_threads)
+            tesserocr = importlib.import_module("tesserocr")
+    return tesserocr
+
+
+def _get_api(lang: str, omp_threads: Optional[int] = None):
+    apis = getattr(_thread_state, 'apis', None)
+    if apis is None:
+        apis = _thread_state.apis = {}
+    if lang not in apis:
+        module = _load_tesserocr(omp_threads)
+        apis[lang] = module.PyTessBaseAPI(lang=lang, psm=module.PSM.AUTO_OSD)
+    return apis[lang]
+
+
+class TesserocrOCR(TesseractOCR):
+    """
+    Variante do TesseractOCR que usa o Tesseract em processo (tesserocr), sem
+    criar um subprocesso nem recarregar o modelo de idioma a cada página.
+    Usa o mesmo pré-processamento, modo de segmentação (--psm 1) e parser de
+    hOCR, produzindo o mesmo texto que o TesseractOCR.
+    """
+
+    def __init__(self, **kwargs):
+        # Aceita as mesmas opções do TesseractOCR (pool, prazo, pré-processamento)
+        if not TESSEROCR_AVAILABLE:
+            raise ImportError("O pacote 'tesserocr' é necessário para o TesserocrOCR (pip install tesserocr)")
+        super().__init__(**kwargs)
+
+    @classmethod
+    def _recognize_hocr(cls, image: Image.Image, lang: str,
+                        limits: Optional[PageLimits] = None) -> str:
+        # Em processo não há subprocesso para encerrar: o prazo da página é
+        # aplicado pelo próprio Tesseract e o cancelamento ocorre entre páginas
+        api = _get_api(lang, limits.omp_threads if limits is not None else None)
+        api.SetImage(image)
+        try:
+            if limits is not None and limits.timeout is not None:
+                if not api.Recognize(int(limits.timeout * 1000)):
+                    raise PageTimeoutError(f"OCR da página excedeu o prazo de {limits.timeout:.0f}s")
+            return api.GetHOCRText(0)
+        finally:
+            api.Clear()
@@ -0,0 +1,243 @@
+
+
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from PIL import Image, ImageFilter
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import PDFStream, resolve1
+from ..core.base_ocr import BaseOCRProcessor
+from ..utils.pdf_writer import ImagePage, decode_page, encode_jpeg_page, encode_mono_page, write_image_pdf
+from .image_preprocessor import PreprocessingOptions, binarize
+from .pdf_rasterizer import PdfRasterizer
+
+OPTIMIZER_DPI = 200
+OPTIMIZER_JPEG_QUALITY = 75
+# Fração máxima de pixels cuja classificação tinta/fundo pode mudar na recompressão
+MAX_INK_DIFFERENCE = 0.01
+# Deslocamento (pixels da referência) tolerado nas bordas dos traços: a
+# reamostragem desloca as bordas sem afetar a legibilidade
+INK_EDGE_TOLERANCE = 1
+# Só compensa enviar a versão otimizada se ela for ao menos 20% menor
+MIN_SAVINGS_RATIO = 0.2
+# Limite da resolução de referência usada na verificação de qualidade
+MAX_REFERENCE_DPI = 600
+
+
+class OptimizedUpload:
+    """PDF recomprimido em um arquivo temporário, com o mapa das páginas originais"""
+
+    def __init__(self, path: str, page_numbers: List[int], original_bytes: int):
+        self.path = path
+        # page_numbers[i] é a página original da página i + 1 do PDF otimizado
+        self.page_numbers = page_numbers
+        self.original_bytes = original_bytes
+        self.optimized_bytes = os.path.getsize(path)
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - self.optimized_bytes
+
+    def original_pages(self, page_texts: Dict[int, str]) -> Dict[int, str]:
+        """Converte {pagina_otimizada: texto} para a numeração do documento original"""
+        return {self.page_numbers[page - 1]: text for page, text in page_texts.items()
+                if 1 <= page <= len(self.page_numbers)}
+
+    def cleanup(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class UploadOptimizer:
+    """
+    Recomprime PDFs digitalizados antes do envio à API. As páginas que precisam
+    de OCR são renderizadas na resolução necessária para o tamanho das letras
+    (ou em dpi fixo), em tons de cinza (JPEG) ou preto e branco (1 bit), e
+    gravadas em um novo PDF. O original é mantido se a página tiver fontes, se
+    a economia for pequena ou se a recompressão alterar o texto além da
+    tolerância. A tolerância é medida contra a página na resolução original
+    da digitalização, de modo que a perda da redução de resolução também
+    conta, tanto em JPEG quanto em preto e branco.
+    """
+
+    def __init__(self, poppler_path=None, dpi: int = OPTIMIZER_DPI, adaptive_dpi: bool = True,
+                 mono: bool = False, jpeg_quality: int = OPTIMIZER_JPEG_QUALITY,
+                 max_ink_difference: float = MAX_INK_DIFFERENCE,
+                 min_savings_ratio: float = MIN_SAVINGS_RATIO):
+        self.rasterizer = PdfRasterizer(poppler_path, dpi=dpi, adaptive_dpi=adaptive_dpi)
+        self.mono = mono
+        self.jpeg_quality = jpeg_quality
+        self.max_ink_difference = max_ink_difference
+        self.min_savings_ratio = min_savings_ratio
+        self._lock = threading.Lock()
+        self.documents_optimized = 0
+        self.original_bytes = 0
+        self.optimized_bytes = 0
+
+    def optimize(self, pdf_path: str, pages: Optional[List[int]] = None) -> Optional[OptimizedUpload]:
+        """
+        Gera a versão otimizada das páginas indicadas (todas se None).
+
+        Returns:
+            OptimizedUpload, ou None se o original deve ser enviado
+        """
+        try:
+            page_numbers = self.image_only_pages(pdf_path, pages)
+            if not page_numbers:
+                return None
+            return self._write_optimized(pdf_path, page_numbers)
+        except Exception as e:
+            logging.warning(f"Não foi possível otimizar {pdf_path}; enviando o original: {e}")
+            return None
+
+    @staticmethod
+    def image_only_pages(pdf_path: str, pages: Optional[List[int]] = None) -> Optional[List[int]]:
+        """Retorna as páginas pedidas se nenhuma delas tiver fontes, senão None"""
+        selected = set(pages) if pages is not None else None
+        page_numbers = []
+        with open(pdf_path, 'rb') as fp:
+            for page_number, page in enumerate(PDFPage.get_pages(fp), 1):
+                if selected is not None and page_number not in selected:
+                    continue
+                if BaseOCRProcessor._page_has_fonts(page):
+                    return None
+                page_numbers.append(page_number)
+        return page_numbers
+
+    @staticmethod
+    def native_dpi(pdf_path: str, page_numbers: List[int]) -> Dict[int, float]:
+        """
+        Resolução original de cada página, dada pela maior imagem que ela
+        referencia. Páginas sem imagens ficam de fora.
+        """
+        selected = set(page_numbers)
+        resolutions = {}
+        with open(pdf_path, 'rb') as fp:
+            for page_number, page in enumerate(PDFPage.get_pages(fp), 1):
+                if page_number not in selected:
+                    continue
+                x0, _, x1, _ = page.mediabox
+                page_inches = abs(x1 - x0) / 72
+                if not page_inches:
+                    continue
+                resources = resolve1(page.resources) or {}
+                xobjects = resolve1(resources.get('XObject')) or {}
+                widths = []
+                for xobject in xobjects.values():
+                    xobject = resolve1(xobject)
+                    if isinstance(xobject, PDFStream) and getattr(resolve1(xobject.get('Subtype')), 'name', None) == 'Image':
+                        widths.append(resolve1(xobject.get('Width')) or 0)
+                if widths and max(widths):
+                    resolutions[page_number] = max(widths) / page_inches
+        return resolutions
+
+    def reference_image(self, pdf_path: str, page_number: int, image: Image.Image,
+                        dpi: float, native_dpi: Optional[float]) -> Image.Image:
+        """
+        Página na resolução original, até MAX_REFERENCE_DPI. Se a renderização
+        usada na codificação já tiver essa resolução, ela própria é a referência.
+        """
+        if native_dpi is None or native_dpi <= dpi:
+            return image
+        return self.rasterizer.render_page(pdf_path, page_number, int(min(native_dpi, MAX_REFERENCE_DPI)))
+
+    def _write_optimized(self, pdf_path: str, page_numbers: List[int]) -> Optional[OptimizedUpload]:
+        original_bytes = os.path.getsize(pdf_path)
+        fd, temp_path = tempfile.mkstemp(prefix="ocr_upload_", suffix='.pdf')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                rendered = _EncodedPages(self, pdf_path, page_numbers)
+                write_image_pdf(rendered, output)
+                if rendered.rejected is not None:
+                    logging.info(f"Otimização de {pdf_path} descartada: página {rendered.rejected} "
+                                 f"fora da tolerância de qualidade")
+                    os.remove(temp_path)
+                    return None
+
+            optimized = OptimizedUpload(temp_path, page_numbers, original_bytes)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        if optimized.saved_bytes < original_bytes * self.min_savings_ratio:
+            optimized.cleanup()
+            return None
+
+        with self._lock:
+            self.documents_optimized += 1
+            self.original_bytes += optimized.original_bytes
+            self.optimized_bytes += optimized.optimized_bytes
+        logging.info(f"Upload de {pdf_path} reduzido de {original_bytes} para "
+                     f"{optimized.optimized_bytes} bytes")
+        return optimized
+
+    def encode_page(self, image: Image.Image, dpi: float) -> ImagePage:
+        gray = image.convert('L')
+        if self.mono:
+            ink = binarize(gray, PreprocessingOptions())
+            return encode_mono_page(Image.fromarray(~ink), dpi)
+        return encode_jpeg_page(gray, dpi, self.jpeg_quality)
+
+    def ink_difference(self, reference: Image.Image, page: ImagePage) -> float:
+        """
+        Fração de pixels cuja classificação tinta/fundo mudou entre a página de
+        referência e a codificada, ampliada para a resolução da referência.
+        Só conta a tinta que sumiu ou apareceu a mais de INK_EDGE_TOLERANCE
+        pixels de um traço da outra imagem: traços finos perdidos na redução
+        de resolução contam, o contorno deslocado das letras não.
+        """
+        options = PreprocessingOptions()
+        original_ink = binarize(reference.convert('L'), options)
+        decoded = decode_page(page).convert('L')
+        if decoded.size != reference.size:
+            decoded = decoded.resize(reference.size, Image.BILINEAR)
+        decoded_ink = binarize(decoded, options)
+        changed = ((original_ink & ~_dilate(decoded_ink, INK_EDGE_TOLERANCE)) |
+                   (decoded_ink & ~_dilate(original_ink, INK_EDGE_TOLERANCE)))
+        return float(np.mean(changed))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "documents": self.documents_optimized,
+                "original_bytes": self.original_bytes,
+                "optimized_bytes": self.optimized_bytes,
+                "saved_bytes": self.original_bytes - self.optimized_bytes
+            }
+
+
+def _dilate(ink: np.ndarray, radius: int) -> np.ndarray:
+    """Expande a máscara de tinta em radius pixels (MaxFilter do Pillow, em C)"""
+    mask = Image.fromarray(ink.astype(np.uint8) * 255)
+    return np.asarray(mask.filter(ImageFilter.MaxFilter(2 * radius + 1))) > 0
+
+
+class _EncodedPages:
+    """
+    Iterador das páginas recodificadas que interrompe a geração na primeira
+    página fora da tolerância de qualidade, registrando-a em 'rejected'.
+    """
+
+    def __init__(self, optimizer: UploadOptimizer, pdf_path: str, page_numbers: List[int]):
+        self.optimizer = optimizer
+        self.pdf_path = pdf_path
+        self.page_numbers = page_numbers
+        self.rejected: Optional[int] = None
+
+    def __iter__(self):
+        optimizer = self.optimizer
+        native_dpi = optimizer.native_dpi(self.pdf_path, self.page_numbers)
+        for page_number, image in optimizer.rasterizer.iter_pages(self.pdf_path, self.page_numbers):
+            dpi = image.info.get('dpi', (optimizer.rasterizer.dpi,))[0] or optimizer.rasterizer.dpi
+            page = optimizer.encode_page(image, dpi)
+            reference = optimizer.reference_image(self.pdf_path, page_number, image, dpi,
+                                                  native_dpi.get(page_number))
+            if optimizer.ink_difference(reference, page) > optimizer.max_ink_difference:
+                self.rejected = page_number
+                return
+            yield page
@@ -0,0 +1,109 @@
+
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+
+class CircuitOpenError(Exception):
+    """Requisição recusada porque o circuito está aberto"""
+
+
+class CircuitBreaker:
+    """
+    Disjuntor para um serviço remoto. Depois de failure_threshold falhas
+    seguidas (erros ou chamadas mais lentas que slow_call_threshold) o
+    circuito abre e as chamadas são recusadas imediatamente. Passados
+    reset_timeout segundos, uma única chamada de teste é liberada: se tiver
+    sucesso o circuito fecha, senão volta a abrir.
+    """
+
+    def __init__(self, name: str = "serviço", failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+                 slow_call_threshold: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_threshold = slow_call_threshold
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.rejected_count = 0
+        self.open_count = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected_count += 1
+            return False
+
+    def check(self) -> None:
+        """Levanta CircuitOpenError se a chamada não puder ser feita agora"""
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuito de {self.name} aberto; requisição recusada")
+
+    def release_probe(self) -> None:
+        """
+        Devolve a chamada de teste liberada por allow_request sem alterar o
+        estado, para quando ela terminou sem resultado (cancelada ou com erro
+        que não diz respeito ao serviço). Outra chamada pode testar o circuito.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self, latency: Optional[float] = None) -> None:
+        if (latency is not None and self.slow_call_threshold is not None
+                and latency > self.slow_call_threshold):
+            self.record_failure()
+            return
+        with self._lock:
+            self._failures = 0
+            if self._state != CLOSED:
+                self._state = CLOSED
+                self._probe_in_flight = False
+                logging.info(f"Circuito de {self.name} fechado: serviço respondendo normalmente")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and
+                                            self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+                self.open_count += 1
+                logging.warning(f"Circuito de {self.name} aberto após {self._failures} falhas; "
+                                f"nova tentativa em {self.reset_timeout:.0f}s")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "opened": self.open_count,
+                "rejected": self.rejected_count
+            }
@@ -0,0 +1,176 @@
+
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Mapping, Optional
+
+# Variável lida pelo OpenMP do Tesseract (número de threads por página)
+OMP_THREAD_LIMIT_ENV = "OMP_THREAD_LIMIT"
+# Intervalo (s) entre verificações do stop_event enquanto aguarda uma vaga
+ACQUIRE_POLL_INTERVAL = 0.2
+
+DEFAULT_INITIAL_LIMIT = 4
+DEFAULT_MIN_LIMIT = 1
+# Fator aplicado ao limite quando a API sinaliza sobrecarga
+DEFAULT_DECREASE_FACTOR = 0.5
+# Latência (média móvel) acima de latency_tolerance vezes a de referência
+# também reduz o limite: a fila do servidor está crescendo
+DEFAULT_LATENCY_TOLERANCE = 2.0
+LATENCY_SMOOTHING = 0.2
+# Fração com que a latência de referência acompanha a média a cada amostra,
+# para que uma mudança duradoura (documentos maiores) não a deixe obsoleta
+BASELINE_DRIFT = 0.01
+
+
+def cpu_count() -> int:
+    """Núcleos disponíveis para o processo (respeita a afinidade, quando houver)"""
+    if hasattr(os, 'sched_getaffinity'):
+        try:
+            return max(1, len(os.sched_getaffinity(0)))
+        except OSError:
+            pass
+    return os.cpu_count() or 1
+
+
+def omp_environment(limit: Optional[int], environ: Optional[Mapping[str, str]] = None) -> Dict[str, str]:
+    """
+    Ambiente para um subprocesso do Tesseract com as threads internas
+    (OpenMP) limitadas. O paralelismo vem dos documentos e páginas
+    processados ao mesmo tempo; deixar cada página usar todos os núcleos
+    multiplica as threads e degrada a vazão. Um valor já definido no
+    ambiente pelo usuário é mantido, e limit None não altera o ambiente.
+    """
+    env = dict(os.environ if environ is None else environ)
+    if limit is not None:
+        env.setdefault(OMP_THREAD_LIMIT_ENV, str(limit))
+    return env
+
+
+def pin_omp_threads(limit: Optional[int]) -> None:
+    """
+    Aplica o limite de omp_environment ao processo atual. O OpenMP lê a
+    variável ao carregar a biblioteca do Tesseract, então só tem efeito se
+    chamada antes disso (ver tesserocr_ocr); para subprocessos, use
+    omp_environment.
+    """
+    if limit is None:
+        return
+    current = os.environ.setdefault(OMP_THREAD_LIMIT_ENV, str(limit))
+    if current != str(limit):
+        logging.debug(f"{OMP_THREAD_LIMIT_ENV}={current} definido no ambiente; mantido")
+
+
+class AdaptiveLimiter:
+    """
+    Limite de requisições simultâneas ajustado em execução (AIMD): cada
+    resposta normal aumenta o limite em 1/limite, ou seja, cerca de uma vaga
+    a mais por rodada de requisições, e um sinal de sobrecarga (429/503 ou
+    latência muito acima da de referência) multiplica o limite por
+    decrease_factor. As reduções são aplicadas no máximo uma vez por
+    duração média das requisições, já que uma rajada de 429 reflete o mesmo
+    excesso. A latência comparada é a por unidade de trabalho (ex.: página),
+    para que requisições maiores não pareçam sobrecarga.
+    """
+
+    def __init__(self, initial: int = DEFAULT_INITIAL_LIMIT, min_limit: int = DEFAULT_MIN_LIMIT,
+                 max_limit: int = 32, decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+                 latency_tolerance: float = DEFAULT_LATENCY_TOLERANCE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.in_flight = 0
+        self._avg_latency: Optional[float] = None
+        self._avg_duration: Optional[float] = None
+        self._baseline: Optional[float] = None
+        self._last_decrease = float('-inf')
+        self.increase_count = 0
+        self.decrease_count = 0
+        self.throttled_count = 0
+        self.peak_limit = int(self._limit)
+
+    @property
+    def limit(self) -> int:
+        with self._condition:
+            return int(self._limit)
+
+    def acquire(self, stop_event: Optional[threading.Event] = None) -> bool:
+        """Aguarda uma vaga; retorna False se o stop_event for definido antes"""
+        with self._condition:
+            while self.in_flight >= int(self._limit):
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                self._condition.wait(ACQUIRE_POLL_INTERVAL)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False, units: int = 1) -> None:
+        """
+        Devolve a vaga e ajusta o limite. latency é a duração da requisição
+        respondida normalmente, que processou units unidades de trabalho
+        (páginas); throttled indica que a API recusou por excesso de carga.
+        Sem nenhum dos dois (erro de rede), o limite não muda.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled_count += 1
+                self._decrease()
+            elif latency is not None:
+                self._observe_duration(latency)
+                if self._observe_latency(latency / max(1, units)):
+                    self._decrease()
+                else:
+                    self._increase()
+            self._condition.notify_all()
+
+    def _observe_duration(self, duration: float) -> None:
+        """Média da duração das requisições, que espaça as reduções"""
+        if self._avg_duration is None:
+            self._avg_duration = duration
+        else:
+            self._avg_duration += (duration - self._avg_duration) * LATENCY_SMOOTHING
+
+    def _observe_latency(self, latency: float) -> bool:
+        """Atualiza as médias e indica se a latência passou da tolerância"""
+        if self._avg_latency is None:
+            self._avg_latency = self._baseline = latency
+            return False
+        self._avg_latency += (latency - self._avg_latency) * LATENCY_SMOOTHING
+        self._baseline = min(self._avg_latency,
+                             self._baseline + (self._avg_latency - self._baseline) * BASELINE_DRIFT)
+        return self._avg_latency > self._baseline * self.latency_tolerance
+
+    def _increase(self) -> None:
+        if self._limit >= self.max_limit:
+            return
+        self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+        self.increase_count += 1
+        self.peak_limit = max(self.peak_limit, int(self._limit))
+
+    def _decrease(self) -> None:
+        now = self._clock()
+        if now - self._last_decrease < (self._avg_duration or 0.0):
+            return
+        self._last_decrease = now
+        previous = int(self._limit)
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        self.decrease_count += 1
+        logging.info(f"Concorrência da API reduzida de {previous} para {int(self._limit)} requisições")
+
+    def stats(self) -> Dict[str, float]:
+        with self._condition:
+            return {
+                "limit": int(self._limit),
+                "peak_limit": self.peak_limit,
+                "in_flight": self.in_flight,
+                "increases": self.increase_count,
+                "decreases": self.decrease_count,
+                "throttled": self.throttled_count
+            }
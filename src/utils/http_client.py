@@ -0,0 +1,372 @@
+
+
+import collections
+import logging
+import random
+import socket
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from .circuit_breaker import CircuitBreaker
+from .concurrency import AdaptiveLimiter
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Respostas que indicam sobrecarga e reduzem a concorrência do AdaptiveLimiter
+THROTTLE_STATUS_CODES = (429, 503)
+# Número de latências recentes mantidas para as estatísticas
+LATENCY_WINDOW = 1000
+# Intervalo (s) entre verificações do stop_event e do prazo das requisições em andamento
+ABORT_POLL_INTERVAL = 0.1
+
+# Conexão usada pela requisição em andamento em cada thread, para que o
+# cancelamento possa fechar o socket enquanto a thread aguarda a resposta
+_active_connections: Dict[int, HTTPConnection] = {}
+_active_lock = threading.Lock()
+
+
+class _TrackedConnectionMixin:
+
+    def request(self, *args, **kwargs):
+        with _active_lock:
+            _active_connections[threading.get_ident()] = self
+        return super().request(*args, **kwargs)
+
+
+class _TrackedHTTPConnection(_TrackedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TrackedHTTPSConnection(_TrackedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TrackedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TrackedHTTPConnection
+
+
+class _TrackedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TrackedHTTPSConnection
+
+
+class AbortableHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter cujas conexões podem ser interrompidas por outra thread (ver abort_thread_request)"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TrackedHTTPConnectionPool,
+            'https': _TrackedHTTPSConnectionPool
+        }
+
+
+def abort_thread_request(thread_id: int) -> bool:
+    """
+    Fecha o socket da requisição em andamento na thread, que recebe um
+    ConnectionError imediatamente em vez de aguardar a resposta ou o timeout.
+
+    Returns:
+        True se havia um socket aberto para fechar
+    """
+    with _active_lock:
+        connection = _active_connections.get(thread_id)
+    sock = getattr(connection, 'sock', None)
+    if sock is None:
+        return False
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    return True
+
+
+class RequestCancelled(requests.RequestException):
+    """Requisição abandonada ou interrompida porque o stop_event foi definido"""
+
+
+class RequestDeadlineExceeded(RequestCancelled):
+    """Requisição abandonada ou interrompida porque o prazo (deadline) terminou"""
+
+
+class RetryingHttpClient:
+    """
+    Sessão HTTP compartilhada entre threads, com pool de conexões keep-alive e
+    novas tentativas com recuo exponencial e jitter. Respeita o cabeçalho
+    Retry-After e registra tentativas e latências. Com um CircuitBreaker, cada
+    tentativa alimenta o disjuntor e, com o circuito aberto, as requisições
+    falham imediatamente com CircuitOpenError. Com um AdaptiveLimiter, cada
+    tentativa ocupa uma vaga e a sua latência e status ajustam o limite de
+    requisições simultâneas. Com um prazo (deadline), o timeout de cada
+    tentativa e as novas tentativas ficam limitados ao tempo restante.
+    """
+
+    def __init__(self, pool_size: int = 10, max_retries: int = 4,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 timeout: float = 120, retry_status_codes=RETRY_STATUS_CODES,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 limiter: Optional[AdaptiveLimiter] = None):
+        self.circuit_breaker = circuit_breaker
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.retry_status_codes = tuple(retry_status_codes)
+
+        self.session = requests.Session()
+        adapter = AbortableHTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._lock = threading.Lock()
+        # Requisições em andamento com stop_event ou prazo: {thread: (stop_event, prazo, abortada)}
+        self._in_flight: Dict[int, Tuple[Optional[threading.Event], Optional[float], bool]] = {}
+        self._monitor: Optional[threading.Thread] = None
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.request_count = 0
+        self.retry_count = 0
+        self.failure_count = 0
+
+    def post_json(self, url: str, payload: Dict, headers: Optional[Dict] = None,
+                  stop_event: Optional[threading.Event] = None,
+                  deadline: Optional[float] = None, units: int = 1) -> requests.Response:
+        """
+        Envia o payload como JSON. O mesmo payload (inclusive o seu 'id') é
+        reenviado em cada tentativa, então a repetição é idempotente.
+
+        Returns:
+            A última resposta recebida, mesmo que com status de erro
+
+        Raises:
+            requests.RequestException: se a última tentativa falhar sem resposta
+        """
+        return self.request('POST', url, stop_event=stop_event, deadline=deadline, units=units,
+                            json=payload, headers=headers)
+
+    def request(self, method: str, url: str, stop_event: Optional[threading.Event] = None,
+                deadline: Optional[float] = None, units: int = 1, **kwargs) -> requests.Response:
+        """
+        Envia uma requisição com as mesmas regras de repetição de post_json. Os
+        argumentos adicionais são repassados à sessão; um corpo em 'data' deve
+        poder ser iterado novamente a cada tentativa. deadline é o instante
+        (time.monotonic) a partir do qual a requisição é abandonada com
+        RequestDeadlineExceeded. units é o trabalho pedido na requisição
+        (páginas), pelo qual o limiter divide a latência observada.
+        """
+        timeout = kwargs.pop('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            self.check_circuit()
+            try:
+                response, error, latency = self._attempt(method, url, stop_event, deadline, units,
+                                                         timeout=self._attempt_timeout(timeout, deadline),
+                                                         **kwargs)
+            except BaseException:
+                # Sem resultado (cancelada ou erro inesperado): com o circuito
+                # meio aberto, a chamada de teste é devolvida ao disjuntor
+                self.release_probe()
+                raise
+            healthy = response is not None and response.status_code not in self.retry_status_codes
+            self.record(latency, healthy)
+
+            if healthy:
+                return response
+
+            if attempt == self.max_retries:
+                self.record_failure()
+                if response is not None:
+                    return response
+                raise error
+
+            delay = self.retry_delay(attempt, response)
+            reason = f"status {response.status_code}" if response is not None else str(error)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                # A próxima tentativa começaria depois do prazo
+                logging.warning(f"Requisição para {url} falhou ({reason}); prazo insuficiente para nova tentativa")
+                self.record_failure()
+                if response is not None:
+                    return response
+                raise error
+
+            logging.warning(f"Requisição para {url} falhou ({reason}); nova tentativa em {delay:.1f}s")
+            self.record_retry()
+
+            if stop_event is not None:
+                if stop_event.wait(delay):
+                    if response is not None:
+                        return response
+                    raise error
+            else:
+                time.sleep(delay)
+            # Libera a conexão de uma resposta lida em modo stream
+            if response is not None:
+                response.close()
+
+    @staticmethod
+    def _attempt_timeout(timeout: float, deadline: Optional[float]) -> float:
+        if deadline is None:
+            return timeout
+        # Mínimo positivo: um timeout zero deixaria o socket em modo não bloqueante
+        return max(0.01, min(timeout, deadline - time.monotonic()))
+
+    def _attempt(self, method: str, url: str, stop_event: Optional[threading.Event],
+                 deadline: Optional[float], units: int,
+                 **kwargs) -> Tuple[Optional[requests.Response], Optional[requests.RequestException], float]:
+        """
+        Executa uma tentativa, ocupando uma vaga do limiter.
+
+        Returns:
+            Tupla (resposta, erro de conexão, latência); um dos dois primeiros é None
+
+        Raises:
+            RequestCancelled: se o stop_event foi definido antes ou durante a tentativa
+            RequestDeadlineExceeded: se o prazo terminou antes ou durante a tentativa
+        """
+        self._check_interrupted(url, stop_event, deadline)
+        if self.limiter is not None and not self.limiter.acquire(stop_event):
+            raise RequestCancelled(f"Requisição para {url} cancelada")
+        started = time.monotonic()
+        response, error = None, None
+        try:
+            self._check_interrupted(url, stop_event, deadline)
+            response = self._send(method, url, stop_event, deadline, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        finally:
+            if self.limiter is not None:
+                self._release_slot(time.monotonic() - started, response, units)
+        if error is not None:
+            # Interrompida pelo cancelamento ou pelo prazo: não conta como falha do serviço
+            try:
+                self._check_interrupted(url, stop_event, deadline)
+            except RequestCancelled as interrupted:
+                raise interrupted from error
+        return response, error, time.monotonic() - started
+
+    @staticmethod
+    def _check_interrupted(url: str, stop_event: Optional[threading.Event],
+                           deadline: Optional[float]) -> None:
+        if stop_event is not None and stop_event.is_set():
+            raise RequestCancelled(f"Requisição para {url} cancelada")
+        if deadline is not None and time.monotonic() >= deadline:
+            raise RequestDeadlineExceeded(f"Prazo da requisição para {url} esgotado")
+
+    def _send(self, method: str, url: str, stop_event: Optional[threading.Event],
+              deadline: Optional[float], **kwargs) -> requests.Response:
+        """
+        Envia uma tentativa; com stop_event ou prazo, o cancelamento ou o fim do
+        prazo fecha a conexão em uso
+        """
+        if stop_event is None and deadline is None:
+            return self.session.request(method, url, **kwargs)
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._in_flight[thread_id] = (stop_event, deadline, False)
+            if self._monitor is None:
+                self._monitor = threading.Thread(target=self._watch_in_flight,
+                                                 name="http-abort-monitor", daemon=True)
+                self._monitor.start()
+        try:
+            return self.session.request(method, url, **kwargs)
+        finally:
+            with self._lock:
+                self._in_flight.pop(thread_id, None)
+            with _active_lock:
+                _active_connections.pop(thread_id, None)
+
+    def _watch_in_flight(self) -> None:
+        """
+        Fecha as conexões das requisições cujo stop_event foi definido ou cujo
+        prazo terminou; termina quando não há requisições em andamento
+        """
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                if not self._in_flight:
+                    self._monitor = None
+                    return
+                interrupted = [thread_id for thread_id, (stop_event, deadline, aborted) in self._in_flight.items()
+                               if not aborted and ((stop_event is not None and stop_event.is_set()) or
+                                                   (deadline is not None and now >= deadline))]
+            for thread_id in interrupted:
+                # Sem socket ainda (conectando), tenta de novo na próxima verificação
+                if abort_thread_request(thread_id):
+                    with self._lock:
+                        if thread_id in self._in_flight:
+                            stop_event, deadline, _ = self._in_flight[thread_id]
+                            self._in_flight[thread_id] = (stop_event, deadline, True)
+            time.sleep(ABORT_POLL_INTERVAL)
+
+    def _release_slot(self, latency: float, response: Optional[requests.Response], units: int) -> None:
+        if response is None:
+            self.limiter.release()
+        elif response.status_code in THROTTLE_STATUS_CODES:
+            self.limiter.release(throttled=True)
+        elif response.status_code < 500:
+            self.limiter.release(latency, units=units)
+        else:
+            self.limiter.release()
+
+    def retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        retry_after = self._parse_retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        # Recuo exponencial com jitter completo
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _parse_retry_after(response: Optional[requests.Response]) -> Optional[float]:
+        if response is None:
+            return None
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def check_circuit(self) -> None:
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.check()
+
+    def release_probe(self) -> None:
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.release_probe()
+
+    def record(self, latency: float, healthy: bool = True) -> None:
+        """Registra uma tentativa; healthy indica se o serviço respondeu normalmente"""
+        with self._lock:
+            self.request_count += 1
+            self._latencies.append(latency)
+        if self.circuit_breaker is not None:
+            if healthy:
+                self.circuit_breaker.record_success(latency)
+            else:
+                self.circuit_breaker.record_failure()
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.retry_count += 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failure_count += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "requests": self.request_count,
+                "retries": self.retry_count,
+                "failures": self.failure_count,
+                "avg_latency": sum(latencies) / len(latencies) if latencies else 0.0,
+                "p95_latency": latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+            }
@@ -0,0 +1,184 @@
+
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+FSYNC_NEVER = "never"
+FSYNC_BATCH = "batch"
+FSYNC_CLOSE = "close"
+FSYNC_POLICIES = (FSYNC_NEVER, FSYNC_BATCH, FSYNC_CLOSE)
+
+DEFAULT_BATCH_SIZE = 64
+# Tempo máximo (s) que uma linha aguarda no buffer antes de ir para o arquivo
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+_CLOSE = object()
+
+
+def truncate_partial_line(path: str) -> int:
+    """
+    Remove do final do arquivo uma linha incompleta (sem '\\n'), deixada por
+    uma execução interrompida. Retorna o número de bytes removidos.
+    """
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+    if size == 0:
+        return 0
+
+    with open(path, 'rb+') as f:
+        end = size
+        block = 64 * 1024
+        while end > 0:
+            start = max(0, end - block)
+            f.seek(start)
+            data = f.read(end - start)
+            if end == size and data.endswith(b'\n'):
+                return 0
+            newline = data.rfind(b'\n')
+            if newline != -1:
+                keep = start + newline + 1
+                break
+            end = start
+        else:
+            keep = 0
+        f.truncate(keep)
+    return size - keep
+
+
+class JsonlWriter:
+    """
+    Grava entradas JSONL a partir de uma única thread. As entradas são
+    serializadas por quem chama write e acumuladas em lotes gravados com uma
+    única chamada, de modo que o arquivo só recebe linhas completas.
+
+    Com ordered=True cada entrada informa o seu número de sequência (a posição
+    do arquivo de entrada no lote) e as linhas são gravadas nessa ordem,
+    independentemente de qual worker termina primeiro: execuções com a mesma
+    entrada geram arquivos idênticos. Sequências sem entrada (falhas) devem
+    ser informadas com entry=None para não reter as seguintes.
+
+    Política de fsync: 'never' (só flush), 'batch' (a cada lote) ou 'close'
+    (uma vez no fechamento).
+    """
+
+    def __init__(self, path: str, ordered: bool = False, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, fsync: str = FSYNC_CLOSE):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Política de fsync inválida: {fsync}")
+        self.path = path
+        self.ordered = ordered
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._pending: Dict[int, Optional[str]] = {}
+        self._next_sequence = 0
+        self._error: Optional[Exception] = None
+        self.lines_written = 0
+        self.batches_written = 0
+
+    def open(self) -> 'JsonlWriter':
+        removed = truncate_partial_line(self.path)
+        if removed:
+            logging.warning(f"Linha incompleta de {removed} bytes removida do final de {self.path}")
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name="jsonl-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def __enter__(self) -> 'JsonlWriter':
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def write(self, entry: Optional[Dict], sequence: Optional[int] = None) -> None:
+        """Enfileira a entrada; no modo ordenado, sequence é obrigatório"""
+        if self.ordered and sequence is None:
+            raise ValueError("JsonlWriter ordenado exige o número de sequência da entrada")
+        line = json.dumps(entry, ensure_ascii=False) + '\n' if entry is not None else None
+        self._queue.put((sequence, line))
+
+    def close(self) -> None:
+        """
+        Grava o que estiver pendente e fecha o arquivo. No modo ordenado,
+        entradas retidas por sequências que nunca chegaram (documentos
+        descartados em um cancelamento) são gravadas na ordem em que estão.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        self._thread = None
+        if self._error is not None:
+            logging.error(f"Erro ao gravar {self.path}: {self._error}")
+
+    def _run(self) -> None:
+        batch: List[str] = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _CLOSE:
+                    if self.ordered:
+                        batch.extend(line for _, line in sorted(self._pending.items()) if line is not None)
+                        self._pending.clear()
+                    self._write_batch(batch)
+                    break
+                if item is not None:
+                    batch.extend(self._release(*item))
+                    if batch and deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+
+                if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    self._write_batch(batch)
+                    batch = []
+                    deadline = None
+        except Exception as e:
+            self._error = e
+        finally:
+            try:
+                self._file.flush()
+                if self.fsync != FSYNC_NEVER:
+                    os.fsync(self._file.fileno())
+            except Exception as e:
+                self._error = self._error or e
+            self._file.close()
+
+    def _release(self, sequence: Optional[int], line: Optional[str]) -> List[str]:
+        """Linhas que podem ser gravadas após a chegada desta entrada"""
+        if not self.ordered:
+            return [line] if line is not None else []
+
+        self._pending[sequence] = line
+        released = []
+        while self._next_sequence in self._pending:
+            line = self._pending.pop(self._next_sequence)
+            if line is not None:
+                released.append(line)
+            self._next_sequence += 1
+        return released
+
+    def _write_batch(self, batch: List[str]) -> None:
+        if not batch:
+            return
+        self._file.write(''.join(batch))
+        self._file.flush()
+        if self.fsync == FSYNC_BATCH:
+            os.fsync(self._file.fileno())
+        self.lines_written += len(batch)
+        self.batches_written += 1
@@ -0,0 +1,146 @@
+
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, Optional
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# Após a limpeza o cache fica com esta fração do tamanho máximo
+EVICTION_TARGET_RATIO = 0.9
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    """Calcula o SHA-256 do arquivo lendo-o em blocos"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    Cache em disco de resultados de OCR endereçado pelo conteúdo.
+
+    Cada entrada é um arquivo de texto cujo nome é o hash da chave. As escritas
+    são atômicas (arquivo temporário + os.replace), então vários workers, em
+    threads ou processos, podem compartilhar o mesmo diretório. O tamanho total
+    é limitado e as entradas menos usadas recentemente (pela data de
+    modificação, renovada a cada acerto) são removidas primeiro.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            # Renova a entrada na ordem de uso (LRU)
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except OSError as e:
+            logging.warning(f"Falha ao ler o cache de OCR ({key}): {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        path = self._entry_path(key)
+        data = text.encode('utf-8')
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError as e:
+            logging.warning(f"Falha ao gravar no cache de OCR ({key}): {e}")
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            needs_eviction = self._size > self.max_bytes
+        if needs_eviction:
+            self.evict()
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._iter_entries())
+
+    def _iter_entries(self):
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.txt'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def evict(self) -> None:
+        """Remove as entradas menos usadas até o cache voltar abaixo do limite"""
+        with self._lock:
+            entries = sorted(self._iter_entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * EVICTION_TARGET_RATIO
+            removed = 0
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    # Já removida por outro worker
+                    pass
+                total -= size
+            self._size = total
+        if removed:
+            logging.info(f"Cache de OCR: {removed} entradas antigas removidas")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,111 @@
+
+
+import io
+import zlib
+from typing import BinaryIO, Iterable, List, NamedTuple
+from PIL import Image
+
+DEFAULT_JPEG_QUALITY = 85
+
+
+class ImagePage(NamedTuple):
+    """Página de um PDF composta por uma única imagem já codificada"""
+    data: bytes
+    width: int
+    height: int
+    dpi: float
+    color_space: str = 'DeviceGray'
+    filter: str = 'DCTDecode'
+    bits_per_component: int = 8
+    decode_parms: str = ''
+
+
+def encode_jpeg_page(image: Image.Image, dpi: float,
+                     quality: int = DEFAULT_JPEG_QUALITY) -> ImagePage:
+    """Codifica a imagem em JPEG (tons de cinza ou RGB) para uso em write_image_pdf"""
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB' if image.mode in ('RGBA', 'P', 'CMYK') else 'L')
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    color_space = 'DeviceGray' if image.mode == 'L' else 'DeviceRGB'
+    return ImagePage(buffer.getvalue(), image.width, image.height, dpi, color_space)
+
+
+def encode_mono_page(image: Image.Image, dpi: float) -> ImagePage:
+    """Codifica a imagem em preto e branco (1 bit por pixel, compressão Flate)"""
+    image = image.convert('1')
+    # No modo '1' do PIL o bit 1 é branco, como em DeviceGray
+    return ImagePage(zlib.compress(image.tobytes(), 9), image.width, image.height, dpi,
+                     filter='FlateDecode', bits_per_component=1)
+
+
+def decode_page(page: ImagePage) -> Image.Image:
+    """Imagem de uma página codificada por encode_jpeg_page ou encode_mono_page"""
+    if page.filter == 'FlateDecode':
+        return Image.frombytes('1', (page.width, page.height), zlib.decompress(page.data))
+    return Image.open(io.BytesIO(page.data))
+
+
+def write_image_pdf(pages: Iterable[ImagePage], output: BinaryIO) -> int:
+    """
+    Grava um PDF com uma imagem por página, escrevendo cada imagem assim que
+    ela é recebida. O conteúdo já codificado (JPEG, Flate) é copiado sem
+    nova compressão.
+
+    Returns:
+        Número de páginas gravadas
+    """
+    offsets: List[int] = []
+    position = 0
+
+    def write(data: bytes) -> None:
+        nonlocal position
+        output.write(data)
+        position += len(data)
+
+    def write_object(number: int, body: bytes, stream: bytes = None) -> None:
+        while len(offsets) < number:
+            offsets.append(0)
+        offsets[number - 1] = position
+        write(f"{number} 0 obj\n".encode('latin-1') + body)
+        if stream is not None:
+            write(b"\nstream\n" + stream + b"\nendstream")
+        write(b"\nendobj\n")
+
+    write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    kids = []
+    next_number = 3
+    for page in pages:
+        image_number, content_number, page_number = next_number, next_number + 1, next_number + 2
+        next_number += 3
+
+        decode_parms = f" /DecodeParms {page.decode_parms}" if page.decode_parms else ""
+        write_object(image_number, (
+            f"<< /Type /XObject /Subtype /Image /Width {page.width} /Height {page.height} "
+            f"/ColorSpace /{page.color_space} /BitsPerComponent {page.bits_per_component} "
+            f"/Filter /{page.filter}{decode_parms} /Length {len(page.data)} >>"
+        ).encode('latin-1'), page.data)
+
+        # Dimensões da página em pontos (1/72 de polegada)
+        width = page.width * 72.0 / page.dpi
+        height = page.height * 72.0 / page.dpi
+        content = f"q {width:.2f} 0 0 {height:.2f} 0 0 cm /Im0 Do Q".encode('latin-1')
+        write_object(content_number, f"<< /Length {len(content)} >>".encode('latin-1'), content)
+        write_object(page_number, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_number} 0 R >> >> "
+            f"/Contents {content_number} 0 R >>"
+        ).encode('latin-1'))
+        kids.append(f"{page_number} 0 R")
+
+    write_object(2, f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode('latin-1'))
+
+    xref = position
+    write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode('latin-1'))
+    for offset in offsets:
+        write(f"{offset:010d} 00000 n \n".encode('latin-1'))
+    write((f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\n"
+           f"startxref\n{xref}\n%%EOF\n").encode('latin-1'))
+    return len(kids)
@@ -0,0 +1,212 @@
+
+
+import base64
+import codecs
+import json
+import os
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Múltiplo de 3 para que cada bloco codificado em base64 não tenha preenchimento
+BASE64_READ_SIZE = 3 * 64 * 1024
+FILE_READ_SIZE = 256 * 1024
+DOCUMENT_PLACEHOLDER = "\0document\0"
+
+
+class Base64JsonBody:
+    """
+    Corpo de requisição JSON em que um campo contém o arquivo em base64. O JSON
+    é gerado em blocos durante o envio, lendo o arquivo aos poucos, então nem o
+    arquivo nem a sua versão em base64 ficam inteiros na memória.
+
+    O objeto pode ser iterado várias vezes (uma por tentativa) e informa o seu
+    tamanho, o que permite ao requests enviar Content-Length em vez de chunked.
+    """
+
+    def __init__(self, payload: Dict, field_path: List[str], file_path: str):
+        """
+        Args:
+            payload: Payload da requisição sem o conteúdo do arquivo
+            field_path: Caminho das chaves do campo que recebe o base64,
+                por exemplo ["document", "document_base64"]
+            file_path: Arquivo a codificar
+        """
+        self.file_path = file_path
+        template = json.loads(json.dumps(payload))
+        target = template
+        for key in field_path[:-1]:
+            target = target.setdefault(key, {})
+        target[field_path[-1]] = DOCUMENT_PLACEHOLDER
+
+        encoded_placeholder = json.dumps(DOCUMENT_PLACEHOLDER)
+        prefix, suffix = json.dumps(template).split(encoded_placeholder, 1)
+        self._prefix = (prefix + '"').encode('utf-8')
+        self._suffix = ('"' + suffix).encode('utf-8')
+
+    def __len__(self) -> int:
+        file_size = os.path.getsize(self.file_path)
+        return len(self._prefix) + 4 * ((file_size + 2) // 3) + len(self._suffix)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._prefix
+        with open(self.file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(BASE64_READ_SIZE), b''):
+                yield base64.b64encode(chunk)
+        yield self._suffix
+
+
+class MultipartFileBody:
+    """
+    Corpo multipart/form-data com campos simples e um arquivo lido em blocos
+    durante o envio. Assim como Base64JsonBody, pode ser reenviado e informa o
+    seu tamanho.
+    """
+
+    def __init__(self, fields: Dict[str, str], file_field: str, file_path: str,
+                 content_type: str = 'application/octet-stream'):
+        self.file_path = file_path
+        self.boundary = uuid.uuid4().hex
+        head = b''
+        for name, value in fields.items():
+            head += (f'--{self.boundary}\r\n'
+                     f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                     f'{value}\r\n').encode('utf-8')
+        file_name = os.path.basename(file_path).replace('"', '_')
+        head += (f'--{self.boundary}\r\n'
+                 f'Content-Disposition: form-data; name="{file_field}"; filename="{file_name}"\r\n'
+                 f'Content-Type: {content_type}\r\n\r\n').encode('utf-8')
+        self._head = head
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self) -> int:
+        return len(self._head) + os.path.getsize(self.file_path) + len(self._tail)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._head
+        with open(self.file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(FILE_READ_SIZE), b''):
+                yield chunk
+        yield self._tail
+
+
+class JsonArrayStreamParser:
+    """
+    Extrai incrementalmente os itens de um array de um objeto JSON recebido em
+    blocos, por exemplo {"pages": [{...}, {...}], "model": "..."}. Cada item é
+    devolvido assim que termina de chegar, sem manter a resposta inteira.
+
+    Apenas a chave do objeto de nível superior é considerada; o restante do
+    documento depois do array é ignorado.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._position = 0
+        # Estado da varredura até encontrar o array
+        self._in_array = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+
+    def feed(self, data: bytes) -> List[Any]:
+        """Acrescenta um bloco da resposta e retorna os itens completos recebidos"""
+        if self._finished:
+            return []
+        self._buffer += self._decoder.decode(data)
+        items = []
+        if not self._in_array:
+            self._scan_for_array()
+        if self._in_array:
+            items = self._decode_items()
+        # Descarta o que já foi consumido, preservando uma chave ainda incompleta
+        consumed = self._position
+        if self._in_string and not self._in_array:
+            consumed = min(consumed, self._string_start)
+        self._buffer = self._buffer[consumed:]
+        self._string_start -= consumed
+        self._position -= consumed
+        return items
+
+    def close(self) -> None:
+        """Confirma que o array foi recebido por completo"""
+        if not self._finished:
+            raise ValueError(f"Resposta JSON incompleta: array '{self.key}' não terminou")
+
+    def _scan_for_array(self) -> None:
+        buffer = self._buffer
+        position = self._position
+        while position < len(buffer):
+            char = buffer[position]
+            position += 1
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = buffer[self._string_start:position - 1]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = position
+            elif char == ':' and self._depth == 1:
+                self._current_key, self._last_string = self._last_string, None
+            elif char in '{[':
+                if char == '[' and self._depth == 1 and self._current_key == self.key:
+                    self._in_array = True
+                    break
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    # Objeto terminou sem a chave procurada
+                    self._finished = True
+                    break
+            elif char == ',' and self._depth == 1:
+                self._current_key = None
+        self._position = position
+
+    def _decode_items(self) -> List[Any]:
+        items = []
+        buffer = self._buffer
+        position = self._position
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position >= len(buffer):
+                break
+            if buffer[position] == ']':
+                self._finished = True
+                position += 1
+                break
+            try:
+                item, end = self._json.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Item ainda incompleto: aguarda o próximo bloco
+                break
+            items.append(item)
+            position = end
+        self._position = position
+        return items
+
+
+def iter_json_array(chunks: Iterable[bytes], key: str) -> Iterator[Any]:
+    """Gera os itens do array 'key' à medida que os blocos da resposta chegam"""
+    parser = JsonArrayStreamParser(key)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    parser.close()
@@ -0,0 +1,47 @@
+
+def make_pdf(path: str, pages, scanned: bool = False) -> None:
+    """
+    Grava um PDF mínimo. Cada item de pages é o texto da página (linhas
+    separadas por '\n') ou None para uma página sem fontes (equivalente a
+    uma página digitalizada). Com scanned, cada página tem ainda uma imagem
+    que a cobre inteira, sob o texto.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+               "<< /Type /XObject /Subtype /Image /Width 1 /Height 1 /ColorSpace /DeviceGray "
+               "/BitsPerComponent 8 /Length 1 >>\nstream\n\x80\nendstream"]
+    kids = []
+    for text in pages:
+        if text is None:
+            content = "0 0 m 10 10 l S"
+            fonts = ""
+        else:
+            lines = ") Tj T* (".join(text.split('\n'))
+            content = f"BT /F1 12 Tf 14 TL 72 720 Td ({lines}) Tj ET"
+            fonts = "/Font << /F1 3 0 R >>"
+        if scanned:
+            content = f"q 612 0 0 792 0 0 cm /Im1 Do Q {content}"
+            resources = f"<< {fonts} /XObject << /Im1 4 0 R >> >>"
+        else:
+            resources = f"<< {fonts} >>"
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        content_ref = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources {resources} /Contents {content_ref} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    for offset in offsets:
+        data += f"{offset:010d} 00000 n \n".encode('latin-1')
+    data += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+             f"startxref\n{xref}\n%%EOF\n").encode('latin-1')
+
+    with open(path, 'wb') as f:
+        f.write(data)
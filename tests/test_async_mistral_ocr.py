@@ -0,0 +1,219 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+from pdf_fixtures import make_pdf
+from src.ocr.async_mistral_ocr import AsyncMistralOCR, TokenBucket, _RequestLimiter, _aiter_in_thread
+from src.utils.circuit_breaker import HALF_OPEN, OPEN, CircuitBreaker
+
+
+class SlowOCRHandler(BaseHTTPRequestHandler):
+    """Simula a API: demora um pouco e registra o pico de requisições simultâneas"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        time.sleep(getattr(server, 'delay', 0.05))
+        with server.lock:
+            server.active -= 1
+            server.requests += 1
+            status = server.statuses.pop(0) if server.statuses else 200
+        if status != 200:
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if getattr(server, 'malformed', False):
+            data = b'{"pages": [{"index": 0, "markdown": "corta'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        name = os.path.basename(body["document"]["document_name"])
+        data = json.dumps({"pages": [{"index": 0, "markdown": f"Texto reconhecido do documento {name} " * 3}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAsyncMistralOCR(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), SlowOCRHandler)
+        self.server.lock = threading.Lock()
+        self.server.active = 0
+        self.server.peak = 0
+        self.server.requests = 0
+        # Status das próximas respostas (depois, 200)
+        self.server.statuses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/ocr"
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def _make_documents(self, count):
+        paths = []
+        for number in range(count):
+            path = os.path.join(self.temp_dir.name, f"doc{number}.pdf")
+            make_pdf(path, [None])
+            paths.append(path)
+        return paths
+
+    def test_extract_many_limits_requests_in_flight(self):
+        paths = self._make_documents(12)
+        ocr = AsyncMistralOCR(api_key="test_key", api_url=self.url, max_in_flight=3)
+
+        async def collect():
+            return [result async for result in ocr.extract_many(paths)]
+
+        results = dict(asyncio.run(collect()))
+        self.assertEqual(set(results), set(paths))
+        for path, text in results.items():
+            self.assertIn(os.path.basename(path), text)
+        self.assertLessEqual(self.server.peak, 3)
+        self.assertGreater(self.server.peak, 1)
+        self.assertEqual(ocr.http_stats()["requests"], 12)
+
+    def test_streamed_upload(self):
+        paths = self._make_documents(2)
+        ocr = AsyncMistralOCR(api_key="test_key", api_url=self.url, max_in_flight=2)
+        ocr.stream_threshold = 0
+        for path in paths:
+            self.assertIn(os.path.basename(path), asyncio.run(ocr.extract_text_async(path)))
+
+    def test_every_attempt_takes_rate_tokens(self):
+        self.server.statuses = [429]
+        ocr = AsyncMistralOCR(api_key="test_key", api_url=self.url)
+        ocr.http.backoff_base = 0.01
+
+        async def post():
+            limiter = _RequestLimiter(4, requests_per_minute=600, pages_per_minute=600)
+            for bucket in (limiter.request_bucket, limiter.page_bucket):
+                bucket.acquire = mock.AsyncMock(wraps=bucket.acquire)
+            async with httpx.AsyncClient() as client:
+                recognized = await ocr._post_async(client, None, limiter=limiter, page_total=3,
+                                                   json={"id": "abc", "document": {"document_name": "a"}})
+            return recognized, limiter
+
+        recognized, limiter = asyncio.run(post())
+        self.assertIn(1, recognized)
+        self.assertEqual(self.server.requests, 2)
+        # A repetição após o 429 também consome fichas de requisição e de páginas
+        self.assertEqual(limiter.request_bucket.acquire.await_count, 2)
+        self.assertEqual([c.args for c in limiter.page_bucket.acquire.await_args_list], [(3,), (3,)])
+
+    def test_chunk_rejected_with_client_error_is_not_resent(self):
+        path = os.path.join(self.temp_dir.name, "longo.pdf")
+        make_pdf(path, [None] * 2)
+        self.server.statuses = [400] * 10
+        ocr = AsyncMistralOCR(api_key="test_key", api_url=self.url)
+        ocr.max_pages_per_request = 1
+
+        self.assertEqual(asyncio.run(ocr.extract_text_async(path)), "")
+        self.assertEqual(self.server.requests, 2)
+
+    def test_stop_event_cancels_documents_in_flight(self):
+        self.server.delay = 5
+        paths = self._make_documents(4)
+        ocr = AsyncMistralOCR(api_key="test_key", api_url=self.url, max_in_flight=2)
+        threading.Timer(0.3, ocr.stop_event.set).start()
+        started = time.monotonic()
+
+        async def collect():
+            return [result async for result in ocr.extract_many(paths)]
+
+        self.assertEqual(asyncio.run(collect()), [])
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_body_iterator_closed_when_upload_is_interrupted(self):
+        closed = []
+
+        def body():
+            try:
+                while True:
+                    yield b"bloco"
+            finally:
+                closed.append(True)
+
+        async def read_one():
+            chunks = _aiter_in_thread(body())
+            self.assertEqual(await chunks.__anext__(), b"bloco")
+            await chunks.aclose()
+
+        asyncio.run(read_one())
+        self.assertEqual(closed, [True])
+
+    def _half_open_ocr(self):
+        breaker = CircuitBreaker("API Mistral", failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        ocr = AsyncMistralOCR(api_key="test_key", api_url=self.url)
+        ocr.circuit_breaker = ocr.http.circuit_breaker = breaker
+        ocr.http.max_retries = 0
+        return ocr, breaker
+
+    def test_malformed_response_counts_as_probe_failure(self):
+        self.server.malformed = True
+        ocr, breaker = self._half_open_ocr()
+
+        async def post():
+            async with httpx.AsyncClient() as client:
+                return await ocr._post_async(client, None, json={"id": "abc", "document": {"document_name": "a"}})
+
+        with self.assertRaises(ValueError):
+            asyncio.run(post())
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.stats()["opened"], 2)
+
+    def test_cancelled_probe_is_released(self):
+        self.server.delay = 2
+        ocr, breaker = self._half_open_ocr()
+
+        async def post_and_cancel():
+            async with httpx.AsyncClient() as client:
+                task = asyncio.ensure_future(
+                    ocr._post_async(client, None, json={"id": "abc", "document": {"document_name": "a"}}))
+                await asyncio.sleep(0.3)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(post_and_cancel())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_waits_when_budget_is_exhausted(self):
+        async def consume():
+            bucket = TokenBucket(rate_per_minute=600, capacity=2)
+            started = time.monotonic()
+            for _ in range(4):
+                await bucket.acquire()
+            return time.monotonic() - started
+
+        # Duas fichas imediatas e duas a 10 por segundo
+        self.assertGreaterEqual(asyncio.run(consume()), 0.18)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import time
+import unittest
+from pdf_fixtures import make_pdf
+from src.core.base_ocr import BaseOCRProcessor, PRESCAN_SAMPLE_PAGES
+from src.utils.ocr_cache import OCRCache
+
+
+class RecordingOCR(BaseOCRProcessor):
+    """Registra as páginas enviadas ao OCR e devolve um texto fixo"""
+
+    def __init__(self):
+        super().__init__()
+        self.requested_pages = []
+
+    def _ocr_pages(self, pdf_path, pages, lang):
+        self.requested_pages.append(pages)
+        return {page: f"Texto reconhecido da pagina {page}\n\n" for page in pages}
+
+
+class TestBaseOCRProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.pdf_path = os.path.join(self.temp_dir.name, "misto.pdf")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_prescan_classifies_pages(self):
+        make_pdf(self.pdf_path, ["Peticao inicial com camada de texto digital", None,
+                                 "Segunda pagina digital com bastante texto", None])
+        text_pages, image_pages = BaseOCRProcessor().prescan_pages(self.pdf_path)
+        self.assertEqual(sorted(text_pages), [1, 3])
+        self.assertIn("Peticao inicial", text_pages[1])
+        self.assertEqual(image_pages, [2, 4])
+
+    def test_prescan_sends_stamped_scans_to_ocr(self):
+        stamp = "Documento assinado digitalmente por FULANO DE TAL - Protocolo 0001234-56.2024.8.26.0100"
+        # Camada de um PDF pesquisável: cerca de 1.500 caracteres
+        searchable = "\n".join(f"Linha {line} do texto reconhecido da pagina inteira digitalizada"
+                               for line in range(1, 31))
+        make_pdf(self.pdf_path, [stamp, searchable], scanned=True)
+        text_pages, image_pages = BaseOCRProcessor().prescan_pages(self.pdf_path)
+        self.assertEqual(image_pages, [1])
+        self.assertEqual(sorted(text_pages), [2])
+        self.assertIn("Linha 30", text_pages[2])
+
+    def test_prescan_stops_early_for_scanned_documents(self):
+        make_pdf(self.pdf_path, [None] * PRESCAN_SAMPLE_PAGES + ["Texto digital que nao sera analisado"])
+        text_pages, image_pages = BaseOCRProcessor().prescan_pages(self.pdf_path)
+        self.assertEqual(text_pages, {})
+        self.assertEqual(image_pages, list(range(1, PRESCAN_SAMPLE_PAGES + 2)))
+
+    def test_extract_text_routes_only_image_pages_to_ocr(self):
+        make_pdf(self.pdf_path, ["Peticao inicial com camada de texto digital", None])
+        ocr = RecordingOCR()
+        text = ocr.extract_text(self.pdf_path)
+        self.assertEqual(ocr.requested_pages, [[2]])
+        self.assertLess(text.index("Peticao inicial"), text.index("pagina 2"))
+
+    def test_cache_skips_document_and_unchanged_pages(self):
+        ocr = RecordingOCR()
+        ocr.cache = OCRCache(os.path.join(self.temp_dir.name, "cache"))
+        make_pdf(self.pdf_path, ["Peticao inicial com camada de texto digital", None, None])
+        first = ocr.extract_text(self.pdf_path)
+        self.assertEqual(ocr.extract_text(self.pdf_path), first)
+        self.assertEqual(ocr.requested_pages, [[2, 3]])
+
+        # Revisão: a página 3 muda e só ela volta ao OCR
+        make_pdf(self.pdf_path, ["Peticao inicial com camada de texto digital", None, "Nova pagina digital revisada"])
+        ocr.prescan_text_layer = False
+        ocr.extract_text(self.pdf_path)
+        self.assertEqual(ocr.requested_pages, [[2, 3], [1, 3]])
+
+    def test_prepare_runs_no_ocr(self):
+        make_pdf(self.pdf_path, ["Peticao inicial com camada de texto digital", None])
+        ocr = RecordingOCR()
+        prepared = ocr.prepare(self.pdf_path)
+        self.assertEqual(ocr.requested_pages, [])
+        self.assertEqual((sorted(prepared.text_pages), prepared.image_pages), ([1], [2]))
+
+        self.assertIn("pagina 2", ocr.recognize(prepared))
+        self.assertEqual(ocr.requested_pages, [[2]])
+
+    def test_document_deadline_fails_document(self):
+        make_pdf(self.pdf_path, [None, None])
+        ocr = RecordingOCR()
+        ocr.document_timeout = 0.2
+        original = ocr._ocr_pages
+
+        def slow_pages(pdf_path, pages, lang):
+            self.assertTrue(0 < ocr.time_remaining() <= 0.2)
+            time.sleep(0.3)
+            self.assertTrue(ocr.cancelled())
+            return original(pdf_path, pages, lang)
+
+        ocr._ocr_pages = slow_pages
+        self.assertEqual(ocr.extract_text(self.pdf_path), "")
+        self.assertIsNone(ocr.time_remaining())
+        self.assertFalse(ocr.cancelled())
+
+if __name__ == '__main__':
+    unittest.main()
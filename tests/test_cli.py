@@ -0,0 +1,99 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from src import cli
+from src.ocr import tesserocr_ocr
+from src.ocr.hybrid_ocr import HybridOCR
+from src.ocr.image_preprocessor import PREPROCESSING_PRESETS
+from test_pipeline import FakeOCR
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.tmp.name, "entrada")
+        self.output_dir = os.path.join(self.tmp.name, "saida")
+        os.makedirs(self.input_dir)
+        for name in ("a.pdf", "b.pdf"):
+            with open(os.path.join(self.input_dir, name), 'wb') as f:
+                f.write(b"conteudo")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_formats(self):
+        self.assertEqual(cli.parse_formats("docx, MD"), ('docx', 'md'))
+        with self.assertRaises(ValueError):
+            cli.parse_formats("docx,pdf")
+
+    def test_mistral_engine_requires_api_key(self):
+        with mock.patch.dict(os.environ, {cli.API_KEY_ENV: ""}), \
+                mock.patch('sys.stderr', io.StringIO()), self.assertRaises(SystemExit):
+            cli.main([self.input_dir, self.output_dir, "--engine", "mistral"])
+
+    @unittest.skipIf(tesserocr_ocr.TESSEROCR_AVAILABLE, "tesserocr instalado")
+    def test_tesserocr_engine_requires_binding(self):
+        with mock.patch('sys.stderr', io.StringIO()), self.assertRaises(SystemExit):
+            cli.main([self.input_dir, self.output_dir, "--engine", "tesserocr"])
+
+    @unittest.skipIf(not tesserocr_ocr.TESSEROCR_AVAILABLE, "tesserocr não instalado")
+    def test_tesserocr_engine_receives_tesseract_options(self):
+        args = cli.build_parser().parse_args([self.input_dir, self.output_dir, "--engine", "tesserocr",
+                                              "--max-tasks-per-child", "5", "--page-timeout", "20"])
+        engine, tesseract = cli.build_engines(args)
+
+        self.assertIsInstance(engine, tesserocr_ocr.TesserocrOCR)
+        self.assertIs(engine, tesseract)
+        self.assertEqual((engine.max_tasks_per_child, engine.page_timeout), (5, 20))
+
+    def test_preprocessing_flags_reach_tesseract(self):
+        args = cli.build_parser().parse_args([self.input_dir, self.output_dir,
+                                              "--preprocess", "adaptive"])
+        _, tesseract = cli.build_engines(args)
+        self.assertEqual(tesseract.preprocessing, PREPROCESSING_PRESETS['adaptive'])
+
+        args = cli.build_parser().parse_args([self.input_dir, self.output_dir, "--no-deskew"])
+        _, tesseract = cli.build_engines(args)
+        self.assertFalse(tesseract.preprocessing.deskew)
+        self.assertTrue(tesseract.preprocessing.crop_margins)
+
+    def test_fallback_follows_mistral_cancellation(self):
+        args = cli.build_parser().parse_args([self.input_dir, self.output_dir, "--engine", "mistral",
+                                              "--api-key", "chave", "--fallback"])
+        engine, tesseract = cli.build_engines(args)
+
+        self.assertIs(engine.fallback_ocr, tesseract)
+        self.assertIs(tesseract.stop_event, engine.stop_event)
+
+    def test_build_engines_shares_cache_with_hybrid_engines(self):
+        args = cli.build_parser().parse_args([self.input_dir, self.output_dir, "--engine", "hybrid",
+                                              "--api-key", "chave"])
+        engine, tesseract = cli.build_engines(args)
+
+        self.assertIsInstance(engine, HybridOCR)
+        self.assertIs(engine.tesseract, tesseract)
+        self.assertIs(engine.mistral.cache, engine.cache)
+        self.assertIs(tesseract.cache, engine.cache)
+
+    def test_main_prints_json_progress_and_summary(self):
+        stdout = io.StringIO()
+        engine = FakeOCR(failing={"b.pdf"})
+        with mock.patch.object(cli, 'build_engines', return_value=(engine, mock.Mock())):
+            code = cli.main([self.input_dir, self.output_dir, "--formats", "json", "--workers", "2"],
+                            stdout=stdout)
+
+        events = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(code, 1)
+        self.assertEqual([event['event'] for event in events], ["file", "file", "summary"])
+        self.assertEqual({os.path.basename(e['path']): e['status'] for e in events[:2]},
+                         {"a.pdf": "ok", "b.pdf": "failed"})
+        self.assertEqual((events[-1]['succeeded'], events[-1]['failed']), (1, 1))
+        self.assertIn('files_per_minute', events[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
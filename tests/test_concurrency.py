@@ -0,0 +1,109 @@
+import os
+import threading
+import unittest
+from unittest import mock
+from src.utils.concurrency import OMP_THREAD_LIMIT_ENV, AdaptiveLimiter, omp_environment, pin_omp_threads
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = AdaptiveLimiter(initial=4, max_limit=16, clock=self.clock)
+
+    def complete(self, count, latency=1.0):
+        for _ in range(count):
+            self.assertTrue(self.limiter.acquire())
+            self.limiter.release(latency)
+
+    def test_additive_increase_up_to_max(self):
+        # Cerca de uma vaga a mais por rodada de 'limite' respostas normais
+        self.complete(24)
+        self.assertEqual(self.limiter.limit, 8)
+        self.complete(500)
+        self.assertEqual(self.limiter.limit, 16)
+
+    def test_throttling_halves_once_per_latency_window(self):
+        self.complete(30)
+        before = self.limiter.limit
+        for _ in range(3):
+            self.limiter.acquire()
+        for _ in range(3):
+            self.limiter.release(throttled=True)
+        self.assertEqual(self.limiter.limit, before // 2)
+
+        self.clock.now += 2
+        self.limiter.acquire()
+        self.limiter.release(throttled=True)
+        self.assertEqual(self.limiter.limit, before // 4)
+        self.assertEqual(self.limiter.stats()["throttled"], 4)
+
+    def test_rising_latency_reduces_limit(self):
+        self.complete(20, latency=1.0)
+        before = self.limiter.limit
+        self.complete(10, latency=5.0)
+        self.assertLess(self.limiter.limit, before)
+
+    def test_latency_is_compared_per_unit(self):
+        self.complete(20, latency=1.0)
+        before = self.limiter.limit
+        # Requisições com cinco vezes mais páginas não indicam sobrecarga
+        for _ in range(10):
+            self.limiter.acquire()
+            self.limiter.release(5.0, units=5)
+        self.assertGreater(self.limiter.limit, before)
+
+    def test_limit_never_below_minimum(self):
+        for _ in range(10):
+            self.clock.now += 10
+            self.limiter.acquire()
+            self.limiter.release(throttled=True)
+        self.assertEqual(self.limiter.limit, 1)
+
+    def test_acquire_waits_for_slot_and_honors_stop(self):
+        limiter = AdaptiveLimiter(initial=1, max_limit=1)
+        stop_event = threading.Event()
+        self.assertTrue(limiter.acquire(stop_event))
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(limiter.acquire(stop_event)))
+        waiter.start()
+        waiter.join(timeout=0.3)
+        self.assertEqual(acquired, [])
+        stop_event.set()
+        waiter.join(timeout=2)
+        self.assertEqual(acquired, [False])
+        self.assertEqual(limiter.stats()["in_flight"], 1)
+
+
+class TestPinOmpThreads(unittest.TestCase):
+
+    def test_environment_copy_sets_limit_and_keeps_user_value(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(omp_environment(1)[OMP_THREAD_LIMIT_ENV], "1")
+            self.assertNotIn(OMP_THREAD_LIMIT_ENV, os.environ)
+        self.assertEqual(omp_environment(1, {OMP_THREAD_LIMIT_ENV: "4"}), {OMP_THREAD_LIMIT_ENV: "4"})
+        self.assertEqual(omp_environment(None, {"PATH": "/bin"}), {"PATH": "/bin"})
+
+    def test_sets_limit_and_keeps_user_value(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            pin_omp_threads(1)
+            self.assertEqual(os.environ[OMP_THREAD_LIMIT_ENV], "1")
+        with mock.patch.dict(os.environ, {OMP_THREAD_LIMIT_ENV: "4"}):
+            pin_omp_threads(1)
+            self.assertEqual(os.environ[OMP_THREAD_LIMIT_ENV], "4")
+        with mock.patch.dict(os.environ, {}, clear=True):
+            pin_omp_threads(None)
+            self.assertNotIn(OMP_THREAD_LIMIT_ENV, os.environ)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from xml.etree.ElementTree import ParseError
+from src.ocr.hocr_parser import HocrWord, format_paragraphs, page_confidence, parse_hocr
+from src.ocr.tesseract_ocr import TesseractOCR
+
+SAMPLE_HOCR = b"""<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"
+    "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">
+ <body>
+  <div class='ocr_page' id='page_1' title='bbox 0 0 100 100'>
+   <div class='ocr_carea' id='block_1_1'>
+    <p class='ocr_par' id='par_1_1' lang='por'>
+     <span class='ocr_line' id='line_1_1'>
+      <span class='ocrx_word' id='word_1_1' title='bbox 1 1 5 5; x_wconf 91'>Art.</span>
+      <span class='ocrx_word bold' id='word_1_2' title='bbox 6 1 9 5; x_wconf 88'><strong>5&#186;</strong></span>
+     </span>
+     <span class='ocr_line' id='line_1_2'>
+      <span class='ocrx_word' id='word_1_3' title='bbox 1 6 5 9; x_wconf 42'>Lei &amp; ordem</span>
+     </span>
+    </p>
+    <p class='ocr_par' id='par_1_2'>
+     <span class='ocr_caption' id='line_1_3'>
+      <span class='ocrx_word' id='word_1_4' title='bbox 1 1 5 5; x_wconf 90'>ignorada</span>
+     </span>
+     <span class='ocr_line' id='line_1_4'>
+      <span class='ocrx_word' id='word_1_5' title='bbox 1 1 5 5'>Fim</span>
+     </span>
+    </p>
+   </div>
+  </div>
+ </body>
+</html>
+"""
+
+
+class TestHocrParser(unittest.TestCase):
+
+    def test_parse_hocr_keeps_structure_and_confidence(self):
+        paragraphs = parse_hocr(SAMPLE_HOCR)
+        self.assertEqual(len(paragraphs), 2)
+        self.assertEqual(paragraphs[0][0], [HocrWord("Art.", False, 91), HocrWord("5º", True, 88)])
+        self.assertEqual(paragraphs[0][1], [HocrWord("Lei & ordem", False, 42)])
+        self.assertEqual(paragraphs[1], [[HocrWord("Fim", False, None)]])
+
+    def test_matches_beautifulsoup_output(self):
+        self.assertEqual(format_paragraphs(parse_hocr(SAMPLE_HOCR)),
+                         TesseractOCR._parse_hocr_with_soup(SAMPLE_HOCR))
+
+    def test_malformed_hocr_raises(self):
+        with self.assertRaises(ParseError):
+            parse_hocr(b"<html><p class='ocr_par'><span class='ocr_line'></p></html>")
+
+    def test_page_confidence_weighted_by_length(self):
+        paragraphs = parse_hocr(SAMPLE_HOCR)
+        # Art. (4 x 91), 5º (2 x 88), Lei & ordem (11 x 42); Fim não tem x_wconf
+        self.assertAlmostEqual(page_confidence(paragraphs), (4 * 91 + 2 * 88 + 11 * 42) / 17)
+        self.assertIsNone(page_confidence([]))
+
+if __name__ == '__main__':
+    unittest.main()
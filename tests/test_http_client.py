@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+import unittest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.utils.circuit_breaker import CLOSED, HALF_OPEN, CircuitBreaker
+from src.utils.concurrency import AdaptiveLimiter
+from src.utils.http_client import RequestCancelled, RequestDeadlineExceeded, RetryingHttpClient
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Responde 429 nas primeiras requisições e 200 nas seguintes"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.received_ids.append(body["id"])
+        time.sleep(getattr(self.server, 'delay', 0))
+        if len(self.server.received_ids) <= self.server.failures:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        data = json.dumps({"pages": []}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRetryingHttpClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+        self.server.received_ids = []
+        self.server.failures = 2
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/ocr"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_with_same_request_id(self):
+        client = RetryingHttpClient(max_retries=3, backoff_base=0.01)
+        response = client.post_json(self.url, {"id": "abc"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.received_ids, ["abc"] * 3)
+        stats = client.stats()
+        self.assertEqual((stats["requests"], stats["retries"], stats["failures"]), (3, 2, 0))
+
+    def test_returns_last_response_when_retries_exhausted(self):
+        client = RetryingHttpClient(max_retries=1, backoff_base=0.01)
+        response = client.post_json(self.url, {"id": "abc"})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(client.stats()["failures"], 1)
+
+    def test_throttled_responses_reduce_concurrency(self):
+        limiter = AdaptiveLimiter(initial=8, max_limit=8)
+        client = RetryingHttpClient(max_retries=3, backoff_base=0.01, limiter=limiter)
+        client.post_json(self.url, {"id": "abc"})
+        stats = limiter.stats()
+        # Cada nova tentativa é uma rodada distinta: as duas recusas reduzem o limite
+        self.assertEqual((stats["throttled"], stats["decreases"], stats["in_flight"]), (2, 2, 0))
+        self.assertEqual(stats["limit"], 2)
+
+    def test_cancelled_while_waiting_for_slot(self):
+        limiter = AdaptiveLimiter(initial=1, max_limit=1)
+        limiter.acquire()
+        stop_event = threading.Event()
+        stop_event.set()
+        client = RetryingHttpClient(limiter=limiter)
+        with self.assertRaises(RequestCancelled):
+            client.post_json(self.url, {"id": "abc"}, stop_event=stop_event)
+        self.assertEqual(self.server.received_ids, [])
+
+    def test_cancel_aborts_request_in_flight(self):
+        self.server.failures = 0
+        self.server.delay = 10
+        stop_event = threading.Event()
+        threading.Timer(0.3, stop_event.set).start()
+        client = RetryingHttpClient(circuit_breaker=CircuitBreaker(failure_threshold=1))
+        started = time.monotonic()
+
+        with self.assertRaises(RequestCancelled):
+            client.post_json(self.url, {"id": "abc"}, stop_event=stop_event)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(client.circuit_breaker.state, CLOSED)
+
+    def test_deadline_caps_request_in_flight(self):
+        self.server.failures = 0
+        self.server.delay = 10
+        client = RetryingHttpClient(circuit_breaker=CircuitBreaker(failure_threshold=1))
+        started = time.monotonic()
+
+        with self.assertRaises(RequestDeadlineExceeded):
+            client.post_json(self.url, {"id": "abc"}, deadline=started + 0.3)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(client.circuit_breaker.state, CLOSED)
+
+    def test_no_retry_past_deadline(self):
+        self.server.failures = 5
+        client = RetryingHttpClient(max_retries=3, backoff_base=10)
+        client.retry_delay = lambda attempt, response: 5
+        started = time.monotonic()
+        response = client.post_json(self.url, {"id": "abc"}, deadline=started + 1)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.server.received_ids, ["abc"])
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_cancel_during_half_open_probe_releases_it(self):
+        self.server.failures = 0
+        self.server.delay = 10
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        stop_event = threading.Event()
+        threading.Timer(0.3, stop_event.set).start()
+        client = RetryingHttpClient(circuit_breaker=breaker)
+
+        with self.assertRaises(RequestCancelled):
+            client.post_json(self.url, {"id": "abc"}, stop_event=stop_event)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        # A chamada de teste foi devolvida: a próxima requisição pode sondar o serviço
+        self.assertTrue(breaker.allow_request())
+
+    def test_unexpected_error_during_probe_releases_it(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        client = RetryingHttpClient(circuit_breaker=breaker)
+        with self.assertRaises(requests.exceptions.InvalidURL):
+            client.post_json("http://", {"id": "abc"})
+        self.assertTrue(breaker.allow_request())
+
+    def test_retry_after_is_capped(self):
+        client = RetryingHttpClient(backoff_max=5)
+        response = type('Response', (), {'headers': {'Retry-After': '120'}})()
+        self.assertEqual(client.retry_delay(0, response), 5)
+
+if __name__ == '__main__':
+    unittest.main()
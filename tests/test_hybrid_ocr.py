@@ -0,0 +1,57 @@
+import unittest
+from src.ocr.hybrid_ocr import HybridOCR
+from src.ocr.mistral_ocr import MistralOCR
+from src.ocr.tesseract_ocr import ScoredPage, TesseractOCR
+
+
+class ScriptedTesseract(TesseractOCR):
+    """Devolve confianças fixas por página"""
+
+    def __init__(self, confidences):
+        super().__init__()
+        self.confidences = confidences
+
+    def ocr_pages_scored(self, pdf_path, pages, lang):
+        return {page: ScoredPage(f"tesseract {page}\n\n", confidence)
+                for page, confidence in self.confidences.items()}
+
+
+class RecordingMistral(MistralOCR):
+
+    def __init__(self, fail=False):
+        super().__init__(api_key="test_key")
+        self.fail = fail
+        self.requested = []
+
+    def _ocr_pages(self, pdf_path, pages, lang):
+        self.requested.append(pages)
+        if self.fail:
+            raise ConnectionError("API fora do ar")
+        return {page: f"mistral {page}\n\n" for page in pages}
+
+
+class TestHybridOCR(unittest.TestCase):
+
+    def test_only_low_confidence_pages_are_escalated(self):
+        mistral = RecordingMistral()
+        hybrid = HybridOCR(ScriptedTesseract({1: 95.0, 2: 40.0, 3: None, 4: 80.0}), mistral)
+        pages = hybrid._ocr_pages("doc.pdf", None, 'por')
+
+        self.assertEqual(mistral.requested, [[2, 3]])
+        self.assertEqual(pages, {1: "tesseract 1\n\n", 2: "mistral 2\n\n",
+                                 3: "mistral 3\n\n", 4: "tesseract 4\n\n"})
+        self.assertEqual(hybrid.stats(), {"local_pages": 2, "escalated_pages": 2})
+
+    def test_keeps_tesseract_text_when_mistral_fails(self):
+        hybrid = HybridOCR(ScriptedTesseract({1: 10.0}), RecordingMistral(fail=True),
+                           escalate_empty_pages=False)
+        self.assertEqual(hybrid._ocr_pages("doc.pdf", [1], 'por'), {1: "tesseract 1\n\n"})
+
+    def test_stop_event_is_shared(self):
+        tesseract, mistral = ScriptedTesseract({}), RecordingMistral()
+        hybrid = HybridOCR(tesseract, mistral)
+        hybrid.stop_event.set()
+        self.assertTrue(tesseract.stop_event.is_set() and mistral.stop_event.is_set())
+
+if __name__ == '__main__':
+    unittest.main()
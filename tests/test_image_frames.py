@@ -0,0 +1,56 @@
+import io
+import os
+import tempfile
+import unittest
+from PIL import Image
+from pdfminer.pdfpage import PDFPage
+from src.ocr.image_frames import count_frames, is_image_file, iter_frames, write_frames_pdf
+
+
+class TestImageFrames(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tiff_path = os.path.join(self.tmp.name, "fax.TIF")
+        # Três páginas com tamanhos distintos para identificar cada quadro
+        frames = [Image.new('1', (100 + 10 * index, 50), 1) for index in range(3)]
+        frames[0].save(self.tiff_path, save_all=True, append_images=frames[1:], dpi=(100, 100))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_is_image_file_ignores_case(self):
+        self.assertTrue(is_image_file(self.tiff_path))
+        self.assertFalse(is_image_file("documento.pdf"))
+
+    def test_multipage_tiff_frames_read_one_at_a_time(self):
+        self.assertEqual(count_frames(self.tiff_path), 3)
+        frames = iter_frames(self.tiff_path)
+        number, frame = next(frames)
+        self.assertEqual((number, frame.size), (1, (100, 50)))
+        self.assertEqual([(n, f.size[0]) for n, f in frames], [(2, 110), (3, 120)])
+
+    def test_selected_frames_only(self):
+        self.assertEqual([n for n, _ in iter_frames(self.tiff_path, [3, 1, 7])], [1, 3])
+
+    def test_exif_orientation_applied(self):
+        path = os.path.join(self.tmp.name, "foto.jpg")
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotação de 90 graus
+        Image.new('RGB', (80, 40), 'white').save(path, exif=exif)
+        _, frame = next(iter_frames(path))
+        self.assertEqual(frame.size, (40, 80))
+
+    def test_frames_pdf_maps_pages_to_frames(self):
+        buffer = io.BytesIO()
+        self.assertEqual(write_frames_pdf(self.tiff_path, [2, 3], buffer), [2, 3])
+
+        buffer.seek(0)
+        parsed = list(PDFPage.get_pages(buffer))
+        self.assertEqual(len(parsed), 2)
+        # 110 px a 100 dpi = 79,2 pt
+        self.assertEqual(round(parsed[0].mediabox[2]), 79)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+from PIL import Image, ImageDraw
+from src.ocr.image_preprocessor import (PREPROCESSING_PRESETS, PreprocessingOptions, binarize,
+                                        estimate_skew, estimate_x_height, preprocess_image,
+                                        preset_options)
+
+
+def text_like_page(block_height=12):
+    """Página com 'linhas de texto' formadas por blocos escuros"""
+    image = Image.new('L', (1200, 1600), 255)
+    draw = ImageDraw.Draw(image)
+    for y in range(300, 1300, 40):
+        for x in range(200, 1000, 30):
+            draw.rectangle([x, y, x + 20, y + block_height - 1], fill=0)
+    return image
+
+
+class TestImagePreprocessor(unittest.TestCase):
+
+    def test_estimate_skew_returns_correcting_angle(self):
+        skewed = text_like_page().rotate(3, fillcolor=255, expand=True)
+        angle = estimate_skew(binarize(skewed, PreprocessingOptions()), 5.0, 0.2)
+        self.assertAlmostEqual(angle, -3.0, delta=0.3)
+
+    def test_coarse_search_refines_between_coarse_steps(self):
+        skewed = text_like_page().rotate(-1.4, fillcolor=255, expand=True)
+        angle = estimate_skew(binarize(skewed, PreprocessingOptions()), 5.0, 0.2)
+        self.assertAlmostEqual(angle, 1.4, delta=0.3)
+
+    def test_deskew_straightens_text_rows(self):
+        page = text_like_page()
+        options = PreprocessingOptions(crop_margins=False, binary_output=False)
+        straight = preprocess_image(page.rotate(3, fillcolor=255, expand=True), options)
+        ink = np.asarray(straight) == 0
+        self.assertEqual(estimate_skew(ink, 5.0, 0.2), 0.0)
+
+    def test_preset_options_without_deskew(self):
+        options = preset_options('full', deskew=False)
+        self.assertFalse(options.deskew)
+        self.assertEqual(options.crop_margins, PREPROCESSING_PRESETS['full'].crop_margins)
+        self.assertIs(preset_options('global'), PREPROCESSING_PRESETS['global'])
+
+    def test_preprocess_outputs_cropped_one_bit_page(self):
+        result = preprocess_image(text_like_page().convert('RGB'))
+        self.assertEqual(result.mode, '1')
+        self.assertLess(result.width, 900)
+        self.assertLess(result.height, 1100)
+
+    def test_downscale_to_target_x_height(self):
+        options = PreprocessingOptions(target_x_height=6, deskew=False, crop_margins=False)
+        result = preprocess_image(text_like_page(block_height=12), options)
+        self.assertEqual(result.size, (600, 800))
+        self.assertAlmostEqual(estimate_x_height(~np.asarray(result)), 6, delta=1)
+
+    def test_global_threshold_when_adaptive_disabled(self):
+        options = PreprocessingOptions(adaptive_threshold=False, deskew=False,
+                                       crop_margins=False, binary_output=False)
+        result = preprocess_image(Image.new('L', (10, 10), 100), options)
+        self.assertEqual(result.mode, 'L')
+        self.assertEqual(result.getextrema(), (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
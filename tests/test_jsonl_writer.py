@@ -0,0 +1,73 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import unittest
+from src.utils.jsonl_writer import FSYNC_BATCH, JsonlWriter, truncate_partial_line
+
+
+class TestJsonlWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "dataset.jsonl")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_entries(self):
+        with open(self.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_writes_batches_from_many_threads(self):
+        with JsonlWriter(self.path, batch_size=10) as writer:
+            threads = [threading.Thread(target=lambda t=t: [writer.write({"t": t, "i": i}) for i in range(25)])
+                       for t in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        entries = self.read_entries()
+        self.assertEqual(len(entries), 100)
+        self.assertEqual(writer.lines_written, 100)
+        self.assertLess(writer.batches_written, 100)
+
+    def test_ordered_output_follows_sequence(self):
+        sequences = list(range(50))
+        random.Random(7).shuffle(sequences)
+        with JsonlWriter(self.path, ordered=True, batch_size=3, fsync=FSYNC_BATCH) as writer:
+            for sequence in sequences:
+                # As sequências múltiplas de 5 falharam e não têm entrada
+                writer.write({"n": sequence} if sequence % 5 else None, sequence)
+
+        self.assertEqual([entry["n"] for entry in self.read_entries()],
+                         [n for n in range(50) if n % 5])
+
+    def test_close_writes_entries_held_by_missing_sequences(self):
+        with JsonlWriter(self.path, ordered=True) as writer:
+            writer.write({"n": 2}, 2)
+            writer.write({"n": 0}, 0)
+            writer.write({"n": 3}, 3)
+
+        self.assertEqual([entry["n"] for entry in self.read_entries()], [0, 2, 3])
+
+    def test_ordered_writer_requires_sequence(self):
+        with JsonlWriter(self.path, ordered=True) as writer:
+            with self.assertRaises(ValueError):
+                writer.write({"n": 1})
+
+    def test_partial_last_line_is_removed_on_open(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{"n": 1}\n{"n": 2}\n{"n": ')
+
+        with JsonlWriter(self.path) as writer:
+            writer.write({"n": 3})
+
+        self.assertEqual([entry["n"] for entry in self.read_entries()], [1, 2, 3])
+        self.assertEqual(truncate_partial_line(self.path), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from src.core.manifest import STATE_DONE, STATE_FAILED, STATE_RUNNING, JobManifest
+from src.utils.ocr_cache import file_sha256
+
+
+class TestJobManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.temp_dir.name, "doc.pdf")
+        with open(self.input_path, 'wb') as f:
+            f.write(b"versao 1")
+        self.manifest = JobManifest(os.path.join(self.temp_dir.name, "manifesto.sqlite"), "tesseract|por")
+
+    def tearDown(self):
+        self.manifest.close()
+        self.temp_dir.cleanup()
+
+    def finish(self, success=True, entry=None):
+        self.manifest.start(self.input_path)
+        self.manifest.finish(self.input_path, success, 1.5, ["doc.docx"], entry, file_sha256(self.input_path))
+
+    def test_done_file_is_skipped_until_content_changes(self):
+        self.assertFalse(self.manifest.is_done(self.input_path))
+        self.finish()
+        self.assertTrue(self.manifest.is_done(self.input_path))
+
+        # Mesmo conteúdo com outra data de modificação continua concluído
+        os.utime(self.input_path, (1, 1))
+        self.assertTrue(self.manifest.is_done(self.input_path))
+
+        with open(self.input_path, 'wb') as f:
+            f.write(b"versao 2")
+        self.assertFalse(self.manifest.is_done(self.input_path))
+
+    def test_failed_and_interrupted_files_are_not_done(self):
+        self.finish(success=False)
+        self.assertFalse(self.manifest.is_done(self.input_path))
+        self.manifest.start(self.input_path)
+        self.assertEqual(self.manifest.stats()[STATE_RUNNING], 1)
+        self.assertFalse(self.manifest.is_done(self.input_path))
+
+    def test_config_change_invalidates_done_files(self):
+        self.finish()
+        other = JobManifest(self.manifest.path, "mistral|por")
+        try:
+            self.assertFalse(other.is_done(self.input_path))
+        finally:
+            other.close()
+
+    def test_rewrite_dataset_keeps_one_entry_per_done_file(self):
+        self.finish(entry={"messages": [1]})
+        self.finish(entry={"messages": [2]})
+        dataset_path = os.path.join(self.temp_dir.name, "dataset.jsonl")
+        with open(dataset_path, 'w', encoding='utf-8') as f:
+            f.write('{"messages": [1]}\n{"messages": [2]}\n{"mess')
+
+        self.assertEqual(self.manifest.rewrite_dataset(dataset_path), 1)
+        with open(dataset_path, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line) for line in f], [{"messages": [2]}])
+        self.assertEqual(self.manifest.stats()[STATE_DONE], 1)
+        self.assertEqual(self.manifest.stats()[STATE_FAILED], 0)
+
+    def test_reprocessing_file_with_entry_is_counted_as_superseded(self):
+        self.finish(success=False)
+        self.finish(entry={"messages": [1]})
+        self.assertEqual(self.manifest.superseded_entries, 0)
+        self.manifest.start(self.input_path)
+        self.assertEqual(self.manifest.superseded_entries, 1)
+
+    def test_dataset_lines_follow_order_key(self):
+        paths = []
+        for name in ("b.pdf", "a.pdf", "c.pdf"):
+            path = os.path.join(self.temp_dir.name, name)
+            with open(path, 'wb') as f:
+                f.write(name.encode())
+            paths.append(path)
+        for path, order_key in zip(paths, ("2", "1", None)):
+            self.manifest.start(path, order_key)
+            self.manifest.finish(path, True, 1.0, [], {"file": os.path.basename(path)})
+
+        self.assertEqual([json.loads(line)["file"] for line in self.manifest.dataset_lines()],
+                         ["a.pdf", "b.pdf", "c.pdf"])
+        # Arquivo já concluído recebe a chave ao ser ignorado em uma nova execução
+        self.assertTrue(self.manifest.is_done(paths[2], "0"))
+        self.assertEqual(json.loads(self.manifest.dataset_lines()[0])["file"], "c.pdf")
+
+    def test_manifest_without_order_key_is_migrated(self):
+        path = os.path.join(self.temp_dir.name, "antigo.sqlite")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE files (path TEXT PRIMARY KEY, sha256 TEXT, size INTEGER, mtime REAL, "
+                     "config TEXT, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, outputs TEXT, "
+                     "dataset_entry TEXT, started REAL, finished REAL, seconds REAL)")
+        conn.commit()
+        conn.close()
+
+        manifest = JobManifest(path, "tesseract|por")
+        try:
+            manifest.start(self.input_path, "0")
+            self.assertEqual(manifest.stats()[STATE_RUNNING], 1)
+        finally:
+            manifest.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import base64
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from pdf_fixtures import make_pdf
+from src.core.base_ocr import count_pdf_pages
+from src.ocr.mistral_bundler import MistralBundler
+from src.ocr.mistral_ocr import MistralOCR
+from src.utils.circuit_breaker import CircuitBreaker
+
+
+class FakeFallback:
+    def __init__(self):
+        self.paths = []
+
+    def extract_text(self, path, lang='por'):
+        self.paths.append(path)
+        return f"fallback {os.path.basename(path)}"
+
+
+class BundleHandler(BaseHTTPRequestHandler):
+    """Responde uma página por página do PDF recebido, identificando lote e posição"""
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        document = request["document"]
+        pdf_data = base64.b64decode(document["document_base64"])
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as f:
+            f.write(pdf_data)
+            f.flush()
+            page_total = count_pdf_pages(f.name)
+        self.server.bundles.append(page_total)
+
+        name = document["document_name"]
+        pages = [{"index": index, "markdown": f"{name} página {index + 1} " * 4}
+                 for index in range(page_total)]
+        data = json.dumps({"pages": pages}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestMistralBundler(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), BundleHandler)
+        self.server.bundles = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/ocr"
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def _image(self, name, frames=1):
+        path = os.path.join(self.temp_dir.name, name)
+        images = [Image.new('L', (300, 400), 255) for _ in range(frames)]
+        images[0].save(path, save_all=frames > 1, append_images=images[1:])
+        return path
+
+    def test_pages_are_mapped_back_to_their_files(self):
+        paths = [self._image(f"foto{number}.png") for number in range(4)]
+        paths.append(self._image("digitalizacao.tiff", frames=2))
+        paths.append(self._image("foto4.png"))
+        text_pdf = os.path.join(self.temp_dir.name, "texto.pdf")
+        make_pdf(text_pdf, ["Documento com camada de texto suficiente para a leitura direta"])
+        paths.append(text_pdf)
+
+        ocr = MistralOCR(api_key="test_key", api_url=self.url)
+        bundler = MistralBundler(ocr, max_bundle_pages=4, max_workers=1)
+        results = dict(bundler.extract_many(paths))
+
+        # Quatro fotos no primeiro lote; o TIFF não cabe e abre o segundo
+        self.assertEqual(self.server.bundles, [4, 3])
+        for number in range(4):
+            self.assertTrue(results[paths[number]].startswith(f"lote_1.pdf página {number + 1} "))
+        tiff_text = results[paths[4]]
+        self.assertIn("lote_2.pdf página 1 ", tiff_text)
+        self.assertIn("lote_2.pdf página 2 ", tiff_text)
+        self.assertLess(tiff_text.index("página 1"), tiff_text.index("página 2"))
+        self.assertTrue(results[paths[5]].startswith("lote_2.pdf página 3 "))
+        self.assertIn("camada de texto", results[text_pdf])
+
+    def test_multiframe_image_over_page_limit_is_sent_alone(self):
+        photo = self._image("foto.png")
+        tiff = self._image("fax.tiff", frames=3)
+
+        ocr = MistralOCR(api_key="test_key", api_url=self.url)
+        bundler = MistralBundler(ocr, max_document_pages=2, max_workers=1)
+        results = dict(bundler.extract_many([tiff, photo]))
+
+        # O TIFF segue pelo MistralOCR em um PDF próprio; a foto forma o lote
+        self.assertEqual(sorted(self.server.bundles), [1, 3])
+        self.assertNotIn("lote_", results[tiff])
+        self.assertTrue(results[photo].startswith("lote_1.pdf página 1 "))
+
+    def test_open_circuit_uses_fallback(self):
+        paths = [self._image(f"foto{number}.png") for number in range(2)]
+        breaker = CircuitBreaker("API Mistral", failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+
+        ocr = MistralOCR(api_key="test_key", api_url=self.url, circuit_breaker=breaker)
+        ocr.fallback_ocr = FakeFallback()
+        results = dict(MistralBundler(ocr, max_workers=1).extract_many(paths))
+
+        self.assertEqual(self.server.bundles, [])
+        self.assertEqual(results, {path: f"fallback {os.path.basename(path)}" for path in paths})
+
+    def test_concurrent_documents_share_one_request(self):
+        paths = [self._image(f"foto{number}.png") for number in range(3)]
+        ocr = MistralOCR(api_key="test_key", api_url=self.url)
+        ocr.bundler = MistralBundler(ocr, max_bundle_pages=3, linger=5)
+
+        results = {}
+        threads = [threading.Thread(target=lambda path=path: results.update({path: ocr.extract_text(path)}))
+                   for path in paths]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        # O lote enche com a terceira foto e é enviado sem esperar o linger
+        self.assertEqual(self.server.bundles, [3])
+        self.assertEqual(sorted(text.split(" página ")[0] for text in results.values()), ["lote_1.pdf"] * 3)
+
+if __name__ == '__main__':
+    unittest.main()
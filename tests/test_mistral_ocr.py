@@ -1,6 +1,89 @@
-
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
-from src.ocr.mistral_ocr import MistralOCR
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from pdf_fixtures import make_pdf
+from src.core.base_ocr import BaseOCRProcessor, count_pdf_pages
+from src.ocr.mistral_ocr import MISTRAL_OCR_API_URL, MistralOCR, load_api_url
+from src.utils.circuit_breaker import CLOSED, OPEN, CircuitBreaker
+
+
+class FallbackOCR(BaseOCRProcessor):
+
+    def _ocr_pages(self, pdf_path, pages, lang):
+        return {page: "Texto reconhecido localmente pelo processador de reserva.\n\n"
+                for page in pages}
+
+
+class StuckFallbackOCR(BaseOCRProcessor):
+    """Processador de reserva que só termina quando o OCR é cancelado (ou após 5 s)"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+
+    def _ocr_pages(self, pdf_path, pages, lang):
+        self.started.set()
+        give_up = time.monotonic() + 5
+        while not self.cancelled() and time.monotonic() < give_up:
+            time.sleep(0.05)
+        return {}
+
+
+class FakeMistralHandler(BaseHTTPRequestHandler):
+    """Simula os endpoints de OCR e de arquivos da API"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.path.endswith('/files'):
+            self.server.uploads.append(body)
+            return self._send_json({"id": "file-1"})
+
+        request = json.loads(body)
+        time.sleep(self.server.delay)
+        requested = request.get("pages", [0, 1])
+        self.server.requested_pages.append(requested)
+        self.server.request_ids.setdefault(tuple(requested), []).append(request["id"])
+        if self.server.unavailable or tuple(requested) in self.server.fail_once:
+            self.server.fail_once.discard(tuple(requested))
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        document = request["document"]
+        if document["type"] == "document_url":
+            self.server.document_urls.append(document["document_url"])
+            pdf_data = self.server.uploads[-1]
+        else:
+            pdf_data = base64.b64decode(document["document_base64"])
+        self.server.documents.append(pdf_data)
+        self._send_json({"pages": [{"index": index, "markdown": f"Página {index + 1}"}
+                                   for index in requested]})
+
+    def do_GET(self):
+        self._send_json({"url": "https://signed.example/file-1"})
+
+    def do_DELETE(self):
+        self.server.deleted.append(self.path)
+        self._send_json({"deleted": True})
+
+    def _send_json(self, data):
+        data = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
 
 class TestMistralOCR(unittest.TestCase):
 
@@ -11,5 +94,139 @@ class TestMistralOCR(unittest.TestCase):
         except Exception as e:
             self.fail(f"MistralOCR instantiation failed with {e}")
 
+    def test_parse_pages_maps_selected_pages(self):
+        result = {"pages": [{"index": 1, "markdown": " Segunda "}, {"index": 4, "markdown": "Quinta"}]}
+        self.assertEqual(MistralOCR._parse_pages(result, [2, 5]), {2: "Segunda\n\n", 5: "Quinta\n\n"})
+
+    def test_image_frames_sent_as_pdf_pages(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image_path = os.path.join(temp_dir, "digitalizado.tiff")
+            frames = [Image.new('L', (60, 60), 255) for _ in range(3)]
+            frames[0].save(image_path, save_all=True, append_images=frames[1:])
+            ocr = MistralOCR(api_key="test_key")
+            sent = []
+
+            def fake_document(pdf_path, pages, lang):
+                sent.append(count_pdf_pages(pdf_path))
+                return {1: "segundo\n\n", 2: "terceiro\n\n"}
+
+            ocr._ocr_document = fake_document
+            self.assertEqual(ocr._ocr_pages(image_path, [2, 3], 'por'), {2: "segundo\n\n", 3: "terceiro\n\n"})
+            self.assertEqual(sent, [2])
+
+    def test_api_url_from_config(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config_path = os.path.join(temp_dir, "config.ini")
+            with open(config_path, 'w', encoding='utf-8') as f:
+                f.write("[mistral]\napi_url = http://127.0.0.1:8080/v1/ocr\n")
+            self.assertEqual(load_api_url(config_path), "http://127.0.0.1:8080/v1/ocr")
+            self.assertEqual(load_api_url(os.path.join(temp_dir, "ausente.ini")), MISTRAL_OCR_API_URL)
+
+
+class TestMistralOCRUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeMistralHandler)
+        self.server.uploads, self.server.documents = [], []
+        self.server.document_urls, self.server.deleted = [], []
+        self.server.requested_pages, self.server.fail_once = [], set()
+        self.server.request_ids = {}
+        self.server.unavailable = False
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/ocr"
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.pdf_path = os.path.join(self.temp_dir.name, "doc.pdf")
+        self.pdf_data = b"%PDF-1.4\n" + os.urandom(300 * 1024)
+        with open(self.pdf_path, 'wb') as f:
+            f.write(self.pdf_data)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def test_streamed_body_above_threshold(self):
+        ocr = MistralOCR(api_key="test_key", api_url=self.url, stream_threshold=1024)
+        pages = ocr._ocr_pages(self.pdf_path, [2, 3], 'por')
+        self.assertEqual(pages, {2: "Página 2\n\n", 3: "Página 3\n\n"})
+        self.assertEqual(self.server.documents, [self.pdf_data])
+
+    def test_files_api_references_signed_url(self):
+        ocr = MistralOCR(api_key="test_key", api_url=self.url, use_files_api=True)
+        pages = ocr._ocr_pages(self.pdf_path, None, 'por')
+        self.assertEqual(pages, {1: "Página 1\n\n", 2: "Página 2\n\n"})
+        self.assertIn(self.pdf_data, self.server.uploads[0])
+        self.assertEqual(self.server.document_urls, ["https://signed.example/file-1"])
+        self.assertEqual(self.server.deleted, ["/v1/files/file-1"])
+
+    def test_long_document_split_and_only_failed_chunk_retried(self):
+        pdf_path = os.path.join(self.temp_dir.name, "longo.pdf")
+        make_pdf(pdf_path, [None] * 5)
+        self.server.fail_once.add((2, 3))
+        ocr = MistralOCR(api_key="test_key", api_url=self.url, max_pages_per_request=2)
+        ocr.http.max_retries = 0
+
+        pages = ocr._ocr_pages(pdf_path, None, 'por')
+        self.assertEqual(pages, {page: f"Página {page}\n\n" for page in range(1, 6)})
+        self.assertEqual(sorted(self.server.requested_pages), [[0, 1], [2, 3], [2, 3], [4]])
+        # A repetição do intervalo reenvia o mesmo payload, com o mesmo id
+        first_id, retry_id = self.server.request_ids[(2, 3)]
+        self.assertEqual(first_id, retry_id)
+
+    def test_open_circuit_routes_documents_to_fallback(self):
+        pdf_path = os.path.join(self.temp_dir.name, "digitalizado.pdf")
+        make_pdf(pdf_path, [None])
+        self.server.unavailable = True
+        ocr = MistralOCR(api_key="test_key", api_url=self.url,
+                         circuit_breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+        ocr.http.max_retries = 0
+        ocr.fallback_ocr = FallbackOCR()
+
+        self.assertEqual(ocr.extract_text(pdf_path), "")
+        self.assertEqual(ocr.circuit_breaker.state, OPEN)
+        self.assertIn("processador de reserva", ocr.extract_text(pdf_path))
+        self.assertEqual(len(self.server.requested_pages), 1)
+
+    def test_cancel_stops_document_in_fallback(self):
+        pdf_path = os.path.join(self.temp_dir.name, "digitalizado.pdf")
+        make_pdf(pdf_path, [None])
+        ocr = MistralOCR(api_key="test_key", api_url=self.url,
+                         circuit_breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+        ocr.circuit_breaker.record_failure()
+        ocr.fallback_ocr = StuckFallbackOCR()
+        results = []
+        worker = threading.Thread(target=lambda: results.append(ocr.extract_text(pdf_path)))
+        worker.start()
+
+        self.assertTrue(ocr.fallback_ocr.started.wait(5))
+        ocr.stop_event.set()
+        worker.join(timeout=2)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(results, [""])
+
+    def test_document_timeout_aborts_requests_in_flight(self):
+        pdf_path = os.path.join(self.temp_dir.name, "lento.pdf")
+        make_pdf(pdf_path, [None] * 2)
+        self.server.delay = 10
+        ocr = MistralOCR(api_key="test_key", api_url=self.url, max_pages_per_request=1)
+        ocr.document_timeout = 0.5
+        started = time.monotonic()
+
+        self.assertEqual(ocr.extract_text(pdf_path), "")
+        self.assertLess(time.monotonic() - started, 2)
+        # O prazo do documento não é uma falha do serviço
+        self.assertEqual(ocr.circuit_breaker.state, CLOSED)
+        self.assertEqual(ocr.http_stats()["requests"], 0)
+
+    def test_byte_limit_reduces_pages_per_chunk(self):
+        pdf_path = os.path.join(self.temp_dir.name, "longo.pdf")
+        make_pdf(pdf_path, [None] * 6)
+        ocr = MistralOCR(api_key="test_key", api_url=self.url,
+                         max_bytes_per_request=os.path.getsize(pdf_path) // 3)
+        self.assertEqual(ocr.page_chunks(pdf_path, [1, 2, 4, 5, 6]), [[1], [2], [4], [5], [6]])
+        ocr.max_bytes_per_request = os.path.getsize(pdf_path) // 3 + 1
+        self.assertEqual(ocr.page_chunks(pdf_path, None), [[1, 2], [3, 4], [5, 6]])
+
 if __name__ == '__main__':
     unittest.main()
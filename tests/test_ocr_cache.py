@@ -0,0 +1,45 @@
+import os
+import tempfile
+import time
+import unittest
+from src.utils.ocr_cache import OCRCache
+
+
+class TestOCRCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_get_and_put(self):
+        cache = OCRCache(self.temp_dir.name)
+        key = OCRCache.make_key("doc", "hash", "TesseractOCR", "por")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "Texto reconhecido")
+        self.assertEqual(cache.get(key), "Texto reconhecido")
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    def test_key_depends_on_every_part(self):
+        self.assertNotEqual(OCRCache.make_key("doc", "h", "TesseractOCR", "por"),
+                            OCRCache.make_key("doc", "h", "TesseractOCR", "eng"))
+        self.assertNotEqual(OCRCache.make_key("ab", "c"), OCRCache.make_key("a", "bc"))
+
+    def test_evicts_least_recently_used(self):
+        cache = OCRCache(self.temp_dir.name, max_bytes=1000)
+        keys = [OCRCache.make_key(str(i)) for i in range(3)]
+        for offset, key in enumerate(keys):
+            cache.put(key, "x" * 100)
+            path = cache._entry_path(key)
+            os.utime(path, (time.time() - 100 + offset, time.time() - 100 + offset))
+        # Acesso renova a primeira entrada; a segunda passa a ser a mais antiga
+        self.assertIsNotNone(cache.get(keys[0]))
+        cache.max_bytes = 250
+        cache.evict()
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[2]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from unittest import mock
+from PIL import Image, ImageDraw
+from src.ocr.pdf_rasterizer import PROBE_DPI, PdfRasterizer
+
+
+def fake_convert_from_path(pdf_path, dpi, first_page, last_page, grayscale, poppler_path):
+    return [Image.new('L', (page, page)) for page in range(first_page, last_page + 1)]
+
+
+def probe_page(x_height):
+    """Sondagem a PROBE_DPI com linhas de 'letras' da altura indicada"""
+    image = Image.new('L', (612, 792), 255)
+    draw = ImageDraw.Draw(image)
+    for y in range(60, 720, x_height * 3):
+        for x in range(60, 540, x_height + 3):
+            draw.rectangle([x, y, x + x_height - 1, y + x_height - 1], fill=0)
+    return image
+
+
+class TestPdfRasterizer(unittest.TestCase):
+
+    def test_page_windows(self):
+        windows = PdfRasterizer._page_windows([1, 2, 3, 4, 5, 8, 9, 12], 3)
+        self.assertEqual(windows, [(1, 3), (4, 5), (8, 9), (12, 12)])
+
+    def test_iter_pages_renders_one_window_at_a_time(self):
+        rasterizer = PdfRasterizer(window_size=2, adaptive_dpi=False)
+        with mock.patch('src.ocr.pdf_rasterizer.convert_from_path',
+                        side_effect=fake_convert_from_path) as convert, \
+                mock.patch('src.ocr.pdf_rasterizer.pdfinfo_from_path', return_value={"Pages": 5}):
+            pages = rasterizer.iter_pages("doc.pdf")
+            first_number, first_image = next(pages)
+            self.assertEqual((first_number, first_image.width), (1, 1))
+            self.assertEqual(convert.call_count, 1)
+            self.assertTrue(convert.call_args.kwargs['grayscale'])
+            rest = [(number, image.width) for number, image in pages]
+
+        self.assertEqual(rest, [(2, 2), (3, 3), (4, 4), (5, 5)])
+        self.assertEqual(convert.call_count, 3)
+
+    def test_choose_dpi_from_glyph_size(self):
+        rasterizer = PdfRasterizer()
+        self.assertEqual(rasterizer.choose_dpi(probe_page(4)), 300)
+        self.assertEqual(rasterizer.choose_dpi(probe_page(10)), 150)
+        self.assertEqual(rasterizer.choose_dpi(Image.new('L', (612, 792), 255)), rasterizer.dpi)
+
+    def test_adaptive_dpi_groups_pages_by_resolution(self):
+        probes = [probe_page(4), probe_page(4), probe_page(10)]
+
+        def convert(pdf_path, dpi, first_page, last_page, grayscale, poppler_path):
+            if dpi == PROBE_DPI:
+                return probes[first_page - 1:last_page]
+            return [Image.new('L', (dpi, 1)) for _ in range(first_page, last_page + 1)]
+
+        with mock.patch('src.ocr.pdf_rasterizer.convert_from_path', side_effect=convert):
+            pages = [(number, image.width) for number, image in
+                     PdfRasterizer().iter_pages("doc.pdf", [1, 2, 3])]
+        self.assertEqual(pages, [(1, 300), (2, 300), (3, 150)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import io
+import unittest
+from PIL import Image
+from pdfminer.pdfpage import PDFPage
+from src.utils.pdf_writer import decode_page, encode_jpeg_page, encode_mono_page, write_image_pdf
+
+
+class TestPdfWriter(unittest.TestCase):
+
+    def test_one_image_per_page(self):
+        pages = [encode_jpeg_page(Image.new('L', (400, 200), 255), 200),
+                 encode_jpeg_page(Image.new('RGB', (144, 144), 'red'), 72)]
+        buffer = io.BytesIO()
+        self.assertEqual(write_image_pdf(pages, buffer), 2)
+
+        buffer.seek(0)
+        parsed = list(PDFPage.get_pages(buffer))
+        self.assertEqual(len(parsed), 2)
+        self.assertEqual([round(value) for value in parsed[0].mediabox], [0, 0, 144, 72])
+        self.assertEqual([round(value) for value in parsed[1].mediabox], [0, 0, 144, 144])
+        self.assertIn(pages[0].data, buffer.getvalue())
+
+    def test_decode_page_round_trip(self):
+        image = Image.new('1', (16, 8), 1)
+        image.putpixel((3, 2), 0)
+        decoded = decode_page(encode_mono_page(image, 200))
+        self.assertEqual((decoded.mode, decoded.size), ('1', (16, 8)))
+        self.assertEqual(decoded.tobytes(), image.tobytes())
+        self.assertEqual(decode_page(encode_jpeg_page(Image.new('L', (10, 20), 255), 200)).size, (10, 20))
+
+if __name__ == '__main__':
+    unittest.main()
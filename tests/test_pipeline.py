@@ -0,0 +1,295 @@
+import json
+import os
+import random
+import tempfile
+import time
+import unittest
+from unittest import mock
+from docx import Document
+from PIL import Image
+from src.core.base_ocr import BaseOCRProcessor
+from src.core.manifest import JobManifest
+from src.core.pipeline import (BatchPipeline, PipelineOptions, iter_input_files, list_input_files,
+                               scan_order_key)
+
+SAMPLE_TEXT = ("Primeiro parágrafo do documento com texto suficiente para o teste.\n\n"
+               "Segundo parágrafo com mais algumas palavras reconhecidas.")
+
+
+class FakeOCR(BaseOCRProcessor):
+    """Devolve um texto fixo, ou nenhuma página para os arquivos em 'failing'"""
+
+    def __init__(self, failing=(), stop_after=None):
+        super().__init__()
+        self.prescan_text_layer = False
+        self.failing = set(failing)
+        self.stop_after = stop_after
+        self.calls = []
+
+    def _ocr_pages(self, pdf_path, pages, lang):
+        self.calls.append(os.path.basename(pdf_path))
+        if self.stop_after is not None and len(self.calls) >= self.stop_after:
+            self.stop_event.set()
+        if os.path.basename(pdf_path) in self.failing:
+            return {}
+        return {1: SAMPLE_TEXT}
+
+
+class TestBatchPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.tmp.name, "entrada")
+        self.output_dir = os.path.join(self.tmp.name, "saida")
+        os.makedirs(self.input_dir)
+        for name in ("b.pdf", "a.PDF", "notas.txt", "foto.png"):
+            with open(os.path.join(self.input_dir, name), 'wb') as f:
+                f.write(b"conteudo")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_list_input_files_returns_supported_files_sorted(self):
+        names = [os.path.basename(path) for path in list_input_files(self.input_dir)]
+        self.assertEqual(names, ["a.PDF", "b.pdf", "foto.png"])
+
+    def make_tree(self):
+        for relative in ("2024/jan/c.pdf", "2024/rascunhos/d.pdf", "2024/e.png"):
+            path = os.path.join(self.input_dir, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b"conteudo")
+
+    def test_iter_input_files_recurses_with_globs(self):
+        self.make_tree()
+        relative = lambda paths: [os.path.relpath(path, self.input_dir).replace(os.sep, '/') for path in paths]
+
+        self.assertEqual(relative(iter_input_files(self.input_dir)), ["a.PDF", "b.pdf", "foto.png"])
+        self.assertEqual(relative(iter_input_files(self.input_dir, recursive=True, include=("*.pdf",),
+                                                   exclude=("rascunhos",))),
+                         ["a.PDF", "b.pdf", "2024/jan/c.pdf"])
+        skipped = os.path.join(self.input_dir, "2024")
+        self.assertEqual(relative(iter_input_files(self.input_dir, recursive=True, skip_dirs=(skipped,))),
+                         ["a.PDF", "b.pdf", "foto.png"])
+
+    def test_scan_order_key_sorts_like_the_listing(self):
+        self.make_tree()
+        for relative in ("2024-b/f.pdf", "2024 c/g.pdf", "2024.pdf"):
+            path = os.path.join(self.input_dir, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b"conteudo")
+
+        listed = [os.path.relpath(path, self.input_dir) for path in iter_input_files(self.input_dir, recursive=True)]
+        self.assertEqual(sorted(listed, key=scan_order_key), listed)
+        self.assertNotEqual(sorted(listed), listed)
+
+    def test_resumed_ordered_run_keeps_scan_order(self):
+        self.make_tree()
+
+        class NamedOCR(FakeOCR):
+            def _ocr_pages(self, pdf_path, pages, lang):
+                return {1: f"{SAMPLE_TEXT} {os.path.basename(pdf_path)}"}
+
+        options = PipelineOptions(output_formats=('json',), recursive=True, ordered_output=True, workers=3)
+        dataset_path = os.path.join(self.output_dir, "mistral_dataset.jsonl")
+        BatchPipeline(NamedOCR(), options).run(self.input_dir, self.output_dir)
+        with open(dataset_path, encoding='utf-8') as f:
+            first = f.read()
+
+        # Arquivo alterado: a entrada antiga é substituída e o JSONL, regenerado
+        with open(os.path.join(self.input_dir, "2024", "jan", "c.pdf"), 'wb') as f:
+            f.write(b"conteudo alterado")
+        BatchPipeline(NamedOCR(), options).run(self.input_dir, self.output_dir)
+        with open(dataset_path, encoding='utf-8') as f:
+            second = f.read()
+
+        self.assertEqual(second, first)
+        self.assertLess(first.index("foto.png"), first.index("e.png"))
+
+    def test_recursive_run_mirrors_subdirectories(self):
+        self.make_tree()
+        for image in ("foto.png", os.path.join("2024", "e.png")):
+            os.remove(os.path.join(self.input_dir, image))
+        options = PipelineOptions(output_formats=('md',), recursive=True, max_in_flight=2,
+                                  max_in_flight_bytes=10)
+
+        summary = BatchPipeline(FakeOCR(), options).run(self.input_dir, self.output_dir)
+
+        self.assertEqual((summary['files'], summary['failed']), (4, 0))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "2024", "jan", "c.md")))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "2024", "rascunhos", "d.md")))
+
+    def test_run_without_count_walks_input_once(self):
+        self.make_tree()
+        for image in ("foto.png", os.path.join("2024", "e.png")):
+            os.remove(os.path.join(self.input_dir, image))
+        pipeline = BatchPipeline(FakeOCR(), PipelineOptions(output_formats=('md',), recursive=True,
+                                                            count_total=False))
+        walks = []
+        iter_inputs = pipeline.iter_inputs
+        pipeline.iter_inputs = lambda *args: walks.append(args) or iter_inputs(*args)
+
+        summary = pipeline.run(self.input_dir, self.output_dir)
+
+        self.assertEqual(len(walks), 1)
+        self.assertEqual((summary['files'], summary['succeeded']), (4, 4))
+
+    def test_run_writes_outputs_and_reports_progress(self):
+        os.remove(os.path.join(self.input_dir, "foto.png"))
+        progress = []
+        options = PipelineOptions(output_formats=('docx', 'json', 'md'), workers=2)
+        pipeline = BatchPipeline(FakeOCR(failing={"b.pdf"}), options,
+                                 on_progress=lambda result, done, total: progress.append((result, done, total)))
+
+        summary = pipeline.run(self.input_dir, self.output_dir)
+
+        self.assertEqual((summary['files'], summary['succeeded'], summary['failed']), (2, 1, 1))
+        self.assertFalse(summary['cancelled'])
+        self.assertEqual(sorted(done for _, done, _ in progress), [1, 2])
+        self.assertEqual({os.path.basename(r.path): r.success for r, _, _ in progress},
+                         {"a.PDF": True, "b.pdf": False})
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "a.docx")))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "a.md")))
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "b.docx")))
+        with open(os.path.join(self.output_dir, "mistral_dataset.jsonl"), encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['messages'][-1]['role'], "assistant")
+
+    def test_ordered_dataset_is_identical_across_runs(self):
+        for index in range(12):
+            with open(os.path.join(self.input_dir, f"lote_{index:02d}.pdf"), 'wb') as f:
+                f.write(b"conteudo")
+
+        class NamedOCR(FakeOCR):
+            def _ocr_pages(self, pdf_path, pages, lang):
+                time.sleep(random.random() / 100)
+                return {1: f"{SAMPLE_TEXT} {os.path.basename(pdf_path)}"}
+
+        outputs = []
+        for run in range(2):
+            output_dir = os.path.join(self.tmp.name, f"saida_{run}")
+            options = PipelineOptions(output_formats=('json',), workers=4, ordered_output=True)
+            BatchPipeline(NamedOCR(), options).run(self.input_dir, output_dir)
+            with open(os.path.join(output_dir, "mistral_dataset.jsonl"), encoding='utf-8') as f:
+                outputs.append(f.read())
+
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertLess(outputs[0].index("a.PDF"), outputs[0].index("lote_00.pdf"))
+        self.assertLess(outputs[0].index("lote_00.pdf"), outputs[0].index("lote_11.pdf"))
+
+    def test_rerun_skips_done_files_and_retries_failed_ones(self):
+        os.remove(os.path.join(self.input_dir, "foto.png"))
+        options = PipelineOptions(output_formats=('json',))
+        first = BatchPipeline(FakeOCR(failing={"b.pdf"}), options).run(self.input_dir, self.output_dir)
+        self.assertEqual((first['succeeded'], first['failed']), (1, 1))
+
+        ocr = FakeOCR()
+        second = BatchPipeline(ocr, options).run(self.input_dir, self.output_dir)
+
+        self.assertEqual(ocr.calls, ["b.pdf"])
+        self.assertEqual((second['succeeded'], second['skipped'], second['failed']), (1, 1, 0))
+        with open(os.path.join(self.output_dir, "mistral_dataset.jsonl"), encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+        ocr = FakeOCR()
+        third = BatchPipeline(ocr, options).run(self.input_dir, self.output_dir)
+        self.assertEqual((ocr.calls, third['skipped']), ([], 2))
+        with open(os.path.join(self.output_dir, "mistral_dataset.jsonl"), encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_dataset_regenerated_at_close_only_when_entries_are_superseded(self):
+        os.remove(os.path.join(self.input_dir, "foto.png"))
+        options = PipelineOptions(output_formats=('json',))
+        dataset_path = os.path.join(self.output_dir, "mistral_dataset.jsonl")
+        with mock.patch.object(JobManifest, 'rewrite_dataset', autospec=True,
+                               side_effect=JobManifest.rewrite_dataset) as rewrite:
+            BatchPipeline(FakeOCR(), options).run(self.input_dir, self.output_dir)
+            # Apenas a limpeza na abertura; o JSONL gravado na execução é mantido
+            self.assertEqual(rewrite.call_count, 1)
+
+            with open(os.path.join(self.input_dir, "a.PDF"), 'wb') as f:
+                f.write(b"conteudo alterado")
+            BatchPipeline(FakeOCR(), options).run(self.input_dir, self.output_dir)
+            self.assertEqual(rewrite.call_count, 3)
+
+        with open(dataset_path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_dataset_without_manifest_is_preserved(self):
+        os.makedirs(self.output_dir)
+        with open(os.path.join(self.output_dir, "mistral_dataset.jsonl"), 'w', encoding='utf-8') as f:
+            f.write('{"messages": []}\n')
+        BatchPipeline(FakeOCR(), PipelineOptions(output_formats=('json',))).run(self.input_dir, self.output_dir)
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "mistral_dataset.anterior.jsonl")))
+
+    def test_watch_processes_arrivals_until_stopped(self):
+        os.remove(os.path.join(self.input_dir, "foto.png"))
+        ocr = FakeOCR()
+        progress = []
+
+        def on_progress(result, done, total):
+            progress.append((os.path.basename(result.path), total))
+            if len(progress) == 2:
+                with open(os.path.join(self.input_dir, "novo.pdf"), 'wb') as f:
+                    f.write(b"chegou depois")
+            elif len(progress) == 3:
+                ocr.stop_event.set()
+
+        pipeline = BatchPipeline(ocr, PipelineOptions(output_formats=('json',)), on_progress=on_progress)
+        summary = pipeline.watch(self.input_dir, self.output_dir, poll_interval=0.05, settle_time=0.1)
+
+        self.assertEqual(sorted(name for name, _ in progress), ["a.PDF", "b.pdf", "novo.pdf"])
+        self.assertEqual({total for _, total in progress}, {None})
+        self.assertEqual((summary['files'], summary['succeeded']), (3, 3))
+        with open(os.path.join(self.output_dir, "mistral_dataset.jsonl"), encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+    def test_only_selected_formats_are_written(self):
+        pipeline = BatchPipeline(FakeOCR(), PipelineOptions(output_formats=('json',)))
+        os.makedirs(self.output_dir)
+        result = pipeline.process_file(os.path.join(self.input_dir, "a.PDF"), self.output_dir)
+
+        self.assertTrue(result.success)
+        self.assertEqual(os.listdir(self.output_dir), ["mistral_dataset.jsonl"])
+
+    def test_image_goes_through_selected_engine(self):
+        Image.new('L', (40, 20), 255).save(os.path.join(self.input_dir, "foto.png"))
+        ocr = FakeOCR()
+        pipeline = BatchPipeline(ocr, PipelineOptions(output_formats=('docx',), engine_name='mistral'))
+        os.makedirs(self.output_dir)
+        result = pipeline.process_file(os.path.join(self.input_dir, "foto.png"), self.output_dir)
+
+        self.assertTrue(result.success)
+        self.assertEqual(ocr.calls, ["foto.png"])
+        paragraphs = [p.text for p in Document(os.path.join(self.output_dir, "foto.docx")).paragraphs]
+        self.assertIn("Imagem: foto.png", paragraphs)
+        self.assertIn("Processado com: Mistral OCR", paragraphs)
+
+    def test_cancelled_run_drops_queued_documents(self):
+        for index in range(10):
+            with open(os.path.join(self.input_dir, f"lote_{index}.pdf"), 'wb') as f:
+                f.write(b"conteudo")
+        ocr = FakeOCR(stop_after=2)
+        pipeline = BatchPipeline(ocr, PipelineOptions(output_formats=('json',), workers=1, queue_size=1))
+        summary = pipeline.run(self.input_dir, self.output_dir)
+
+        self.assertTrue(summary['cancelled'])
+        self.assertEqual(len(ocr.calls), 2)
+        self.assertLess(summary['processed'], summary['files'])
+        self.assertLess(summary['cancel_seconds'], 2)
+
+    def test_summary_stage_runs_only_for_written_docx(self):
+        enriched = []
+        pipeline = BatchPipeline(FakeOCR(), PipelineOptions(output_formats=('docx',), generate_summary=True))
+        pipeline.generate_summary_and_toc = enriched.append
+        os.remove(os.path.join(self.input_dir, "foto.png"))
+        summary = pipeline.run(self.input_dir, self.output_dir)
+
+        self.assertEqual(summary['succeeded'], 2)
+        self.assertEqual(sorted(os.path.basename(path) for path in enriched), ["a.docx", "b.docx"])
+
+
+if __name__ == '__main__':
+    unittest.main()
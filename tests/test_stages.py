@@ -0,0 +1,109 @@
+import threading
+import time
+import unittest
+from src.core.stages import AdmissionControl, Stage, run_stages
+
+
+class TestStages(unittest.TestCase):
+
+    def test_items_flow_through_all_stages(self):
+        stop_event = threading.Event()
+        stages = [
+            Stage("dobro", lambda item: item.append(item[0] * 2) or True, 2, 2, stop_event),
+            Stage("filtro", lambda item: item[0] % 3 != 0, 1, 2, stop_event),
+            Stage("soma", lambda item: item.append(item[0] + item[1]) or True, 3, 2, stop_event)
+        ]
+        results = []
+        run_stages(stages, ([n] for n in range(20)), results.append, stop_event)
+
+        self.assertEqual(len(results), 20)
+        self.assertEqual(sorted(item for item in results if len(item) == 3),
+                         sorted([n, 2 * n, 3 * n] for n in range(20) if n % 3 != 0))
+
+    def test_bounded_queue_applies_backpressure(self):
+        stop_event = threading.Event()
+        in_flight = []
+        peak = [0]
+        lock = threading.Lock()
+
+        def produce(item):
+            with lock:
+                in_flight.append(item)
+                peak[0] = max(peak[0], len(in_flight))
+            return True
+
+        def consume(item):
+            time.sleep(0.01)
+            with lock:
+                in_flight.remove(item)
+            return True
+
+        stages = [Stage("rápida", produce, 2, 1, stop_event), Stage("lenta", consume, 1, 2, stop_event)]
+        run_stages(stages, range(30), lambda item: None, stop_event)
+
+        # Capacidade da fila lenta + item em processamento + itens retidos pelos produtores
+        self.assertLessEqual(peak[0], 2 + 1 + 2)
+
+    def test_stop_drops_queued_items(self):
+        stop_event = threading.Event()
+        handled = []
+
+        def handle(item):
+            handled.append(item)
+            if item == 2:
+                stop_event.set()
+            return True
+
+        results = []
+        run_stages([Stage("única", handle, 1, 1, stop_event)], range(100), results.append, stop_event)
+
+        self.assertEqual(handled, [0, 1, 2])
+        self.assertEqual(results, [0, 1, 2])
+
+    def test_handler_errors_end_the_item(self):
+        stop_event = threading.Event()
+        second = []
+
+        def fail_on_odd(item):
+            if item % 2:
+                raise ValueError("falha")
+            return True
+
+        stages = [Stage("a", fail_on_odd, 1, 1, stop_event), Stage("b", lambda item: second.append(item) or True, 1, 1, stop_event)]
+        results = []
+        run_stages(stages, range(6), results.append, stop_event)
+
+        self.assertEqual(sorted(results), list(range(6)))
+        self.assertEqual(sorted(second), [0, 2, 4])
+
+    def test_admission_limits_items_and_bytes(self):
+        stop_event = threading.Event()
+        admission = AdmissionControl(max_items=3, max_bytes=100)
+
+        self.assertTrue(admission.acquire(60, stop_event))
+        self.assertTrue(admission.acquire(30, stop_event))
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(admission.acquire(50, stop_event)))
+        waiter.start()
+        time.sleep(0.1)
+        self.assertEqual(acquired, [])
+
+        admission.release(60)
+        waiter.join(timeout=2)
+        self.assertEqual(acquired, [True])
+        self.assertEqual((admission.items, admission.bytes), (2, 80))
+
+    def test_oversized_item_is_admitted_alone(self):
+        stop_event = threading.Event()
+        admission = AdmissionControl(max_items=4, max_bytes=100)
+
+        self.assertTrue(admission.acquire(500, stop_event))
+        self.assertEqual(admission.bytes, 100)
+        stop_event.set()
+        self.assertFalse(admission.acquire(1, stop_event))
+        admission.release(500)
+        self.assertEqual((admission.items, admission.bytes), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
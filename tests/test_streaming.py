@@ -0,0 +1,66 @@
+import base64
+import json
+import os
+import tempfile
+import unittest
+from src.utils.streaming import Base64JsonBody, JsonArrayStreamParser, MultipartFileBody, iter_json_array
+
+
+class TestStreamingBodies(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "doc.pdf")
+        self.data = os.urandom(3 * 64 * 1024 * 2 + 5)
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_base64_json_body_matches_in_memory_encoding(self):
+        payload = {"model": "m", "document": {"type": "document_base64", "document_name": "doc.pdf"}}
+        body = Base64JsonBody(payload, ["document", "document_base64"], self.path)
+        encoded = b''.join(body)
+        self.assertEqual(len(encoded), len(body))
+        decoded = json.loads(encoded)
+        self.assertEqual(base64.b64decode(decoded["document"]["document_base64"]), self.data)
+        self.assertEqual(decoded["model"], "m")
+        # Pode ser reenviado em uma nova tentativa
+        self.assertEqual(b''.join(body), encoded)
+
+    def test_multipart_body_length(self):
+        body = MultipartFileBody({"purpose": "ocr"}, "file", self.path, 'application/pdf')
+        encoded = b''.join(body)
+        self.assertEqual(len(encoded), len(body))
+        self.assertIn(self.data, encoded)
+        self.assertTrue(encoded.endswith(f'--{body.boundary}--\r\n'.encode()))
+
+
+class TestJsonArrayStreamParser(unittest.TestCase):
+
+    def test_items_split_across_chunks(self):
+        document = json.dumps({
+            "model": "x", "meta": {"pages": ["não é este"]},
+            "pages": [{"index": i, "markdown": f"Página {i} \\\"ç\\\""} for i in range(5)],
+            "usage_info": {"pages_processed": 5}
+        }, ensure_ascii=False).encode('utf-8')
+
+        for size in (1, 3, 7, 64):
+            chunks = [document[i:i + size] for i in range(0, len(document), size)]
+            items = list(iter_json_array(chunks, "pages"))
+            self.assertEqual([item["index"] for item in items], list(range(5)))
+            self.assertEqual(items[2]["markdown"], 'Página 2 \\"ç\\"')
+
+    def test_items_are_returned_before_the_end(self):
+        parser = JsonArrayStreamParser("pages")
+        self.assertEqual(parser.feed(b'{"pages": [{"index": 0}, {"ind'), [{"index": 0}])
+        self.assertEqual(parser.feed(b'ex": 1}]}'), [{"index": 1}])
+        parser.close()
+
+    def test_truncated_response_raises(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'{"pages": [{"index": 0}'], "pages"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,44 @@
 
 import unittest
 import os
-from src.ocr.tesseract_ocr import TesseractOCR
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+import pytesseract
+from PIL import Image
+from src.utils.concurrency import OMP_THREAD_LIMIT_ENV
+from src.ocr.tesseract_ocr import OCRCancelledError, PageLimits, PageTimeoutError, TesseractOCR, run_tesseract
+
+# Substituto do executável do Tesseract: imprime um hOCR mínimo ou, com o
+# idioma 'lento', fica parado como uma página travada; com o idioma 'omp',
+# imprime o limite de threads recebido no ambiente
+FAKE_TESSERACT = """import os, sys, time
+if 'lento' in sys.argv:
+    time.sleep(30)
+if 'omp' in sys.argv:
+    print(os.environ.get('OMP_THREAD_LIMIT'))
+print('<html>ok</html>')
+"""
+
+
+class FakeTesseractOCR(TesseractOCR):
+    """Substitui o Tesseract por um texto derivado da largura da imagem"""
+
+    @classmethod
+    def _ocr_page(cls, image, lang, options=None, limits=None):
+        return f"Pagina {image.width} processada em {lang} com texto suficiente.\n\n"
+
+
+class PidTesseractOCR(TesseractOCR):
+    """Identifica o processo do pool que reconheceu cada página"""
+
+    @classmethod
+    def _ocr_page(cls, image, lang, options=None, limits=None):
+        time.sleep(0.3)
+        return f"{os.getpid()}\n"
+
 
 class TestTesseractOCR(unittest.TestCase):
 
@@ -14,5 +51,100 @@ class TestTesseractOCR(unittest.TestCase):
         except Exception as e:
             self.fail(f"TesseractOCR instantiation failed with {e}")
 
+    def test_recommended_workers_share_cores_with_page_processes(self):
+        with mock.patch('src.ocr.tesseract_ocr.cpu_count', return_value=8):
+            self.assertEqual(FakeTesseractOCR().recommended_workers(), 8)
+            self.assertEqual(FakeTesseractOCR(max_workers=4).recommended_workers(), 2)
+            self.assertEqual(FakeTesseractOCR(max_workers=16).recommended_workers(), 1)
+
+    @unittest.skipIf(sys.platform == 'win32', "executável de teste em script")
+    def test_run_tesseract_kills_process_on_deadline_and_cancel(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            command = os.path.join(temp_dir, "tesseract")
+            with open(command, 'w') as f:
+                f.write(f"#!{sys.executable}\n{FAKE_TESSERACT}")
+            os.chmod(command, 0o755)
+            image = Image.new('L', (10, 10), 255)
+
+            with mock.patch.object(pytesseract.pytesseract, 'tesseract_cmd', command):
+                self.assertIn(b'ok', run_tesseract(image, ['-l', 'por', 'hocr']))
+
+                started = time.monotonic()
+                with self.assertRaises(PageTimeoutError):
+                    run_tesseract(image, ['-l', 'lento'], PageLimits(timeout=0.3))
+                self.assertLess(time.monotonic() - started, 2)
+
+                cancel_event = threading.Event()
+                threading.Timer(0.3, cancel_event.set).start()
+                started = time.monotonic()
+                with self.assertRaises(OCRCancelledError):
+                    run_tesseract(image, ['-l', 'lento'], PageLimits(cancel_event=cancel_event))
+                self.assertLess(time.monotonic() - started, 2)
+
+    @unittest.skipIf(sys.platform == 'win32', "executável de teste em script")
+    def test_omp_limit_only_in_tesseract_environment(self):
+        environ = {key: value for key, value in os.environ.items() if key != OMP_THREAD_LIMIT_ENV}
+        with tempfile.TemporaryDirectory() as temp_dir, mock.patch.dict(os.environ, environ, clear=True):
+            command = os.path.join(temp_dir, "tesseract")
+            with open(command, 'w') as f:
+                f.write(f"#!{sys.executable}\n{FAKE_TESSERACT}")
+            os.chmod(command, 0o755)
+            image = Image.new('L', (10, 10), 255)
+
+            ocr = TesseractOCR(omp_threads=1)
+            with mock.patch.object(pytesseract.pytesseract, 'tesseract_cmd', command):
+                output = run_tesseract(image, ['-l', 'omp'], ocr.page_limits())
+            self.assertEqual(output.split()[0], b'1')
+            self.assertNotIn(OMP_THREAD_LIMIT_ENV, os.environ)
+
+    def test_parallel_ocr_keeps_page_order(self):
+        images = [Image.new('L', (width, 10), 255) for width in range(1, 13)]
+        serial = FakeTesseractOCR()
+        parallel = FakeTesseractOCR(max_workers=3)
+        try:
+            self.assertEqual(parallel._perform_ocr(iter(images), 'por'),
+                             serial._perform_ocr(images, 'por'))
+        finally:
+            parallel.shutdown()
+
+    def test_recycling_uses_pool_with_single_worker(self):
+        ocr = FakeTesseractOCR(max_workers=1, max_tasks_per_child=2)
+        images = [Image.new('L', (width, 10), 255) for width in range(1, 6)]
+        try:
+            self.assertEqual(ocr.uses_pool(), sys.version_info >= (3, 11))
+            self.assertIn("Pagina 5", ocr._perform_ocr(images, 'por'))
+            if ocr.uses_pool():
+                self.assertIsNotNone(ocr._pool)
+        finally:
+            ocr.shutdown()
+        self.assertFalse(FakeTesseractOCR(max_workers=1).uses_pool())
+
+    def test_documents_share_one_process_per_core(self):
+        with mock.patch('src.ocr.tesseract_ocr.cpu_count', return_value=4):
+            ocr = PidTesseractOCR(max_workers=2)
+            self.assertEqual(ocr.recommended_workers(), 2)
+            images = [Image.new('L', (5, 5))] * 4
+            pids = []
+            try:
+                threads = [threading.Thread(target=lambda: pids.extend(
+                    ocr._ocr_pages_parallel(enumerate(images, 1), 'por').values())) for _ in range(2)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join(60)
+                self.assertEqual(ocr._pool._max_workers, 4)
+            finally:
+                ocr.shutdown()
+        # Dois documentos com duas páginas em voo cada ocupam mais que max_workers processos
+        self.assertEqual(len(pids), 8)
+        self.assertGreater(len(set(pids)), 2)
+
+    def test_parallel_ocr_honors_stop_event(self):
+        ocr = FakeTesseractOCR(max_workers=2)
+        ocr.stop_event.set()
+        images = enumerate([Image.new('L', (5, 5))] * 4, 1)
+        self.assertEqual(ocr._ocr_pages_parallel(images, 'por'), {})
+        ocr.shutdown()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import unittest
+from unittest import mock
+from PIL import Image, ImageDraw
+from src.ocr import tesserocr_ocr
+from src.ocr.image_preprocessor import PreprocessingOptions
+from src.ocr.tesseract_ocr import TesseractOCR
+from src.ocr.tesserocr_ocr import TesserocrOCR
+from src.utils.concurrency import OMP_THREAD_LIMIT_ENV
+
+
+class TestTesserocrOCR(unittest.TestCase):
+
+    @unittest.skipIf(not tesserocr_ocr.TESSEROCR_AVAILABLE, "tesserocr não instalado")
+    def test_instantiation(self):
+        self.assertIsInstance(TesserocrOCR(), TesserocrOCR)
+
+    def test_forwards_tesseract_options(self):
+        preprocessing = PreprocessingOptions(deskew=False)
+        with mock.patch.object(tesserocr_ocr, 'TESSEROCR_AVAILABLE', True):
+            ocr = TesserocrOCR(max_workers=2, max_tasks_per_child=10, page_timeout=30,
+                               preprocessing=preprocessing, omp_threads=2)
+        self.assertEqual((ocr.max_workers, ocr.max_tasks_per_child, ocr.page_timeout), (2, 10, 30))
+        self.assertEqual((ocr.preprocessing, ocr.omp_threads), (preprocessing, 2))
+
+    @unittest.skipIf(not tesserocr_ocr.TESSEROCR_AVAILABLE or shutil.which('tesseract') is None,
+                     "tesserocr ou executável do Tesseract não instalado")
+    def test_same_text_as_tesseract_subprocess(self):
+        image = Image.new('L', (1200, 300), 255)
+        draw = ImageDraw.Draw(image)
+        draw.text((40, 60), "Contrato de prestacao de servicos", fill=0, font_size=48)
+        draw.text((40, 160), "Clausula primeira do objeto", fill=0, font_size=48)
+
+        expected = TesseractOCR._ocr_page(image, 'eng')
+        self.assertTrue(expected.strip())
+        self.assertEqual(TesserocrOCR._ocr_page(image, 'eng'), expected)
+
+    def test_omp_limit_set_before_loading_tesserocr(self):
+        seen = []
+
+        def import_module(name):
+            seen.append((name, os.environ.get(OMP_THREAD_LIMIT_ENV)))
+            return mock.Mock()
+
+        environ = {key: value for key, value in os.environ.items() if key != OMP_THREAD_LIMIT_ENV}
+        with mock.patch.dict(os.environ, environ, clear=True), \
+                mock.patch.object(tesserocr_ocr, 'tesserocr', None), \
+                mock.patch.object(tesserocr_ocr.importlib, 'import_module', side_effect=import_module):
+            tesserocr_ocr._load_tesserocr(1)
+            tesserocr_ocr._load_tesserocr(1)
+        self.assertEqual(seen, [("tesserocr", "1")])
+
+    @unittest.skipIf(tesserocr_ocr.TESSEROCR_AVAILABLE, "tesserocr instalado")
+    def test_missing_binding_raises_import_error(self):
+        with self.assertRaises(ImportError):
+            TesserocrOCR()
+
+if __name__ == '__main__':
+    unittest.main()
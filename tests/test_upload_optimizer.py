@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from pdf_fixtures import make_pdf
+from src.core.base_ocr import count_pdf_pages
+from src.ocr.upload_optimizer import MAX_INK_DIFFERENCE, UploadOptimizer
+from src.utils.pdf_writer import encode_jpeg_page, write_image_pdf
+
+
+def text_page(dpi=200, size=(1700, 2200)):
+    """Página com linhas de texto em corpo 12 na resolução indicada"""
+    image = Image.new('L', size, 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(round(12 * dpi / 72))
+    words = "Contrato de prestação de serviços cláusula primeira do objeto".split()
+    line_height = round(18 * dpi / 72)
+    for line, y in enumerate(range(line_height, size[1] - line_height, line_height)):
+        shift = line % len(words)
+        draw.text((dpi // 2, y), " ".join(words[shift:] + words[:shift]), fill=0, font=font)
+    image.info['dpi'] = (dpi, dpi)
+    return image
+
+
+def fake_iter_pages(pdf_path, pages=None):
+    for page in pages:
+        yield page, text_page()
+
+
+class TestUploadOptimizer(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        # Digitalização colorida "pesada": ruído em JPEG de alta qualidade
+        self.scan_path = os.path.join(self.temp_dir.name, "scan.pdf")
+        noise = np.random.default_rng(0).integers(0, 255, (1100, 850, 3), dtype=np.uint8)
+        page = encode_jpeg_page(Image.fromarray(noise), 100, quality=95)
+        with open(self.scan_path, 'wb') as f:
+            write_image_pdf([page, page, page], f)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _optimize(self, optimizer, pages=None, pdf_path=None):
+        with mock.patch.object(optimizer.rasterizer, 'iter_pages', side_effect=fake_iter_pages):
+            return optimizer.optimize(pdf_path or self.scan_path, pages)
+
+    def test_recompresses_selected_pages(self):
+        for mono in (False, True):
+            optimizer = UploadOptimizer(mono=mono)
+            optimized = self._optimize(optimizer, [1, 3])
+            try:
+                self.assertIsNotNone(optimized)
+                self.assertEqual(count_pdf_pages(optimized.path), 2)
+                self.assertGreater(optimized.saved_bytes, 0)
+                self.assertEqual(optimized.original_pages({1: "a", 2: "b"}), {1: "a", 3: "b"})
+                self.assertEqual(optimizer.stats()["saved_bytes"], optimized.saved_bytes)
+            finally:
+                optimized.cleanup()
+
+    def test_keeps_original_outside_quality_tolerance(self):
+        optimizer = UploadOptimizer(max_ink_difference=-1)
+        self.assertIsNone(self._optimize(optimizer))
+        self.assertEqual(optimizer.stats()["documents"], 0)
+
+    def test_downsampling_loss_measured_against_original_resolution(self):
+        # Digitalização a 400 dpi com traços finos que somem ao reduzir para 100 dpi
+        fine = Image.new('L', (800, 800), 255)
+        draw = ImageDraw.Draw(fine)
+        for x in range(100, 700, 6):
+            draw.line([x, 100, x, 700], fill=0, width=1)
+
+        def low_resolution_pages(pdf_path, pages=None):
+            for page in pages:
+                image = fine.resize((200, 200), Image.BILINEAR)
+                image.info['dpi'] = (100, 100)
+                yield page, image
+
+        for mono in (False, True):
+            optimizer = UploadOptimizer(mono=mono)
+            with mock.patch.object(optimizer.rasterizer, 'iter_pages', side_effect=low_resolution_pages), \
+                    mock.patch.object(optimizer.rasterizer, 'render_page', return_value=fine) as render_page, \
+                    mock.patch.object(optimizer, 'native_dpi', return_value={1: 400.0}):
+                self.assertIsNone(optimizer.optimize(self.scan_path, [1]))
+            render_page.assert_called_once_with(self.scan_path, 1, 400)
+
+    def test_resampled_text_within_tolerance(self):
+        # Trecho de uma digitalização a 600 dpi recodificada em resoluções menores
+        reference = text_page(600, size=(2400, 1800))
+
+        def difference(mono, dpi):
+            factor = 600 / dpi
+            image = reference.resize((round(reference.width / factor), round(reference.height / factor)),
+                                     Image.LANCZOS)
+            optimizer = UploadOptimizer(mono=mono)
+            return optimizer.ink_difference(reference, optimizer.encode_page(image, dpi))
+
+        for dpi in (300, 150):
+            self.assertLess(difference(True, dpi), MAX_INK_DIFFERENCE)
+            self.assertLess(difference(False, dpi), MAX_INK_DIFFERENCE)
+        # Corpo 12 a 50 dpi (letras com 8 pixels) não é mais legível
+        self.assertGreater(difference(False, 50), MAX_INK_DIFFERENCE)
+
+    def test_native_dpi_from_page_images(self):
+        self.assertEqual(UploadOptimizer.native_dpi(self.scan_path, [1, 3]), {1: 100.0, 3: 100.0})
+
+    def test_pdf_with_fonts_is_not_optimized(self):
+        text_pdf = os.path.join(self.temp_dir.name, "texto.pdf")
+        make_pdf(text_pdf, ["Texto", None])
+        self.assertIsNone(self._optimize(UploadOptimizer(), pdf_path=text_pdf))
+        self.assertEqual(UploadOptimizer.image_only_pages(text_pdf, [2]), [2])
+
+if __name__ == '__main__':
+    unittest.main()
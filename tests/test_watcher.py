@@ -0,0 +1,83 @@
+import os
+import tempfile
+import threading
+import unittest
+from src.core.pipeline import list_input_files
+from src.core.watcher import FolderWatcher
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestFolderWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.clock = FakeClock()
+        self.watcher = FolderWatcher(self.temp_dir.name, list_input_files, poll_interval=0.01,
+                                     settle_time=2.0, clock=self.clock)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, name, data, mtime):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def poll_at(self, now):
+        self.clock.now = now
+        return self.watcher.poll()
+
+    def test_file_is_delivered_once_it_stops_changing(self):
+        path = self.write("scan.pdf", b"parte", 100)
+        self.assertEqual(self.poll_at(0), [])
+        # Ainda sendo gravado: tamanho mudou
+        self.write("scan.pdf", b"parte completa", 101)
+        self.assertEqual(self.poll_at(1), [])
+        self.assertEqual(self.poll_at(2), [])
+        self.assertEqual(self.poll_at(3.5), [path])
+        self.assertEqual(self.poll_at(10), [])
+
+    def test_modified_file_is_delivered_again_but_touched_file_is_not(self):
+        path = self.write("scan.pdf", b"versao 1", 100)
+        self.poll_at(0)
+        self.assertEqual(self.poll_at(3), [path])
+
+        # Mesmo conteúdo, outra data: não é reprocessado
+        os.utime(path, (200, 200))
+        self.poll_at(4)
+        self.assertEqual(self.poll_at(7), [])
+
+        self.write("scan.pdf", b"versao 2", 300)
+        self.poll_at(8)
+        self.assertEqual(self.poll_at(11), [path])
+
+    def test_empty_and_unsupported_files_are_ignored(self):
+        self.write("vazio.pdf", b"", 100)
+        self.write("notas.txt", b"texto", 100)
+        self.poll_at(0)
+        self.assertEqual(self.poll_at(5), [])
+
+    def test_watch_stops_with_stop_event(self):
+        self.watcher._clock = lambda: 1000.0
+        self.watcher.settle_time = 0
+        path = self.write("scan.pdf", b"conteudo", 100)
+        stop_event = threading.Event()
+        delivered = []
+        for item in self.watcher.watch(stop_event):
+            delivered.append(item)
+            stop_event.set()
+        self.assertEqual(delivered, [path])
+
+
+if __name__ == '__main__':
+    unittest.main()